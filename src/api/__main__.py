@@ -1,10 +1,26 @@
 from fastapi import FastAPI
 
-from api import routers
+from api import instrumentation, profiling, routers
+from api.models import durability, service
 
 
 app = FastAPI()
+# the middleware added last is the outermost, so request metrics include the profiling
+if profiling.enabled:
+    app.middleware('http')(profiling.profile)
+app.middleware('http')(instrumentation.instrument)
 app.include_router(routers.databases.router)
+app.include_router(routers.service.router)
+app.include_router(routers.metrics.router)
+if profiling.enabled:
+    app.include_router(routers.profiling.router)
+
+
+@app.on_event("shutdown")
+def close_storage():
+    if durability is not None:
+        durability.close()
+    service.close()
 
 
 
@@ -0,0 +1,68 @@
+import time
+from typing import Dict
+
+from fastapi import Request
+
+from api.models import service
+from core import metrics
+
+
+requests_total = metrics.registry.register(metrics.Counter(
+    'db_http_requests_total', 'Handled requests', ['method', 'route', 'status'],
+))
+request_seconds = metrics.registry.register(metrics.Histogram(
+    'db_http_request_seconds', 'Time until the response starts', ['method', 'route'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+))
+requests_in_flight = metrics.registry.register(metrics.Gauge(
+    'db_http_requests_in_flight', 'Requests being handled',
+))
+bytes_imported = metrics.registry.register(metrics.Counter(
+    'db_bytes_imported_total', 'Bytes of imported databases and bulk inserted rows', ['format', 'encoding'],
+))
+bytes_exported = metrics.registry.register(metrics.Counter(
+    'db_bytes_exported_total', 'Bytes of exported databases', ['format', 'encoding'],
+))
+
+
+def _databases() -> Dict[metrics.Labels, float]:
+    return {('all',): len(service.databases), ('loaded',): len(service.loaded_databases)}
+
+
+def _tables() -> Dict[metrics.Labels, float]:
+    return {(db.name,): len(db.tables) for db in service.loaded_databases}
+
+
+def _rows() -> Dict[metrics.Labels, float]:
+    rows = {}
+    for db in service.loaded_databases:
+        for table_name in db.tables:
+            table = db.get_table(table_name)
+            if table is not None:
+                rows[db.name, table_name] = len(table)
+    return rows
+
+
+# counted when scraped; databases that are only on disk are not loaded for it
+metrics.registry.register(metrics.Gauge('db_databases', 'Databases in the service', ['state'], callback=_databases))
+metrics.registry.register(metrics.Gauge('db_tables', 'Tables of loaded databases', ['database'], callback=_tables))
+metrics.registry.register(metrics.Gauge('db_rows', 'Rows of loaded tables', ['database', 'table'], callback=_rows))
+
+
+async def instrument(request: Request, call_next):
+    if not metrics.enabled():
+        return await call_next(request)
+    requests_in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        requests_in_flight.dec()
+        # the route template keeps the number of label values bounded
+        route = request.scope.get('route')
+        path = route.path if route is not None else 'unmatched'
+        requests_total.inc(1, request.method, path, str(status))
+        request_seconds.observe(time.perf_counter() - start, request.method, path)
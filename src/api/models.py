@@ -1,5 +1,79 @@
+import os
+from pathlib import Path
+from typing import List, Union
 
+from pydantic import BaseModel
 
 import core
+from core import metrics
+from core.durability import Durability
 
-service = core.service.Service([])
+
+# set DB_DATA_DIR to keep a write-ahead log and snapshots of the service on disk
+durability = Durability(Path(os.environ['DB_DATA_DIR'])) if os.environ.get('DB_DATA_DIR') else None
+
+# alternatively, set DB_CATALOG_DIR to keep one file per database there, loaded on first
+# use and evicted (least recently used first) once DB_MEMORY_BUDGET bytes are exceeded
+catalog_dir = Path(os.environ['DB_CATALOG_DIR']) if os.environ.get('DB_CATALOG_DIR') else None
+memory_budget = int(os.environ['DB_MEMORY_BUDGET']) if os.environ.get('DB_MEMORY_BUDGET') else None
+assert durability is None or catalog_dir is None, 'Set either DB_DATA_DIR or DB_CATALOG_DIR'
+
+# request and core operation metrics are collected unless DB_METRICS=0
+metrics.enable(os.environ.get('DB_METRICS', '1') != '0')
+
+if durability is not None:
+    service = durability.recover()
+else:
+    service = core.service.Service([], catalog_dir, memory_budget)
+
+
+class QueryCondition(BaseModel):
+    column: str
+    op: str
+    value: Union[str, List[str]]
+
+
+class QueryOrdering(BaseModel):
+    column: str
+    descending: bool = False
+
+
+class QueryRequest(BaseModel):
+    where: List[QueryCondition] = []
+    select: Union[List[str], None] = None
+    order_by: List[QueryOrdering] = []
+    limit: Union[int, None] = None
+    offset: int = 0
+    # next_cursor of the previous page, for orderings by id or by a column with a sorted index
+    cursor: Union[str, None] = None
+
+
+class AggregateSpec(BaseModel):
+    op: str
+    column: Union[str, None] = None
+
+
+class AggregateRequest(BaseModel):
+    aggregates: List[AggregateSpec] = []
+    group_by: List[str] = []
+    where: List[QueryCondition] = []
+
+
+class JoinRequest(BaseModel):
+    right: str
+    left_on: str = 'id'
+    right_on: str = 'id'
+    how: str = 'inner'
+    limit: Union[int, None] = None
+    # next_cursor of the previous page
+    cursor: Union[str, None] = None
+    memory_limit: Union[int, None] = None
+
+
+class ProfilingConfig(BaseModel):
+    sampling: Union[bool, None] = None
+    sample_rate: Union[float, None] = None
+    profiler: Union[str, None] = None
+    header: Union[bool, None] = None
+    capacity: Union[int, None] = None
+    interval: Union[float, None] = None
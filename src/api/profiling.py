@@ -0,0 +1,320 @@
+import asyncio
+import cProfile
+import datetime
+import functools
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Union
+
+from fastapi import Request
+from fastapi.routing import APIRoute
+from starlette import concurrency
+
+# Profiles of single requests. A request is captured when it carries the X-Profile header or,
+# once sampling is switched on, at the sampling rate. Only the code of that request is
+# profiled: sync endpoints in their worker thread and the blocking work async endpoints hand
+# to run_in_threadpool. With nothing requested, each request costs a header lookup.
+
+HEADER = 'x-profile'
+
+# profiles expose the code and timings of other clients' requests to whoever asks for them,
+# so the header, the sampling and the /profiling endpoints only exist with DB_PROFILING=1
+enabled = os.environ.get('DB_PROFILING', '0') == '1'
+
+
+class ProfilerNames(Enum):
+    # deterministic profile of every call, or periodic snapshots of the stack
+    CPROFILE = 'cprofile'
+    SAMPLE = 'sample'
+
+
+class ProfileFormats(Enum):
+    TEXT = 'text'
+    PSTATS = 'pstats'
+    COLLAPSED = 'collapsed'
+
+
+class Capture:
+    def __init__(self, profiler_name: ProfilerNames):
+        self._profiler_name = profiler_name
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+        self._stacks: Counter = Counter()
+        self._threads: Dict[int, int] = {}
+
+    @property
+    def profiler_name(self) -> ProfilerNames:
+        return self._profiler_name
+
+    @contextmanager
+    def section(self) -> Iterator[None]:
+        me = threading.get_ident()
+        with self._lock:
+            nested = me in self._threads
+            self._threads[me] = self._threads.get(me, 0) + 1
+        try:
+            if nested:
+                yield
+            elif self._profiler_name is ProfilerNames.CPROFILE:
+                profile = cProfile.Profile()
+                profile.enable()
+                try:
+                    yield
+                finally:
+                    profile.disable()
+                    with self._lock:
+                        self._profiles.append(profile)
+            else:
+                sampler.watch(me, self)
+                try:
+                    yield
+                finally:
+                    sampler.unwatch(me)
+        finally:
+            with self._lock:
+                self._threads[me] -= 1
+                if not self._threads[me]:
+                    del self._threads[me]
+
+    def add_stack(self, stack: str) -> None:
+        with self._lock:
+            self._stacks[stack] += 1
+
+    def stats(self) -> Union[Dict, None]:
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats.stats
+
+    def stacks(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stacks)
+
+
+class Sampler:
+    # a single thread that records the stacks of the threads running captured code
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watched: Dict[int, Capture] = {}
+        self._wake = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+        self.interval = 0.005
+
+    def watch(self, ident: int, capture: Capture) -> None:
+        with self._lock:
+            self._watched[ident] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def unwatch(self, ident: int) -> None:
+        with self._lock:
+            self._watched.pop(ident, None)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            with self._lock:
+                watched = dict(self._watched)
+                if not watched:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for ident, capture in watched.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    capture.add_stack(_collapse(frame))
+            del frames
+            time.sleep(self.interval)
+
+
+class ProfileRecord:
+    def __init__(self, identifier: int, request: Request, status: int, seconds: float, capture: Capture):
+        self._identifier = identifier
+        self._method = request.method
+        route = request.scope.get('route')
+        self._path = route.path if route is not None else request.url.path
+        self._status = status
+        self._seconds = seconds
+        self._created = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self._profiler_name = capture.profiler_name
+        self._stats = capture.stats()
+        self._stacks = capture.stacks()
+
+    @property
+    def identifier(self) -> int:
+        return self._identifier
+
+    @property
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'id': self._identifier,
+            'method': self._method,
+            'path': self._path,
+            'status': self._status,
+            'seconds': self._seconds,
+            'created': self._created,
+            'profiler': self._profiler_name.value,
+            'formats': [f.value for f in self.formats],
+        }
+
+    @property
+    def formats(self) -> List[ProfileFormats]:
+        if self._profiler_name is ProfilerNames.CPROFILE:
+            return [ProfileFormats.TEXT, ProfileFormats.PSTATS] if self._stats is not None else []
+        return [ProfileFormats.COLLAPSED] if self._stacks else []
+
+    def render(self, profile_format: ProfileFormats, limit: int = 50) -> Union[str, bytes]:
+        assert profile_format in self.formats, f'Profile {self._identifier} is not available as {profile_format.value}'
+        if profile_format is ProfileFormats.COLLAPSED:
+            # one line per distinct stack, root first, followed by the number of samples
+            return ''.join(f'{stack} {count}\n' for stack, count in sorted(self._stacks.items()))
+        if profile_format is ProfileFormats.PSTATS:
+            # what pstats.Stats and snakeviz read from a file
+            return marshal.dumps(self._stats)
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.stats = self._stats
+        stats.get_top_level_stats()
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return stream.getvalue()
+
+
+class Profiler:
+    def __init__(self, capacity: int):
+        assert capacity > 0, 'Capacity must be positive'
+        self._lock = threading.Lock()
+        self._records: Deque[ProfileRecord] = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        # requests without the header are only captured while sampling is on
+        self.sampling = False
+        self.sample_rate = 0.01
+        self.profiler_name = ProfilerNames.CPROFILE
+        # whether the X-Profile header is honoured
+        self.header = True
+
+    @property
+    def capacity(self) -> int:
+        return self._records.maxlen
+
+    @capacity.setter
+    def capacity(self, capacity: int) -> None:
+        assert capacity > 0, 'Capacity must be positive'
+        with self._lock:
+            self._records = deque(self._records, maxlen=capacity)
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        return {
+            'sampling': self.sampling,
+            'sample_rate': self.sample_rate,
+            'profiler': self.profiler_name.value,
+            'header': self.header,
+            'capacity': self.capacity,
+            'interval': sampler.interval,
+        }
+
+    @property
+    def records(self) -> List[ProfileRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def get(self, identifier: int) -> Union[ProfileRecord, None]:
+        return next((r for r in self.records if r.identifier == identifier), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def wanted(self, request: Request) -> Union[ProfilerNames, None]:
+        if self.header:
+            value = request.headers.get(HEADER)
+            if value:
+                # any other value than a profiler name asks for the configured one
+                return next((p for p in ProfilerNames if p.value == value.lower()), self.profiler_name)
+        if self.sampling and random.random() < self.sample_rate:
+            return self.profiler_name
+        return None
+
+    def add(self, request: Request, status: int, seconds: float, capture: Capture) -> ProfileRecord:
+        record = ProfileRecord(next(self._ids), request, status, seconds, capture)
+        with self._lock:
+            self._records.append(record)
+        return record
+
+
+sampler = Sampler()
+profiler = Profiler(int(os.environ.get('DB_PROFILES', 20)))
+
+_capture: ContextVar[Union[Capture, None]] = ContextVar('capture', default=None)
+
+
+async def profile(request: Request, call_next):
+    profiler_name = profiler.wanted(request)
+    if profiler_name is None:
+        return await call_next(request)
+    capture = Capture(profiler_name)
+    # tasks and worker threads started from here on see the capture
+    token = _capture.set(capture)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _capture.reset(token)
+    record = profiler.add(request, response.status_code, time.perf_counter() - start, capture)
+    response.headers['X-Profile-Id'] = str(record.identifier)
+    return response
+
+
+async def run_in_threadpool(func: Callable, *args, **kwargs):
+    # starlette's run_in_threadpool, profiling the call when the request is captured
+    capture = _capture.get()
+    if capture is None:
+        return await concurrency.run_in_threadpool(func, *args, **kwargs)
+    return await concurrency.run_in_threadpool(_profiled(func, capture), *args, **kwargs)
+
+
+class ProfiledRoute(APIRoute):
+    # sync endpoints run in a worker thread, where they are profiled as a whole
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if enabled and not asyncio.iscoroutinefunction(endpoint):
+            endpoint = _profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _profiled(func: Callable, capture: Union[Capture, None] = None) -> Callable:
+    # FastAPI reads the signature of the wrapped endpoint
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        current = capture or _capture.get()
+        if current is None:
+            return func(*args, **kwargs)
+        with current.section():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
@@ -1 +1,4 @@
 from . import databases
+from . import metrics
+from . import profiling
+from . import service
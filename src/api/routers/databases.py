@@ -1,15 +1,27 @@
+import codecs
+import io
+import json
+import shutil
+import tempfile
+import uuid
 from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Iterator, List, Tuple, Union
+from urllib.parse import quote
 
-from fastapi import APIRouter, HTTPException, Response, UploadFile, responses, Body
+from fastapi import APIRouter, HTTPException, Header, Query, Request, Response, UploadFile, responses, Body
 
-from api.models import service
+from api import instrumentation
+from api.profiling import ProfiledRoute, run_in_threadpool
+from api.models import service, AggregateRequest, JoinRequest, QueryRequest
 from http import HTTPStatus
 
-from core import database, parsing
-from core.filesystem import coder
+from core import aggregate, database, dedup, join, parsing, query, schema, storage
+from core.filesystem import arrow, coder, formats, snapshot
 
 
-router = APIRouter(prefix="/databases", tags=[])
+router = APIRouter(prefix="/databases", tags=[], route_class=ProfiledRoute)
+
+MAX_PAGE_SIZE = 10_000
 
 
 @router.get("/", tags=['databases'])
@@ -19,7 +31,7 @@ async def get_all_databases():
 
 @router.post("/create", tags=['databases'])
 async def create_database(database_name: str):
-    if database_name in service.databases:
+    if service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database already exists')
     db = database.Database(database_name, [])
     service.add_database(db)
@@ -28,91 +40,279 @@ async def create_database(database_name: str):
 
 @router.delete("/{database_name}", tags=['databases'])
 async def delete_database(database_name: str):
-    if database_name not in service.databases:
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
     service.remove_database(database_name)
     return Response(status_code=HTTPStatus.OK)
 
 
 @router.get("/{database_name}/export", tags=['databases'])
-async def export_database(database_name: str):
-    if database_name not in service.databases:
+async def export_database(database_name: str, export_format: Union[formats.ExportFormats, None] = None,
+                          accept: Union[str, None] = Header(None), accept_encoding: Union[str, None] = Header(None)):
+    # the format is taken from the parameter, or else negotiated from the Accept header;
+    # Arrow and Parquet databases are zip archives with a file per table
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
-    p_exports = Path('_exports/')
-    p_exports.mkdir(exist_ok=True)
-    coder.Coder().export_database(service.get_database(database_name), p_exports / f'{database_name}.json')
-    return responses.FileResponse(p_exports / f'{database_name}.json')
+    export_format = _export_format(export_format, accept, list(formats.ExportFormats))
+    encoding = _accept_encoding(accept_encoding, export_format)
+    db = service.get_database(database_name)
+    if export_format is formats.ExportFormats.JSON:
+        chunks = (chunk.encode('utf-8') for chunk in coder.Coder.iter_database_json(db))
+    elif export_format is formats.ExportFormats.SNAPSHOT:
+        chunks = snapshot.SnapshotCoder.iter_database_bytes(db)
+    else:
+        chunks = arrow.ArrowCoder.iter_database_bytes(db, export_format)
+    if export_format in (formats.ExportFormats.ARROW, formats.ExportFormats.PARQUET):
+        media_type = 'application/zip'
+        filename = f'{database_name}.{export_format.value}.zip'
+    else:
+        media_type = formats.MEDIA_TYPES[export_format]
+        filename = f'{database_name}.{export_format.value}'
+    return await _export_response(chunks, export_format, encoding, media_type, filename)
+
+
+async def _export_response(chunks: Iterator[bytes], export_format: formats.ExportFormats,
+                           encoding: formats.EncodingNames, media_type: str, filename: str) -> responses.StreamingResponse:
+    # the chunks are produced one at a time in the threadpool and compressed as they go. The
+    # producers hold a table's read lock only while they copy from it, never between chunks,
+    # so consecutive chunks may come from different threads. The first chunk is produced
+    # before the response starts, so that a table that cannot be exported gets a status
+    chunks = coder.Compression.iter_compressed(chunks, encoding)
+    try:
+        first = await run_in_threadpool(next, chunks, None)
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(e))
+    quoted = quote(filename)
+    if quoted == filename:
+        disposition = f'attachment; filename="{filename}"'
+    else:
+        disposition = f"attachment; filename*=utf-8''{quoted}"
+    headers = {**_encoding_headers(encoding), 'Content-Disposition': disposition}
+    return responses.StreamingResponse(_stream(first, chunks, export_format, encoding),
+                                       media_type=media_type, headers=headers)
+
+
+async def _stream(chunk: Union[bytes, None], chunks: Iterator[bytes], export_format: formats.ExportFormats,
+                  encoding: formats.EncodingNames) -> AsyncIterator[bytes]:
+    while chunk is not None:
+        instrumentation.bytes_exported.inc(len(chunk), export_format.value, encoding.value)
+        yield chunk
+        chunk = await run_in_threadpool(next, chunks, None)
+
+
+def _export_format(requested: Union[formats.ExportFormats, None], accept: Union[str, None],
+                   supported: List[formats.ExportFormats]) -> formats.ExportFormats:
+    if requested is None:
+        requested = _negotiate(accept, supported)
+    if requested not in supported:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f'Format {requested.value} is not supported here')
+    if requested in (formats.ExportFormats.ARROW, formats.ExportFormats.PARQUET) and not arrow.ArrowCoder.available():
+        raise HTTPException(HTTPStatus.NOT_IMPLEMENTED, 'pyarrow is not installed')
+    return requested
+
+
+def _negotiate(accept: Union[str, None], supported: List[formats.ExportFormats]) -> formats.ExportFormats:
+    # the supported media type with the highest quality, JSON when nothing matches
+    available = [f for f in supported if f not in (formats.ExportFormats.ARROW, formats.ExportFormats.PARQUET)
+                 or arrow.ArrowCoder.available()]
+    for media_type in _ranked(accept):
+        for export_format in available:
+            if formats.MEDIA_TYPES[export_format] == media_type:
+                return export_format
+    return formats.ExportFormats.JSON
+
+
+def _ranked(header: Union[str, None]) -> List[str]:
+    # the values of an Accept-like header, best first; those of quality 0 are left out
+    ranked = []
+    for i, item in enumerate((header or '').split(',')):
+        value, *params = [p.strip() for p in item.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if value and quality > 0:
+            ranked.append((-quality, i, value.lower()))
+    return [value for _, _, value in sorted(ranked)]
+
+
+def _accept_encoding(accept_encoding: Union[str, None], export_format: formats.ExportFormats) -> formats.EncodingNames:
+    # the first available encoding the client accepts; Parquet is compressed already
+    if export_format is formats.ExportFormats.PARQUET:
+        return formats.EncodingNames.IDENTITY
+    available = [e for e in formats.EncodingNames if coder.Compression.available(e)]
+    for value in _ranked(accept_encoding):
+        if value == '*':
+            return formats.EncodingNames.GZIP
+        for encoding in available:
+            if encoding.value == value:
+                return encoding
+    return formats.EncodingNames.IDENTITY
+
+
+def _encoding_headers(encoding: formats.EncodingNames) -> dict:
+    headers = {'Vary': 'Accept-Encoding'}
+    if encoding is not formats.EncodingNames.IDENTITY:
+        headers['Content-Encoding'] = encoding.value
+    return headers
+
+
+def _content_encoding(content_encoding: Union[str, None], head: bytes) -> formats.EncodingNames:
+    # the encoding an upload names, or else the one its first bytes show
+    if not content_encoding:
+        return coder.Compression.detect(head)
+    encoding = next((e for e in formats.EncodingNames if e.value == content_encoding.strip().lower()), None)
+    if encoding is None or not coder.Compression.available(encoding):
+        raise HTTPException(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, f'Unsupported content encoding {content_encoding}')
+    return encoding
 
 
 @router.post("/import", tags=['databases'])
 async def import_database(db_file: UploadFile):
-    db = coder.Coder.json_to_database((await db_file.read()).decode())
-    if db.name in service.databases:
+    # a compressed upload names its encoding in the Content-Encoding header of its part,
+    # or is recognised by its first bytes; it is decompressed as it is read
+    size = db_file.file.seek(0, io.SEEK_END)
+    db_file.file.seek(0)
+    head = db_file.file.read(len(snapshot.MAGIC))
+    db_file.file.seek(0)
+    encoding = _content_encoding(db_file.headers.get('content-encoding'), head)
+    try:
+        db, import_format = await run_in_threadpool(_read_database, db_file.file, encoding)
+    except ImportError as e:
+        raise HTTPException(HTTPStatus.NOT_IMPLEMENTED, str(e))
+    except (ValueError,) + coder.Compression.decode_errors() as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f'Invalid database file: {e}')
+    if service.contains(db.name):
+        db.close()
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database already exists')
-    service.add_database(db)
+    # journaling an imported database writes it to disk
+    await run_in_threadpool(service.add_database, db)
+    instrumentation.bytes_imported.inc(size, import_format, encoding.value)
     return Response(status_code=HTTPStatus.CREATED)
 
 
+def _read_database(f: BinaryIO, encoding: formats.EncodingNames) -> Tuple[database.Database, str]:
+    if encoding is formats.EncodingNames.IDENTITY:
+        source = f
+        head = f.read(len(snapshot.MAGIC))
+        f.seek(0)
+    else:
+        source = coder.Compression.reader(f, encoding)
+        head = source.peek(len(snapshot.MAGIC))[:len(snapshot.MAGIC)]
+    if head == snapshot.MAGIC:
+        return _import_snapshot(source), formats.ExportFormats.SNAPSHOT.value
+    if arrow.ArrowCoder.is_archive(head):
+        # Arrow or Parquet tables; zip archives are read from their end, so a
+        # compressed one is decompressed to a temporary file first
+        if source is f:
+            return arrow.ArrowCoder.import_database(f), 'archive'
+        with tempfile.TemporaryFile() as f_archive:
+            shutil.copyfileobj(source, f_archive, coder.COPY_CHUNK)
+            f_archive.seek(0)
+            return arrow.ArrowCoder.import_database(f_archive), 'archive'
+    return coder.Coder.read_database(io.TextIOWrapper(source, encoding='utf-8')), formats.ExportFormats.JSON.value
+
+
+def _import_snapshot(source: BinaryIO) -> database.Database:
+    # snapshots are memory-mapped, so the upload is kept as a regular file;
+    # it belongs to the database and is deleted when the database is removed
+    p_snapshots = Path('_snapshots/')
+    p_snapshots.mkdir(exist_ok=True)
+    p_snapshot = p_snapshots / f'{uuid.uuid4().hex}.snapshot'
+    try:
+        with p_snapshot.open('wb') as f:
+            shutil.copyfileobj(source, f, coder.COPY_CHUNK)
+        return snapshot.SnapshotCoder.import_database(p_snapshot, owned=True)
+    except BaseException:
+        p_snapshot.unlink(missing_ok=True)
+        raise
+
+
 @router.get("/{database_name}", tags=['tables'])
 def list_tables(database_name: str):
-    if database_name not in service.databases:
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
     return service.get_database(database_name).tables
 
 
 @router.delete('/{database_name}/{table_name}', tags=['tables'])
 async def delete_table(database_name: str, table_name: str):
-    if database_name not in service.databases:
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
     db = service.get_database(database_name)
-    if table_name not in db.tables:
+    if not db.contains(table_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
     db.remove_table(table_name)
     return Response(status_code=HTTPStatus.OK)
 
 
 @router.post("/{database_name}/create", tags=['tables'])
-def create_table(database_name: str, table_name: str, table_schema: str = Body(..., media_type='text/plain')):
-    if database_name not in service.databases:
+def create_table(database_name: str, table_name: str, table_schema: str = Body(..., media_type='text/plain'),
+                 storage_name: storage.StorageNames = storage.StorageNames.ROWS):
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
     db = service.get_database(database_name)
-    if table_name in db.tables:
+    if db.contains(table_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table already exists')
-    schema = parsing.schema.parse_schema(table_schema)
-    table = database.Table(table_name, schema, [])
+    sch = parsing.schema.parse_schema(table_schema)
+    table = database.Table(table_name, sch, [], storage_name)
     db.add_table(table)
     return Response(status_code=HTTPStatus.CREATED)
 
 
-@router.post("{database_name}/{table_name}/drop-duplicates", tags=['tables'])
-def drop_duplicates(database_name: str, table_name: str):
-    if database_name not in service.databases:
+@router.post("/{database_name}/{table_name}/drop-duplicates", tags=['tables'])
+def drop_duplicates(database_name: str, table_name: str, subset: Union[List[str], None] = Query(None),
+                    keep: dedup.KeepNames = dedup.KeepNames.FIRST):
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
     db = service.get_database(database_name)
-    if table_name not in db.tables:
+    if not db.contains(table_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
     table = db.get_table(table_name)
-    table.drop_duplicates()
-    return Response(status_code=HTTPStatus.OK)
+    for column in subset or []:
+        if column != 'id' and column not in table.schema.column_names:
+            raise HTTPException(HTTPStatus.BAD_REQUEST, f'Unknown column: {column}')
+    return {'removed': table.drop_duplicates(subset, keep)}
 
 
 @router.get("/{database_name}/{table_name}", tags=['rows'])
-def list_rows(database_name: str, table_name: str):
-    if database_name not in service.databases:
+def list_rows(database_name: str, table_name: str, limit: int = 100, cursor: Union[str, None] = None,
+              columns: Union[List[str], None] = Query(None)):
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
     db = service.get_database(database_name)
-    if table_name not in db.tables:
+    if not db.contains(table_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f'Limit must be between 1 and {MAX_PAGE_SIZE}')
     table = db.get_table(table_name)
-    return [str(r) for r in table.rows]
+    all_columns = ['id', *table.schema.column_names]
+    columns = columns or all_columns
+    unknown = [c for c in columns if c not in all_columns]
+    if unknown:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f'Unknown columns: {", ".join(unknown)}')
+    try:
+        after = table.schema.id_type.from_string(cursor) if cursor is not None else None
+    except ValueError:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Invalid cursor')
+    rows = table.page(limit, after)
+    positions = [all_columns.index(c) for c in columns]
+    return {
+        'columns': columns,
+        'rows': [table.schema.codec.to_json(r, positions) for r in rows],
+        'next_cursor': rows[-1].identifier.value if len(rows) == limit else None,
+    }
 
 
 @router.post("/{database_name}/{table_name}", tags=['rows'])
 def insert_row(database_name: str, table_name: str, row_data: str = Body(..., media_type='text/plain')):
-    if database_name not in service.databases:
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
     db = service.get_database(database_name)
-    if table_name not in db.tables:
+    if not db.contains(table_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
     table = db.get_table(table_name)
     row = parsing.row.parse_row(table.schema, row_data)
@@ -120,12 +320,34 @@ def insert_row(database_name: str, table_name: str, row_data: str = Body(..., me
     return Response(status_code=HTTPStatus.OK)
 
 
+@router.post("/{database_name}/{table_name}/bulk", tags=['rows'])
+async def bulk_insert_rows(database_name: str, table_name: str, request: Request, batch_size: int = 1000):
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if not db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    if batch_size <= 0:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Batch size must be positive')
+    loader = parsing.bulk.BulkLoader(db.get_table(table_name), batch_size)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    async for chunk in request.stream():
+        instrumentation.bytes_imported.inc(len(chunk), 'bulk', formats.EncodingNames.IDENTITY.value)
+        await run_in_threadpool(loader.feed, decoder.decode(chunk))
+    await run_in_threadpool(loader.feed, decoder.decode(b'', final=True))
+    await run_in_threadpool(loader.close)
+    return {
+        'inserted': loader.inserted,
+        'errors': [{'line': line, 'error': message} for line, message in loader.errors],
+    }
+
+
 @router.put("/{database_name}/{table_name}", tags=['rows'])
 def update_row(database_name: str, table_name: str, row_data: str = Body(..., media_type='text/plain')):
-    if database_name not in service.databases:
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
     db = service.get_database(database_name)
-    if table_name not in db.tables:
+    if not db.contains(table_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
     table = db.get_table(table_name)
     row = parsing.row.parse_row(table.schema, row_data)
@@ -133,15 +355,262 @@ def update_row(database_name: str, table_name: str, row_data: str = Body(..., me
     return Response(status_code=HTTPStatus.OK)
 
 
+@router.get("/{database_name}/{table_name}/indexes", tags=['indexes'])
+def list_indexes(database_name: str, table_name: str):
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if not db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    table = db.get_table(table_name)
+    kinds = {'id': 'primary', **{column: index_name.value for column, index_name in table.indexes.items()}}
+    return [
+        {'column': column, 'kind': kinds[column], 'bytes': nbytes}
+        for column, nbytes in table.index_nbytes.items()
+    ]
+
+
+@router.post("/{database_name}/{table_name}/indexes", tags=['indexes'])
+def create_index(database_name: str, table_name: str, column: str,
+                 index_name: schema.IndexNames = schema.IndexNames.HASH):
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if not db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    table = db.get_table(table_name)
+    if column not in table.schema.column_names:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Column does not exist')
+    if column in table.indexes:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Index already exists')
+    if index_name is schema.IndexNames.INTERVAL and \
+            table.schema.type_names[table.schema.column_names.index(column)] is not schema.TypeNames.MONEY_INTERVAL:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Interval index requires a money interval column')
+    table.create_index(column, index_name)
+    return Response(status_code=HTTPStatus.CREATED)
+
+
+@router.delete("/{database_name}/{table_name}/indexes/{column}", tags=['indexes'])
+def drop_index(database_name: str, table_name: str, column: str):
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if not db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    table = db.get_table(table_name)
+    if column not in table.indexes:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Index does not exist')
+    table.drop_index(column)
+    return Response(status_code=HTTPStatus.OK)
+
+
+@router.post("/{database_name}/{table_name}/query", tags=['rows'])
+def query_rows(database_name: str, table_name: str, request: QueryRequest):
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if not db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    table = db.get_table(table_name)
+    if request.limit is not None and request.limit > MAX_PAGE_SIZE:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f'Limit must not exceed {MAX_PAGE_SIZE}')
+    # without an ordering the rows come by identifier, so that pages can continue from a cursor
+    order_by = [query.Ordering(o.column, o.descending) for o in request.order_by] or [query.Ordering('id')]
+    limit = request.limit if request.limit is not None else MAX_PAGE_SIZE
+    try:
+        after = _decode_cursor(table, order_by, request.cursor) if request.cursor is not None else None
+        q = query.Query(
+            table,
+            where=[
+                query.Condition.from_strings(
+                    table, c.column, query.Operators(c.op), c.value if isinstance(c.value, list) else [c.value],
+                )
+                for c in request.where
+            ],
+            select=request.select,
+            order_by=order_by,
+            limit=limit,
+            offset=request.offset,
+            after=after,
+        )
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(e))
+    rows = q.execute()
+    positions = q.positions
+    return {
+        'plan': q.plan().description,
+        'columns': q.select,
+        'rows': [table.schema.codec.to_json(r, positions) for r in rows],
+        'next_cursor': (json.dumps([v.value for v in q.cursor(rows[-1])])
+                        if q.keyset and rows and len(rows) == limit else None),
+    }
+
+
+def _decode_cursor(table: database.Table, order_by: List[query.Ordering], cursor: str) -> list:
+    # a cursor is the json list of the values query.Query.cursor returned for the last row
+    types = [query.Query.column_type(table, o.column) for o in order_by[:1] if o.column != 'id']
+    types.append(table.schema.id_type)
+    try:
+        values = json.loads(cursor)
+        if not isinstance(values, list) or len(values) != len(types) or not all(isinstance(v, str) for v in values):
+            raise ValueError
+        return [t.from_string(v) for t, v in zip(types, values)]
+    except ValueError:
+        raise ValueError('Invalid cursor')
+
+
+@router.post("/{database_name}/{table_name}/aggregate", tags=['rows'])
+def aggregate_rows(database_name: str, table_name: str, request: AggregateRequest):
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if not db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    table = db.get_table(table_name)
+    try:
+        a = aggregate.Aggregation(
+            table,
+            aggregates=[aggregate.Aggregate(aggregate.AggregateNames(s.op.lower()), s.column) for s in request.aggregates],
+            group_by=request.group_by,
+            where=[
+                query.Condition.from_strings(
+                    table, c.column, query.Operators(c.op), c.value if isinstance(c.value, list) else [c.value],
+                )
+                for c in request.where
+            ],
+        )
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(e))
+    return {
+        'columns': a.columns,
+        'rows': [aggregate.Aggregation.to_json(r) for r in a.execute()],
+    }
+
+
+@router.post("/{database_name}/{table_name}/join", tags=['rows'])
+def join_rows(database_name: str, table_name: str, request: JoinRequest):
+    # rows of this table joined with the rows of the right table
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if not db.contains(table_name) or not db.contains(request.right):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    limit = request.limit if request.limit is not None else MAX_PAGE_SIZE
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f'Limit must be between 1 and {MAX_PAGE_SIZE}')
+    if request.memory_limit is not None and request.memory_limit <= 0:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Memory limit must be positive')
+    try:
+        j = db.join(table_name, request.right, request.left_on, request.right_on, join.JoinNames(request.how),
+                    request.memory_limit)
+        pairs, cursor = j.page(limit, _decode_join_cursor(request.cursor) if request.cursor is not None else None)
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(e))
+    left, right = db.get_table(table_name), db.get_table(request.right)
+    left_positions = list(range(len(left.schema.column_names) + 1))
+    right_positions = list(range(len(right.schema.column_names) + 1))
+    return {
+        'plan': j.describe(),
+        'columns': j.columns,
+        'rows': [
+            left.schema.codec.to_json(left_row, left_positions)
+            + (right.schema.codec.to_json(right_row, right_positions) if right_row is not None
+               else [None] * len(right_positions))
+            for left_row, right_row in pairs
+        ],
+        'next_cursor': json.dumps(cursor) if cursor is not None else None,
+    }
+
+
+def _decode_join_cursor(cursor: str) -> Tuple[int, ...]:
+    try:
+        values = json.loads(cursor)
+    except ValueError:
+        raise ValueError('Invalid join cursor')
+    if not isinstance(values, list) or not all(type(v) is int for v in values):
+        raise ValueError('Invalid join cursor')
+    return tuple(values)
+
+
+@router.get("/{database_name}/{table_name}/export", tags=['tables'])
+async def export_table(database_name: str, table_name: str, export_format: Union[formats.ExportFormats, None] = None,
+                       accept: Union[str, None] = Header(None), accept_encoding: Union[str, None] = Header(None)):
+    # a single Arrow stream or Parquet file that analytics tools read directly, or JSON
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if not db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    export_format = _export_format(export_format, accept, [formats.ExportFormats.JSON, formats.ExportFormats.ARROW,
+                                                           formats.ExportFormats.PARQUET])
+    encoding = _accept_encoding(accept_encoding, export_format)
+    table = db.get_table(table_name)
+    if export_format is formats.ExportFormats.JSON:
+        chunks = (chunk.encode('utf-8') for chunk in coder.Coder.iter_table_json(table))
+    else:
+        chunks = arrow.ArrowCoder.iter_table_bytes(table, export_format)
+    return await _export_response(chunks, export_format, encoding, formats.MEDIA_TYPES[export_format],
+                                  f'{table_name}.{export_format.value}')
+
+
+@router.post("/{database_name}/{table_name}/import", tags=['tables'])
+async def import_table(database_name: str, table_name: str, table_file: UploadFile):
+    # an Arrow stream or Parquet file; the schema comes from the file
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table already exists')
+    size = table_file.file.seek(0, io.SEEK_END)
+    table_file.file.seek(0)
+    try:
+        table = await run_in_threadpool(arrow.ArrowCoder.read_table, table_file.file, table_name)
+    except ImportError as e:
+        raise HTTPException(HTTPStatus.NOT_IMPLEMENTED, str(e))
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f'Invalid table file: {e}')
+    if db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table already exists')
+    await run_in_threadpool(db.add_table, table)
+    instrumentation.bytes_imported.inc(size, 'table', formats.EncodingNames.IDENTITY.value)
+    return Response(status_code=HTTPStatus.CREATED)
+
+
+@router.get("/{database_name}/{table_name}/{row_id}", tags=['rows'])
+def get_row(database_name: str, table_name: str, row_id: str):
+    if not service.contains(database_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
+    db = service.get_database(database_name)
+    if not db.contains(table_name):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
+    table = db.get_table(table_name)
+    try:
+        identifier = table.schema.id_type.from_string(row_id)
+    except ValueError:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Invalid row id')
+    row = table.get(identifier)
+    if row is None:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Row does not exist')
+    return str(row)
+
+
 @router.delete("/{database_name}/{table_name}/{row_id}", tags=['rows'])
-def delete_row(database_name: str, table_name: str, row_id: int):
-    if database_name not in service.databases:
+def delete_row(database_name: str, table_name: str, row_id: str):
+    if not service.contains(database_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Database does not exist')
     db = service.get_database(database_name)
-    if table_name not in db.tables:
+    if not db.contains(table_name):
         raise HTTPException(HTTPStatus.BAD_REQUEST, 'Table does not exist')
     table = db.get_table(table_name)
-    table.delete(row_id)
+    try:
+        identifier = table.schema.id_type.from_string(row_id)
+    except ValueError:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Invalid row id')
+    try:
+        # the lookup and the removal happen under one write lock
+        table.delete(identifier)
+    except ValueError:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Row does not exist')
     return Response(status_code=HTTPStatus.OK)
 
 
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from core import metrics
+
+
+router = APIRouter(tags=['service'])
+
+
+@router.get("/metrics")
+def get_metrics():
+    return Response(metrics.registry.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,64 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, HTTPException, Response
+
+from api.models import ProfilingConfig
+from api.profiling import ProfileFormats, ProfilerNames, profiler, sampler
+
+
+router = APIRouter(prefix="/profiling", tags=['service'])
+
+
+@router.get("/config")
+def get_config():
+    return profiler.config
+
+
+@router.put("/config")
+def set_config(config: ProfilingConfig):
+    if config.sample_rate is not None and not 0 <= config.sample_rate <= 1:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Sample rate must be between 0 and 1')
+    if config.capacity is not None and config.capacity <= 0:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Capacity must be positive')
+    if config.interval is not None and config.interval <= 0:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Interval must be positive')
+    try:
+        profiler_name = ProfilerNames(config.profiler) if config.profiler is not None else profiler.profiler_name
+    except ValueError:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f'Unknown profiler: {config.profiler}')
+    profiler.profiler_name = profiler_name
+    if config.sampling is not None:
+        profiler.sampling = config.sampling
+    if config.sample_rate is not None:
+        profiler.sample_rate = config.sample_rate
+    if config.header is not None:
+        profiler.header = config.header
+    if config.capacity is not None:
+        profiler.capacity = config.capacity
+    if config.interval is not None:
+        sampler.interval = config.interval
+    return profiler.config
+
+
+@router.get("/")
+def list_profiles():
+    return [r.summary for r in profiler.records]
+
+
+@router.delete("/")
+def clear_profiles():
+    profiler.clear()
+    return Response(status_code=HTTPStatus.OK)
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: int, profile_format: ProfileFormats = ProfileFormats.TEXT, limit: int = 50):
+    record = profiler.get(profile_id)
+    if record is None:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, 'Profile does not exist')
+    if profile_format not in record.formats:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f'Profile is not available as {profile_format.value}')
+    if profile_format is ProfileFormats.PSTATS:
+        return Response(record.render(profile_format), media_type='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename="profile-{profile_id}.pstats"'})
+    return Response(record.render(profile_format, limit), media_type='text/plain; charset=utf-8')
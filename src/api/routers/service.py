@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from api.models import service
+from api.profiling import ProfiledRoute
+
+
+router = APIRouter(prefix="/service", tags=['service'], route_class=ProfiledRoute)
+
+
+@router.get("/cache")
+def cache_stats():
+    return service.stats
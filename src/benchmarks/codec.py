@@ -0,0 +1,191 @@
+import argparse
+import random
+import re
+import time
+from typing import Callable, List
+
+from core import datatypes
+from core.parsing.schema import parse_schema
+from core.row import Row
+from core.schema import TableSchema, TypeNames
+
+
+SCHEMAS = {
+    'int': 'INT id\nINT a\nINT b\nINT c',
+    'money': 'INT id\nMONEY price\nMONEY_INTERVAL price_range\nMONEY cost',
+    'string': 'INT id\nSTRING product_name\nCHAR grade\nSTRING description',
+}
+
+
+def generate_definitions(schema: TableSchema, n: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    generators = {
+        TypeNames.INT: lambda: str(rnd.randrange(1_000_000)),
+        TypeNames.REAL: lambda: str(rnd.random() * 1000),
+        TypeNames.MONEY: lambda: f'${rnd.randrange(100_000)}.{rnd.randrange(100):02d}',
+        TypeNames.MONEY_INTERVAL: lambda: f'${rnd.randrange(1000)}-${rnd.randrange(1000, 2000)}.50',
+        TypeNames.CHAR: lambda: rnd.choice('ABCDE'),
+        TypeNames.STRING: lambda: f'product-{rnd.randrange(10_000)}',
+    }
+    return [
+        '; '.join([str(i), *(generators[tn]() for tn in schema.type_names)])
+        for i in range(n)
+    ]
+
+
+# The baseline implementation, copied from before the row codec: parse_row with the
+# per-call type lookup of TableSchema, and each type's from_string. The parsed values
+# are instances of today's types; only MoneyInterval keeps today's constructor, as the
+# baseline one compared the value strings and rejected valid intervals
+
+
+class LegacyInteger(datatypes.Integer):
+    @staticmethod
+    def from_string(value: str) -> 'LegacyInteger':
+        try:
+            new_value = int(value)
+            instance = LegacyInteger(new_value)
+            if instance.is_valid:
+                return instance
+            else:
+                raise ValueError(f"Invalid integer value: {value}")
+        except ValueError:
+            raise ValueError(f"Invalid integer value: {value}")
+
+
+class LegacyReal(datatypes.Real):
+    @staticmethod
+    def from_string(value: str) -> 'LegacyReal':
+        try:
+            new_value = float(value)
+            instance = LegacyReal(new_value)
+            if instance.is_valid:
+                return instance
+            else:
+                raise ValueError(f"Invalid real number value: {value}")
+        except ValueError:
+            raise ValueError(f"Invalid real number value: {value}")
+
+
+class LegacyMoney(datatypes.Money):
+    @staticmethod
+    def from_string(value: str) -> 'LegacyMoney':
+        pattern = r'^\$\d+(\.\d{2})?$'
+        if re.match(pattern, value):
+            amount_str = value.replace('$', '')
+            if '.' in amount_str:
+                dollars, cents = amount_str.split('.')
+                cents = cents.ljust(2, '0')  # Ensure cents are two digits
+            else:
+                dollars = amount_str
+                cents = '00'
+            amount_cents = int(dollars) * 100 + int(cents)
+            if amount_cents > LegacyMoney.MAX_VALUE:
+                raise ValueError(f"Amount exceeds maximum limit: {value}")
+            instance = LegacyMoney(amount_cents)
+            if instance.is_valid:
+                return instance
+            else:
+                raise ValueError(f"Invalid money value: {value}")
+        else:
+            raise ValueError(f"Invalid format for money: {value}")
+
+
+class LegacyMoneyInterval(datatypes.MoneyInterval):
+    @staticmethod
+    def from_string(value: str) -> 'LegacyMoneyInterval':
+        pattern = r'^\$\d+(\.\d{2})?-\$\d+(\.\d{2})?$'
+        if re.match(pattern, value):
+            lower_str, upper_str = value.split('-')
+            lower = LegacyMoney.from_string(lower_str)
+            upper = LegacyMoney.from_string(upper_str)
+            instance = LegacyMoneyInterval(lower, upper)
+            if instance.is_valid:
+                return instance
+            else:
+                raise ValueError(f"Invalid money interval value: {value}")
+        else:
+            raise ValueError(f"Invalid format for money interval: {value}")
+
+
+class LegacyChar(datatypes.Char):
+    @staticmethod
+    def from_string(value: str) -> 'LegacyChar':
+        if len(value) != 1:
+            raise ValueError("Char must be a single character.")
+        instance = LegacyChar(value)
+        if instance.is_valid:
+            return instance
+        else:
+            raise ValueError(f"Invalid char value: {value}")
+
+
+class LegacyString(datatypes.String):
+    @staticmethod
+    def from_string(value: str) -> 'LegacyString':
+        instance = LegacyString(value)
+        if instance.is_valid:
+            return instance
+        else:
+            raise ValueError(f"Invalid string value: {value}")
+
+
+class LegacySchema:
+    def __init__(self, schema: TableSchema):
+        self._id_type_name = schema.id_type_name
+        self._type_names = schema.type_names
+
+    @property
+    def id_type(self):
+        return self._type_name_to_type(self._id_type_name)
+
+    @property
+    def types(self):
+        return [self._type_name_to_type(n) for n in self._type_names]
+
+    @staticmethod
+    def _type_name_to_type(name: TypeNames):
+        return {
+            TypeNames.STRING: LegacyString,
+            TypeNames.CHAR: LegacyChar,
+            TypeNames.INT: LegacyInteger,
+            TypeNames.REAL: LegacyReal,
+            TypeNames.MONEY: LegacyMoney,
+            TypeNames.MONEY_INTERVAL: LegacyMoneyInterval,
+        }[name]
+
+
+def legacy_parse_row(schema: LegacySchema, definition: str) -> Row:
+    str_values = definition.split(';')
+    identifier = schema.id_type.from_string(str_values[0])
+    values = []
+    for str_v, v_type in zip(str_values[1:], schema.types):
+        values.append(v_type.from_string(str_v.strip()))
+
+    return Row(identifier, values)
+
+
+def rows_per_second(parse: Callable[[str], Row], definitions: List[str]) -> float:
+    start = time.perf_counter()
+    for definition in definitions:
+        parse(definition)
+    return len(definitions) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-cell row parsing with the compiled row codec')
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f'{"schema":>8} {"legacy rows/s":>14} {"codec rows/s":>14} {"speedup":>8}')
+    for name, definition in SCHEMAS.items():
+        schema = parse_schema(definition)
+        definitions = generate_definitions(schema, args.rows)
+        legacy_schema = LegacySchema(schema)
+        legacy = rows_per_second(lambda d: legacy_parse_row(legacy_schema, d), definitions)
+        codec = rows_per_second(schema.codec.parse, definitions)
+        print(f'{name:>8} {legacy:>14.0f} {codec:>14.0f} {codec / legacy:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from core.database import Database
+from core.filesystem.coder import COPY_CHUNK, Coder, Compression
+from core.filesystem.formats import EncodingNames
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.storage import StorageNames
+from core.table import Table
+
+from .codec import SCHEMAS, generate_definitions
+from .memory import SCHEMA
+
+
+def build_database(definition: str, n: int) -> Database:
+    schema = parse_schema(definition)
+    rows = [parse_row(schema, d) for d in generate_definitions(schema, n)]
+    return Database('bench', [Table('bench', schema, rows, StorageNames.COLUMNS)])
+
+
+def best(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def decompress(path: Path) -> None:
+    with Compression.open(path, 'rb') as f:
+        while f.read(COPY_CHUNK):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the size and speed of compressed JSON exports')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    schemas = {'money': SCHEMAS['money'], 'string': SCHEMAS['string'], 'mixed': SCHEMA}
+    encodings = [e for e in EncodingNames if Compression.available(e)]
+    skipped = [e.value for e in EncodingNames if e not in encodings]
+    if skipped:
+        print(f'not installed, skipped: {", ".join(skipped)}')
+    # codec throughput is measured on the uncompressed JSON, apart from encoding the rows;
+    # export and import include it
+    print(f'{"schema":>8} {"codec":>9} {"MB":>7} {"ratio":>6} {"comp MB/s":>10} {"decomp MB/s":>12} '
+          f'{"export s":>9} {"import s":>9}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, definition in schemas.items():
+            db = build_database(definition, args.rows)
+            p_plain = Path(tmp) / f'{name}.json'
+            Coder.export_database(db, p_plain)
+            plain_mb = p_plain.stat().st_size / 2 ** 20
+            for encoding in encodings:
+                p_encoded = Path(tmp) / f'{name}.{encoding.value}'
+                export_s = best(lambda: Coder.export_database(db, p_encoded, encoding), args.repeat)
+                import_s = best(lambda: Coder.import_database(p_encoded), args.repeat)
+                if encoding is EncodingNames.IDENTITY:
+                    compress_s = decompress_s = None
+                else:
+                    p_copy = Path(tmp) / f'{name}.copy.{encoding.value}'
+                    compress_s = best(lambda: Compression.compress_file(p_plain, p_copy, encoding), args.repeat)
+                    decompress_s = best(lambda: decompress(p_copy), args.repeat)
+                size_mb = p_encoded.stat().st_size / 2 ** 20
+                compress_rate = f'{plain_mb / compress_s:.1f}' if compress_s else '-'
+                decompress_rate = f'{plain_mb / decompress_s:.1f}' if decompress_s else '-'
+                print(f'{name:>8} {encoding.value:>9} {size_mb:>7.2f} {plain_mb / size_mb:>6.2f} {compress_rate:>10} '
+                      f'{decompress_rate:>12} {export_s:>9.3f} {import_s:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
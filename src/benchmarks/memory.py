@@ -0,0 +1,59 @@
+import argparse
+import gc
+import random
+import tracemalloc
+
+from core.parsing.schema import parse_schema
+from core.parsing.row import parse_row
+from core.storage import StorageNames
+from core.table import Table
+
+
+SCHEMA = """
+INT id
+STRING product_name
+CHAR grade
+INT quantity
+REAL weight
+MONEY price
+MONEY_INTERVAL price_range
+"""
+
+
+def generate_rows(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    names = [f'product-{i}' for i in range(1000)]
+    for i in range(n):
+        lower = rnd.randrange(0, 10_000)
+        upper = lower + rnd.randrange(0, 10_000)
+        yield (f'{i}; {rnd.choice(names)}; {rnd.choice("ABCDE")}; {rnd.randrange(1000)}; {rnd.random() * 100}; '
+               f'${rnd.randrange(100_000)}.{rnd.randrange(100):02d}; ${lower}-${upper}')
+
+
+def measure(storage_name: StorageNames, n: int) -> int:
+    schema = parse_schema(SCHEMA)
+    gc.collect()
+    tracemalloc.start()
+    table = Table('bench', schema, [], storage_name)
+    for definition in generate_rows(n):
+        table.insert(parse_row(schema, definition))
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory usage of the row and column table layouts')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f'{"rows":>10} {"storage":>8} {"bytes":>14} {"bytes/row":>10}')
+    for n in args.rows:
+        for storage_name in StorageNames:
+            used = measure(storage_name, n)
+            print(f'{n:>10} {storage_name.value:>8} {used:>14} {used / n:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
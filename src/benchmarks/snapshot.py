@@ -0,0 +1,53 @@
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from core.database import Database
+from core.filesystem.coder import Coder
+from core.filesystem.snapshot import SnapshotCoder
+from core.parsing.schema import parse_schema
+from core.parsing.row import parse_row
+from core.storage import StorageNames
+from core.table import Table
+
+from .memory import SCHEMA, generate_rows
+
+
+def build_database(n: int, storage_name: StorageNames) -> Database:
+    schema = parse_schema(SCHEMA)
+    table = Table('bench', schema, [parse_row(schema, d) for d in generate_rows(n)], storage_name)
+    return Database('bench', [table])
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare loading a database from JSON and from a binary snapshot')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--storage', choices=[s.value for s in StorageNames], default=StorageNames.COLUMNS.value)
+    args = parser.parse_args()
+
+    print(f'{"rows":>10} {"json MB":>8} {"snap MB":>8} {"json load s":>12} {"snap open s":>12} {"snap scan s":>12}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            db = build_database(n, StorageNames(args.storage))
+            p_json = Path(tmp) / f'{n}.json'
+            p_snapshot = Path(tmp) / f'{n}.snapshot'
+            Coder.export_database(db, p_json)
+            SnapshotCoder.export_database(db, p_snapshot)
+
+            json_load = timed(lambda: Coder.import_database(p_json))
+            opened = []
+            snapshot_open = timed(lambda: opened.append(SnapshotCoder.import_database(p_snapshot)))
+            snapshot_scan = timed(lambda: sum(1 for _ in opened[0].get_table('bench').iter_rows()))
+            print(f'{n:>10} {p_json.stat().st_size / 2 ** 20:>8.1f} {p_snapshot.stat().st_size / 2 ** 20:>8.1f} '
+                  f'{json_load:>12.3f} {snapshot_open:>12.3f} {snapshot_scan:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from core.aggregate import Aggregate, AggregateNames, Aggregation
+from core.database import Database
+from core.filesystem.coder import Coder
+from core.filesystem.formats import EncodingNames
+from core.parsing.schema import parse_schema
+from core.parsing.row import parse_row
+from core.row import Row
+from core.storage import StorageNames
+from core.table import Table
+
+from .memory import SCHEMA, generate_rows
+
+
+# a case prepares its state, which is not measured, and returns the operation to be
+# measured together with the number of operations it performs
+Case = Callable[[], Tuple[Callable[[], Any], int]]
+
+SCHEMA_PARSES = 1_000
+API_GETS = 1_000
+API_PAGE_SIZE = 1_000
+
+
+class Data:
+    # rows of the generated table over all six types, parsed once per size
+    def __init__(self, n: int, storage_name: StorageNames, directory: Path):
+        self.n = n
+        self.storage_name = storage_name
+        self.directory = directory
+        self.schema = parse_schema(SCHEMA)
+        self.definitions = list(generate_rows(n))
+        self.rows = [parse_row(self.schema, d) for d in self.definitions]
+        # same identifiers, other values
+        self.updates = [parse_row(self.schema, d) for d in generate_rows(n, seed=1)]
+        # every second row repeats the values of the one before it
+        self.duplicates = [Row(r.identifier, self.rows[i - i % 2].values) for i, r in enumerate(self.rows)]
+
+    def table(self, rows: Union[List[Row], None] = None) -> Table:
+        return Table('bench', self.schema, list(self.rows if rows is None else rows), self.storage_name)
+
+
+def core_cases(data: Data) -> Dict[str, Case]:
+    p_json = data.directory / 'bench.json'
+    p_gzip = data.directory / 'bench.json.gz'
+
+    def parse_schema_case():
+        return lambda: [parse_schema(SCHEMA) for _ in range(SCHEMA_PARSES)], SCHEMA_PARSES
+
+    def parse_row_case():
+        return lambda: [parse_row(data.schema, d) for d in data.definitions], data.n
+
+    def insert_case():
+        table = data.table([])
+        return lambda: [table.insert(r) for r in data.rows], data.n
+
+    def update_case():
+        table = data.table()
+        return lambda: [table.update(r) for r in data.updates], data.n
+
+    def delete_case():
+        table = data.table()
+        identifiers = [r.identifier for r in data.rows]
+        random.Random(0).shuffle(identifiers)
+        return lambda: [table.delete(i) for i in identifiers], data.n
+
+    def validate_case():
+        table = data.table()
+        return table.validate, data.n
+
+    def drop_duplicates_case():
+        table = data.table(data.duplicates)
+        return table.drop_duplicates, data.n
+
+    def to_df_case():
+        table = data.table()
+        return table.to_df, data.n
+
+    def aggregate_case():
+        table = data.table()
+        table.to_df()
+        aggregates = [Aggregate(AggregateNames.COUNT), Aggregate(AggregateNames.SUM, 'price'),
+                      Aggregate(AggregateNames.AVG, 'weight'), Aggregate(AggregateNames.SPAN, 'price_range')]
+        return Aggregation(table, aggregates, ['grade']).execute, data.n
+
+    def export_case():
+        database = Database('bench', [data.table()])
+        return lambda: Coder.export_database(database, p_json), data.n
+
+    def import_case():
+        Coder.export_database(Database('bench', [data.table()]), p_json)
+        return lambda: Coder.import_database(p_json), data.n
+
+    def export_gzip_case():
+        database = Database('bench', [data.table()])
+        return lambda: Coder.export_database(database, p_gzip, EncodingNames.GZIP), data.n
+
+    def import_gzip_case():
+        Coder.export_database(Database('bench', [data.table()]), p_gzip, EncodingNames.GZIP)
+        return lambda: Coder.import_database(p_gzip), data.n
+
+    return {
+        'parse_schema': parse_schema_case,
+        'parse_row': parse_row_case,
+        'table.insert': insert_case,
+        'table.update': update_case,
+        'table.delete': delete_case,
+        'table.validate': validate_case,
+        'table.drop_duplicates': drop_duplicates_case,
+        'table.to_df': to_df_case,
+        'table.aggregate': aggregate_case,
+        'coder.export': export_case,
+        'coder.import': import_case,
+        'coder.export.gzip': export_gzip_case,
+        'coder.import.gzip': import_gzip_case,
+    }
+
+
+def api_cases(data: Data) -> Dict[str, Case]:
+    # the endpoints are called through an in-process client, so no server is needed
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError:
+        print('fastapi is not installed, the API is not benchmarked', file=sys.stderr)
+        return {}
+    # the app builds its service from the environment when it is first imported; without these
+    # variables that is a fresh service in memory, so no data of a configured server is touched
+    for variable in ('DB_DATA_DIR', 'DB_CATALOG_DIR', 'DB_MEMORY_BUDGET'):
+        os.environ.pop(variable, None)
+    from api import models
+    if models.durability is not None or models.catalog_dir is not None:
+        print('the API was already set up with stored data, it is not benchmarked', file=sys.stderr)
+        return {}
+    from api.__main__ import app
+
+    client = TestClient(app)
+    body = '\n'.join(data.definitions)
+    p_json = data.directory / 'bench.json'
+    # only databases created here are ever deleted
+    created = ['bench', 'imported']
+
+    def reset(with_table: bool) -> None:
+        for name in created:
+            client.delete(f'/databases/{name}')
+        client.post('/databases/create', params={'database_name': 'bench'})
+        client.post('/databases/bench/create', params={'table_name': 'bench'}, content=SCHEMA,
+                    headers={'content-type': 'text/plain'})
+        if with_table:
+            client.post('/databases/bench/bench/bulk', content=body)
+
+    def bulk_insert_case():
+        reset(False)
+        return lambda: client.post('/databases/bench/bench/bulk', content=body), data.n
+
+    def list_rows_case():
+        reset(True)
+
+        def run():
+            cursor = None
+            while True:
+                params = {'limit': API_PAGE_SIZE, **({'cursor': cursor} if cursor is not None else {})}
+                cursor = client.get('/databases/bench/bench', params=params).json()['next_cursor']
+                if cursor is None:
+                    return
+        return run, data.n
+
+    def get_row_case():
+        reset(True)
+        rnd = random.Random(0)
+        identifiers = [rnd.randrange(data.n) for _ in range(API_GETS)]
+        return lambda: [client.get(f'/databases/bench/bench/{i}') for i in identifiers], API_GETS
+
+    def query_case():
+        reset(True)
+        request = {'where': [{'column': 'price', 'op': '<', 'value': '$500'}],
+                   'order_by': [{'column': 'price'}], 'limit': 100}
+        return lambda: client.post('/databases/bench/bench/query', json=request), data.n
+
+    def export_case():
+        reset(True)
+        return lambda: client.get('/databases/bench/export').content, data.n
+
+    def import_case():
+        reset(False)
+        Coder.export_database(Database('imported', [data.table()]), p_json)
+        content = p_json.read_bytes()
+
+        def run():
+            client.post('/databases/import', files={'db_file': ('imported.json', content)})
+            client.delete('/databases/imported')
+        return run, data.n
+
+    return {
+        'api.bulk_insert': bulk_insert_case,
+        'api.list_rows': list_rows_case,
+        'api.get_row': get_row_case,
+        'api.query': query_case,
+        'api.export': export_case,
+        'api.import': import_case,
+    }
+
+
+def measure(case: Case, repeat: int, memory: bool) -> Dict[str, Any]:
+    times = []
+    operations = 0
+    for _ in range(repeat):
+        run, operations = case()
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    result = {
+        'seconds': min(times),
+        'mean_seconds': sum(times) / len(times),
+        'operations': operations,
+        'operations_per_second': operations / min(times) if min(times) else None,
+    }
+    if memory:
+        # a separate run, tracing slows the operation down; only what it allocates counts
+        run, _ = case()
+        gc.collect()
+        tracemalloc.start()
+        run()
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def run_suite(sizes: List[int], storage_names: List[StorageNames], repeat: int, memory: bool, api: bool,
+              selected: List[str]) -> Dict[str, Any]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            for storage_name in storage_names:
+                data = Data(n, storage_name, Path(tmp))
+                cases = core_cases(data)
+                if api:
+                    cases.update(api_cases(data))
+                for name, case in cases.items():
+                    if selected and not any(name.startswith(s) for s in selected):
+                        continue
+                    key = f'{name}/{storage_name.value}/{n}'
+                    results[key] = {'case': name, 'storage': storage_name.value, 'rows': n,
+                                    **measure(case, repeat, memory)}
+                    print_result(key, results[key])
+    return {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def print_result(key: str, result: Dict[str, Any]) -> None:
+    peak = result.get('peak_bytes')
+    print(f'{key:<40} {result["seconds"]:>10.4f} s {result["operations_per_second"] or 0:>12.0f} ops/s '
+          f'{peak / 2 ** 20 if peak is not None else float("nan"):>9.1f} MiB')
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, memory_threshold: float,
+            min_seconds: float) -> List[str]:
+    # results slower (or using more memory) than the baseline by more than the threshold;
+    # very short timings are too noisy to compare
+    regressions = []
+    for key, new in current['results'].items():
+        old = baseline['results'].get(key)
+        if old is None:
+            continue
+        if old['seconds'] >= min_seconds and new['seconds'] > old['seconds'] * (1 + threshold):
+            regressions.append(f'{key}: {old["seconds"]:.4f} s -> {new["seconds"]:.4f} s '
+                               f'(+{new["seconds"] / old["seconds"] - 1:.0%})')
+        old_peak = old.get('peak_bytes')
+        new_peak = new.get('peak_bytes')
+        if old_peak and new_peak is not None and new_peak > old_peak * (1 + memory_threshold):
+            regressions.append(f'{key}: peak {old_peak} B -> {new_peak} B (+{new_peak / old_peak - 1:.0%})')
+    return regressions
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the core operations and API endpoints and compare the results '
+                                                 'with an earlier run')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--storage', choices=[s.value for s in StorageNames], nargs='+',
+                        default=[StorageNames.ROWS.value])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cases', nargs='*', default=[], help='only run cases whose name starts with one of these')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run that records peak memory')
+    parser.add_argument('--no-api', action='store_true')
+    parser.add_argument('--output', type=Path, default=Path('benchmark-results.json'))
+    parser.add_argument('--baseline', type=Path, help='results of an earlier run to check for regressions')
+    parser.add_argument('--compare-only', type=Path,
+                        help='compare these results with the baseline instead of running the suite')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--memory-threshold', type=float, default=0.2, help='allowed relative growth of peak memory')
+    parser.add_argument('--min-seconds', type=float, default=0.001, help='timings below this are not compared')
+    args = parser.parse_args()
+    assert args.compare_only is None or args.baseline is not None, 'Comparing requires a baseline'
+
+    if args.compare_only is not None:
+        current = json.loads(args.compare_only.read_text())
+    else:
+        current = run_suite(args.rows, [StorageNames(s) for s in args.storage], args.repeat, not args.no_memory,
+                            not args.no_api, args.cases)
+        args.output.write_text(json.dumps(current, indent=2))
+        print(f'Results written to {args.output}')
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(baseline, current, args.threshold, args.memory_threshold, args.min_seconds)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.baseline} ({baseline["meta"].get("commit") or "unknown commit"})')
+
+
+if __name__ == '__main__':
+    main()
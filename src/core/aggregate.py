@@ -0,0 +1,247 @@
+from enum import Enum
+from typing import Any, Dict, List, Sequence, Union
+
+import numpy as np
+
+from . import datatypes
+from .query import Condition, Operators
+from .schema import TableSchema, TypeNames
+from .table import Table
+
+
+class AggregateNames(Enum):
+    COUNT = 'count'
+    SUM = 'sum'
+    MIN = 'min'
+    MAX = 'max'
+    AVG = 'avg'
+    # of money intervals: how much money the union of the intervals covers,
+    # and the smallest interval containing all of them
+    SPAN = 'span'
+    HULL = 'hull'
+
+
+NUMBERS = {TypeNames.INT, TypeNames.REAL, TypeNames.MONEY}
+ORDERED = NUMBERS | {TypeNames.STRING, TypeNames.CHAR}
+SUPPORTED_TYPES = {
+    AggregateNames.COUNT: set(TypeNames),
+    AggregateNames.SUM: NUMBERS,
+    AggregateNames.AVG: NUMBERS,
+    AggregateNames.MIN: ORDERED,
+    AggregateNames.MAX: ORDERED,
+    AggregateNames.SPAN: {TypeNames.MONEY_INTERVAL},
+    AggregateNames.HULL: {TypeNames.MONEY_INTERVAL},
+}
+
+Value = Union[datatypes.DataType, None]
+
+
+class Aggregate:
+    # COUNT without a column counts rows
+    def __init__(self, name: AggregateNames, column: Union[str, None] = None):
+        self._name = name
+        self._column = column
+
+    @property
+    def name(self) -> AggregateNames:
+        return self._name
+
+    @property
+    def column(self) -> Union[str, None]:
+        return self._column
+
+    @property
+    def label(self) -> str:
+        return f'{self._name.value}({self._column or "*"})'
+
+
+class Aggregation:
+    # aggregates over the table's column buffers (see TableFrame); rows are only
+    # touched through numpy, money stays in integer cents
+    def __init__(self, table: Table, aggregates: List[Aggregate], group_by: Union[List[str], None] = None,
+                 where: Union[List[Condition], None] = None):
+        self._table = table
+        self._aggregates = aggregates
+        self._group_by = group_by or []
+        self._where = where or []
+        sch = table.schema
+        self._types: Dict[str, TypeNames] = dict(zip(['id', *sch.column_names], [sch.id_type_name, *sch.type_names]))
+        if not aggregates and not self._group_by:
+            raise ValueError('Nothing to aggregate')
+        for column in self._group_by:
+            if column not in self._types:
+                raise ValueError(f'Unknown column: {column}')
+        for aggregate in aggregates:
+            if aggregate.column is None:
+                if aggregate.name is not AggregateNames.COUNT:
+                    raise ValueError(f'Aggregate {aggregate.name.value} needs a column')
+            elif aggregate.column not in self._types:
+                raise ValueError(f'Unknown column: {aggregate.column}')
+            elif self._types[aggregate.column] not in SUPPORTED_TYPES[aggregate.name]:
+                raise ValueError(f'Aggregate {aggregate.name.value} is not supported for column {aggregate.column}')
+
+    @property
+    def columns(self) -> List[str]:
+        return [*self._group_by, *(a.label for a in self._aggregates)]
+
+    def execute(self) -> List[List[Value]]:
+        # one row per group in the order of the group keys: the keys, then the aggregates
+        needed = list(dict.fromkeys(['id', *self._group_by, *(c.column for c in self._where),
+                                     *(a.column for a in self._aggregates if a.column is not None)]))
+        arrays = self._table.column_arrays(needed)
+        if self._where:
+            mask = np.ones(len(arrays['id'][0]), dtype=bool)
+            for condition in self._where:
+                mask &= Aggregation._matches(condition, arrays[condition.column])
+            arrays = {c: [part[mask] for part in parts] for c, parts in arrays.items()}
+        n = len(arrays['id'][0])
+
+        if not self._group_by:
+            if not n:
+                return [[datatypes.Integer(0) if a.name is AggregateNames.COUNT else None for a in self._aggregates]]
+            groups = np.zeros(n, dtype=np.int64)
+            keys: List[List[Value]] = [[]]
+        elif not n:
+            return []
+        else:
+            groups, keys = self._groups(arrays)
+        order = np.argsort(groups, kind='stable')
+        sorted_groups = groups[order]
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+        counts = np.diff(np.r_[starts, n]).tolist()
+
+        results = [self._aggregate(a, arrays, groups, order, starts, counts) for a in self._aggregates]
+        return [[*key, *(r[i] for r in results)] for i, key in enumerate(keys)]
+
+    @staticmethod
+    def to_json(row: Sequence[Value]) -> List[Any]:
+        # as RowCodec.to_json: money is rendered as text so that it stays exact
+        return [None if v is None else v.value if isinstance(v, (datatypes.Money, datatypes.MoneyInterval))
+                else v.native for v in row]
+
+    def _groups(self, arrays: Dict[str, List[np.ndarray]]):
+        # numbers each row's group by the order of its key and returns the keys
+        uniques = []
+        codes = []
+        for column in self._group_by:
+            for part in arrays[column]:
+                unique, inverse = np.unique(part, return_inverse=True)
+                uniques.append(unique)
+                codes.append(inverse.reshape(-1))
+        if len(codes) == 1:
+            key_codes = np.arange(len(uniques[0]))[:, None]
+            groups = codes[0]
+        else:
+            key_codes, groups = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+            groups = groups.reshape(-1)
+        key_parts = [unique[key_codes[:, k]].tolist() for k, unique in enumerate(uniques)]
+        keys = []
+        for i in range(len(key_codes)):
+            key = []
+            k = 0
+            for column in self._group_by:
+                d_type = TableSchema._type_name_to_type(self._types[column])
+                if self._types[column] is TypeNames.MONEY_INTERVAL:
+                    key.append(d_type.from_native((key_parts[k][i], key_parts[k + 1][i])))
+                    k += 2
+                else:
+                    key.append(d_type.from_native(key_parts[k][i]))
+                    k += 1
+            keys.append(key)
+        return groups, keys
+
+    def _aggregate(self, aggregate: Aggregate, arrays: Dict[str, List[np.ndarray]], groups: np.ndarray,
+                   order: np.ndarray, starts: np.ndarray, counts: List[int]) -> List[Value]:
+        name = aggregate.name
+        if name is AggregateNames.COUNT:
+            return [datatypes.Integer(c) for c in counts]
+        type_name = self._types[aggregate.column]
+        d_type = TableSchema._type_name_to_type(type_name)
+        parts = arrays[aggregate.column]
+        if name is AggregateNames.SPAN:
+            return [datatypes.Money(s) for s in Aggregation._union_spans(*parts, groups, starts)]
+        if name is AggregateNames.HULL:
+            lower, upper = (part[order] for part in parts)
+            return [datatypes.MoneyInterval(datatypes.Money(lo), datatypes.Money(hi)) for lo, hi in
+                    zip(np.minimum.reduceat(lower, starts).tolist(), np.maximum.reduceat(upper, starts).tolist())]
+        values = parts[0][order]
+        if name is AggregateNames.MIN:
+            return [d_type.from_native(v) for v in np.minimum.reduceat(values, starts).tolist()]
+        if name is AggregateNames.MAX:
+            return [d_type.from_native(v) for v in np.maximum.reduceat(values, starts).tolist()]
+        sums = Aggregation._sums(values, starts)
+        if name is AggregateNames.SUM:
+            return [d_type.from_native(s) for s in sums]
+        if type_name is TypeNames.MONEY:
+            # rounded half up to whole cents
+            return [datatypes.Money((2 * s + c) // (2 * c)) for s, c in zip(sums, counts)]
+        return [datatypes.Real(s / c) for s, c in zip(sums, counts)]
+
+    @staticmethod
+    def _sums(values: np.ndarray, starts: np.ndarray) -> list:
+        if values.dtype != np.int64:
+            # reals, and integers beyond 64 bits that are kept as Python objects
+            return np.add.reduceat(values, starts).tolist()
+        # integer sums are exact: the halves of each value are summed separately,
+        # neither of the two sums can overflow, and they are combined as Python ints
+        high = np.add.reduceat(values >> 32, starts).tolist()
+        low = np.add.reduceat(values & 0xFFFFFFFF, starts).tolist()
+        return [(h << 32) + lo for h, lo in zip(high, low)]
+
+    @staticmethod
+    def _union_spans(lower: np.ndarray, upper: np.ndarray, groups: np.ndarray, starts: np.ndarray) -> List[int]:
+        # intervals sorted by group and lower bound; each one adds what it reaches beyond
+        # the highest upper bound of the intervals before it in its group
+        order = np.lexsort((lower, groups))
+        lower, upper, groups = lower[order], upper[order], groups[order]
+        # bounds are replaced by their ranks and moved up by group, so a single running
+        # maximum never carries over from one group into the next
+        bounds = np.unique(upper)
+        shift = groups * len(bounds)
+        reach = np.maximum.accumulate(np.searchsorted(bounds, upper) + shift)
+        covered = np.empty_like(lower)
+        covered[1:] = bounds[reach[:-1] - shift[1:]]
+        first = np.zeros(len(lower), dtype=bool)
+        first[starts] = True
+        covered[first] = lower[first]
+        added = np.maximum(upper - np.maximum(lower, covered), 0)
+        return Aggregation._sums(added, starts)
+
+    @staticmethod
+    def _matches(condition: Condition, parts: List[np.ndarray]) -> np.ndarray:
+        operator = condition.operator
+        operands = [o.native for o in condition.operands]
+        if len(parts) == 2:
+            lower, upper = parts
+            if operator is Operators.CONTAINS:
+                return (lower <= operands[0]) & (operands[0] <= upper)
+            if operator is Operators.OVERLAPS:
+                return (lower <= operands[0][1]) & (operands[0][0] <= upper)
+            # intervals compare as (lower, upper) pairs
+            if operator is Operators.EQ:
+                return (lower == operands[0][0]) & (upper == operands[0][1])
+            if operator is Operators.LT:
+                return Aggregation._before(lower, upper, operands[0])
+            if operator is Operators.GT:
+                return Aggregation._after(lower, upper, operands[0])
+            return ~Aggregation._before(lower, upper, operands[0]) & ~Aggregation._after(lower, upper, operands[1])
+        values = parts[0]
+        if operator is Operators.EQ:
+            result = values == operands[0]
+        elif operator is Operators.LT:
+            result = values < operands[0]
+        elif operator is Operators.GT:
+            result = values > operands[0]
+        elif operator is Operators.BETWEEN:
+            result = (operands[0] <= values) & (values <= operands[1])
+        else:
+            result = np.char.startswith(values.astype(str), operands[0])
+        return np.asarray(result, dtype=bool)
+
+    @staticmethod
+    def _before(lower: np.ndarray, upper: np.ndarray, bound: Sequence[int]) -> np.ndarray:
+        return (lower < bound[0]) | ((lower == bound[0]) & (upper < bound[1]))
+
+    @staticmethod
+    def _after(lower: np.ndarray, upper: np.ndarray, bound: Sequence[int]) -> np.ndarray:
+        return (lower > bound[0]) | ((lower == bound[0]) & (upper > bound[1]))
@@ -0,0 +1,61 @@
+from typing import Any, Callable, List, Sequence, Type
+
+from .row import Row
+from . import datatypes
+
+
+class RowCodec:
+    def __init__(self, id_type: Type[datatypes.DataType], types: List[Type[datatypes.DataType]]):
+        self._id_type = id_type
+        self._types = tuple(types)
+        self._id_parser: Callable[[str], datatypes.DataType] = id_type.from_string
+        self._parsers = tuple(t.from_string for t in types)
+        self._width = len(types) + 1
+
+    def parse(self, definition: str) -> Row:
+        str_values = definition.split(';')
+        if len(str_values) != self._width:
+            raise ValueError(f'Expected {self._width} values, got {len(str_values)}')
+        return Row(
+            self._id_parser(str_values[0]),
+            [parse(s.strip()) for parse, s in zip(self._parsers, str_values[1:])],
+        )
+
+    def decode(self, encoded: Sequence) -> Row:
+        if not isinstance(encoded, (list, tuple)):
+            raise ValueError(f'Expected a list of values, got {type(encoded).__name__}')
+        if len(encoded) != self._width:
+            raise ValueError(f'Expected {self._width} values, got {len(encoded)}')
+        return Row(
+            self._id_parser(str(encoded[0])),
+            [parse(str(s)) for parse, s in zip(self._parsers, encoded[1:])],
+        )
+
+    @staticmethod
+    def encode(row: Row) -> List[str]:
+        return [row.identifier.value, *[v.value for v in row.values]]
+
+    @staticmethod
+    def to_json(row: Row, positions: Sequence[int]) -> List[Any]:
+        # position 0 is the identifier; numbers and text are kept native,
+        # money is rendered as text so that it stays exact
+        values = [row.identifier, *row.values]
+        return [RowCodec._json_value(values[p]) for p in positions]
+
+    @staticmethod
+    def _json_value(value: datatypes.DataType) -> Any:
+        if isinstance(value, (datatypes.Money, datatypes.MoneyInterval)):
+            return value.value
+        return value.native
+
+    def validate(self, row: Row) -> bool:
+        identifier = row.identifier
+        if type(identifier) is not self._id_type or not identifier.is_valid:
+            return False
+        values = row.values
+        if len(values) != len(self._types):
+            return False
+        for v, d_type in zip(values, self._types):
+            if type(v) is not d_type or not v.is_valid:
+                return False
+        return True
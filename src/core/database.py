@@ -1,35 +1,89 @@
-from typing import List, Union
+import threading
+from typing import Any, Dict, List, Tuple, Union
 
-from .table import Table
+from .join import HashJoin, JoinNames
+from .table import Journal, Table
 
 
 class Database:
 
     def __init__(self, name: str, tables: List[Table]) -> None:
         self._name = name
-        self._tables = tables
+        self._tables: Dict[str, Table] = {}
+        for table in tables:
+            assert table.name not in self._tables, 'Table name must be unique'
+            self._tables[table.name] = table
+        self._journal: Union[Journal, None] = None
+        self._lock = threading.RLock()
+        self._version = 0
 
     @property
     def name(self) -> str:
         return self._name
 
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
     @property
     def tables(self) -> List[str]:
-        return [t.name for t in self._tables]
+        with self._lock:
+            return list(self._tables)
+
+    @property
+    def version(self) -> Tuple[int, ...]:
+        # changes whenever a table is added, removed or modified
+        with self._lock:
+            return (self._version, *(t.version for t in self._tables.values()))
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(t.nbytes for t in self._tables.values())
+
+    def contains(self, table_name: str) -> bool:
+        return table_name in self._tables
 
     def get_table(self, name: str) -> Union[Table, None]:
-        tables = [t for t in self._tables if t.name == name]
-        if len(tables) == 0:
-            return None
-        return tables[0]
+        return self._tables.get(name)
+
+    def join(self, left: str, right: str, left_on: str = 'id', right_on: str = 'id',
+             how: JoinNames = JoinNames.INNER, memory_limit: Union[int, None] = None) -> HashJoin:
+        for table_name in (left, right):
+            if table_name not in self._tables:
+                raise ValueError(f'Table {table_name} is not in the database')
+        return HashJoin(self._tables[left], self._tables[right], left_on, right_on, how, memory_limit)
+
+    def attach_journal(self, journal: Union[Journal, None]) -> None:
+        with self._lock:
+            self._journal = journal
+            for table in self._tables.values():
+                table.attach_journal(self._record if journal is not None else None)
 
     def add_table(self, table: Table) -> None:
-        assert table.name not in [t.name for t in self._tables], 'Table name must be unique'
-        self._tables.append(table)
+        with self._lock:
+            assert table.name not in self._tables, 'Table name must be unique'
+            self._tables[table.name] = table
+            self._version += 1
+            if self._journal is not None:
+                table.attach_journal(self._record)
+                self._record({'op': 'add_table', 'table': table.name, 'object': table})
 
     def remove_table(self, table_name) -> None:
-        for i in range(len(self._tables)):
-            if self._tables[i].name == table_name:
-                del self._tables[i]
-                return
-        raise ValueError(f'Table {table_name} is not in the database')
+        with self._lock:
+            table = self._tables.pop(table_name, None)
+            if table is None:
+                raise ValueError(f'Table {table_name} is not in the database')
+            table.attach_journal(None)
+            self._version += 1
+            if self._journal is not None:
+                self._record({'op': 'remove_table', 'table': table_name})
+
+    def close(self) -> None:
+        # unmaps the snapshot files the tables are read from; the tables cannot be read afterwards
+        with self._lock:
+            for table in self._tables.values():
+                table.store.close()
+
+    def _record(self, entry: Dict[str, Any]) -> None:
+        self._journal({'db': self._name, **entry})
@@ -27,3 +27,11 @@ class Char(DataType):
     @property
     def value(self) -> str:
         return self._value
+
+    @property
+    def native(self) -> str:
+        return self._value
+
+    @staticmethod
+    def from_native(value: str) -> 'Char':
+        return Char(value)
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Any
 
 
 class DataType(ABC):
@@ -20,3 +21,13 @@ class DataType(ABC):
     @abstractmethod
     def value(self) -> str:
         ...
+
+    @property
+    @abstractmethod
+    def native(self) -> Any:
+        ...
+
+    @staticmethod
+    @abstractmethod
+    def from_native(value: Any) -> 'DataType':
+        ...
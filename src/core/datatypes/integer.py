@@ -11,14 +11,9 @@ class Integer(DataType):
     @staticmethod
     def from_string(value: str) -> 'Integer':
         try:
-            new_value = int(value)
-            instance = Integer(new_value)
-            if instance.is_valid:
-                return instance
-            else:
-                raise ValueError(f"Invalid integer value: {value}")
+            return Integer(int(value))
         except ValueError:
-            raise ValueError(f"Invalid integer value: {value}")
+            raise ValueError(f"Invalid integer value: {value}") from None
 
     @property
     def is_valid(self) -> bool:
@@ -27,3 +22,11 @@ class Integer(DataType):
     @property
     def value(self) -> str:
         return str(self._value)
+
+    @property
+    def native(self) -> int:
+        return self._value
+
+    @staticmethod
+    def from_native(value: int) -> 'Integer':
+        return Integer(value)
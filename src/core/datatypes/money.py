@@ -5,6 +5,7 @@ from .data_type import DataType
 
 class Money(DataType):
     MAX_VALUE = 10_000_000_000_000 * 100  # Maximum value in cents (10 trillion)
+    PATTERN = re.compile(r'^\$(\d+)(?:\.(\d{2}))?$')
 
     def __init__(self, amount_cents: int):
         self._value = amount_cents
@@ -16,25 +17,14 @@ class Money(DataType):
 
     @staticmethod
     def from_string(value: str) -> 'Money':
-        pattern = r'^\$\d+(\.\d{2})?$'
-        if re.match(pattern, value):
-            amount_str = value.replace('$', '')
-            if '.' in amount_str:
-                dollars, cents = amount_str.split('.')
-                cents = cents.ljust(2, '0')  # Ensure cents are two digits
-            else:
-                dollars = amount_str
-                cents = '00'
-            amount_cents = int(dollars) * 100 + int(cents)
-            if amount_cents > Money.MAX_VALUE:
-                raise ValueError(f"Amount exceeds maximum limit: {value}")
-            instance = Money(amount_cents)
-            if instance.is_valid:
-                return instance
-            else:
-                raise ValueError(f"Invalid money value: {value}")
-        else:
+        match = Money.PATTERN.match(value)
+        if match is None:
             raise ValueError(f"Invalid format for money: {value}")
+        dollars, cents = match.groups()
+        amount_cents = int(dollars) * 100 + int(cents or 0)
+        if amount_cents > Money.MAX_VALUE:
+            raise ValueError(f"Amount exceeds maximum limit: {value}")
+        return Money(amount_cents)
 
     @property
     def is_valid(self) -> bool:
@@ -42,4 +32,12 @@ class Money(DataType):
 
     @property
     def value(self) -> str:
-        return f'${self._value}'
+        return str(self)
+
+    @property
+    def native(self) -> int:
+        return self._value
+
+    @staticmethod
+    def from_native(value: int) -> 'Money':
+        return Money(value)
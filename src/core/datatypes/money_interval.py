@@ -1,12 +1,15 @@
 import re
+from typing import Tuple
 
 from .data_type import DataType
 from .money import Money
 
 
 class MoneyInterval(DataType):
+    PATTERN = re.compile(r'^(\$\d+(?:\.\d{2})?)-(\$\d+(?:\.\d{2})?)$')
+
     def __init__(self, lower: Money, upper: Money):
-        if lower.value > upper.value:
+        if lower.native > upper.native:
             raise ValueError("Lower bound must be less than or equal to upper bound.")
         self._lower = lower
         self._upper = upper
@@ -16,23 +19,31 @@ class MoneyInterval(DataType):
 
     @staticmethod
     def from_string(value: str) -> 'MoneyInterval':
-        pattern = r'^\$\d+(\.\d{2})?-\$\d+(\.\d{2})?$'
-        if re.match(pattern, value):
-            lower_str, upper_str = value.split('-')
-            lower = Money.from_string(lower_str)
-            upper = Money.from_string(upper_str)
-            instance = MoneyInterval(lower, upper)
-            if instance.is_valid:
-                return instance
-            else:
-                raise ValueError(f"Invalid money interval value: {value}")
-        else:
+        match = MoneyInterval.PATTERN.match(value)
+        if match is None:
             raise ValueError(f"Invalid format for money interval: {value}")
+        return MoneyInterval(Money.from_string(match[1]), Money.from_string(match[2]))
 
     @property
     def is_valid(self) -> bool:
-        return self._lower.is_valid and self._upper.is_valid and self._lower.value <= self._upper.value
+        return self._lower.is_valid and self._upper.is_valid and self._lower.native <= self._upper.native
 
     @property
     def value(self) -> str:
         return f'{self._lower.value}-{self._upper.value}'
+
+    @property
+    def lower(self) -> Money:
+        return self._lower
+
+    @property
+    def upper(self) -> Money:
+        return self._upper
+
+    @property
+    def native(self) -> Tuple[int, int]:
+        return self._lower.native, self._upper.native
+
+    @staticmethod
+    def from_native(value: Tuple[int, int]) -> 'MoneyInterval':
+        return MoneyInterval(Money(value[0]), Money(value[1]))
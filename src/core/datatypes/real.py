@@ -11,14 +11,9 @@ class Real(DataType):
     @staticmethod
     def from_string(value: str) -> 'Real':
         try:
-            new_value = float(value)
-            instance = Real(new_value)
-            if instance.is_valid:
-                return instance
-            else:
-                raise ValueError(f"Invalid real number value: {value}")
+            return Real(float(value))
         except ValueError:
-            raise ValueError(f"Invalid real number value: {value}")
+            raise ValueError(f"Invalid real number value: {value}") from None
 
     @property
     def is_valid(self) -> bool:
@@ -27,3 +22,11 @@ class Real(DataType):
     @property
     def value(self) -> str:
         return str(self._value)
+
+    @property
+    def native(self) -> float:
+        return self._value
+
+    @staticmethod
+    def from_native(value: float) -> 'Real':
+        return Real(value)
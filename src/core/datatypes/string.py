@@ -23,3 +23,11 @@ class String(DataType):
     @property
     def value(self) -> str:
         return self._value
+
+    @property
+    def native(self) -> str:
+        return self._value
+
+    @staticmethod
+    def from_native(value: str) -> 'String':
+        return String(value)
@@ -0,0 +1,105 @@
+import tempfile
+from array import array
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+from . import storage
+
+
+class KeepNames(Enum):
+    # first and last by identifier: the order of the store changes with every delete,
+    # while the identifiers give the same choice after deletes, reloads and replays
+    FIRST = 'first'
+    LAST = 'last'
+
+
+class Deduplicator:
+    # rough cost of one fingerprint in the in-memory table (key, position and dict slot)
+    ENTRY_BYTES = 100
+    DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+    CHUNK_ENTRIES = 8192
+
+    def __init__(self, store: storage.Store, positions: List[int], keep: KeepNames = KeepNames.FIRST,
+                 memory_limit: Union[int, None] = None):
+        assert positions, 'At least one column must be compared'
+        self._store = store
+        self._positions = positions
+        self._keep = keep
+        self._memory_limit = memory_limit or Deduplicator.DEFAULT_MEMORY_LIMIT
+        self._removed = bytearray(len(store))
+
+    @property
+    def partitions(self) -> int:
+        return max(1, -(-len(self._store) * Deduplicator.ENTRY_BYTES // self._memory_limit))
+
+    def retained(self) -> List[int]:
+        # positions of the rows that survive, in their original order
+        partitions = self.partitions
+        if partitions == 1:
+            self._deduplicate(self._fingerprints())
+        else:
+            for entries in self._spill(partitions):
+                self._deduplicate(entries)
+        return [i for i, removed in enumerate(self._removed) if not removed]
+
+    def _fingerprints(self) -> Iterator[Tuple[int, int]]:
+        columns = [self._store.natives(p) for p in self._positions]
+        for i, key in enumerate(zip(*columns)):
+            yield hash(key), i
+
+    def _key(self, index: int) -> Tuple[Any, ...]:
+        row = self._store.row(index)
+        return tuple((row.identifier if p == 0 else row.values[p - 1]).native for p in self._positions)
+
+    def _deduplicate(self, entries: Iterable[Tuple[int, int]]) -> None:
+        # a fingerprint normally maps to a single position; a list only appears
+        # when different keys collide, so every match is verified against the rows
+        seen: Dict[int, Union[int, List[int]]] = {}
+        removed = self._removed
+        keep_first = self._keep is KeepNames.FIRST
+        identifier = self._store.identifier
+        for fingerprint, i in entries:
+            kept = seen.get(fingerprint)
+            if kept is None:
+                seen[fingerprint] = i
+                continue
+            candidates = kept if isinstance(kept, list) else [kept]
+            key = self._key(i)
+            for j, candidate in enumerate(candidates):
+                if self._key(candidate) == key:
+                    if (identifier(i).native < identifier(candidate).native) == keep_first:
+                        removed[candidate] = 1
+                        candidates[j] = i
+                    else:
+                        removed[i] = 1
+                    break
+            else:
+                candidates.append(i)
+            seen[fingerprint] = candidates if len(candidates) > 1 else candidates[0]
+
+    def _spill(self, partitions: int) -> Iterator[Iterable[Tuple[int, int]]]:
+        # rows with equal keys share a fingerprint and therefore a partition,
+        # so each partition can be deduplicated on its own within the memory limit
+        files = [tempfile.TemporaryFile() for _ in range(partitions)]
+        try:
+            buffers = [array('q') for _ in range(partitions)]
+            for fingerprint, i in self._fingerprints():
+                p = fingerprint % partitions
+                buffer = buffers[p]
+                buffer.append(fingerprint)
+                buffer.append(i)
+                if len(buffer) >= 2 * Deduplicator.CHUNK_ENTRIES:
+                    buffer.tofile(files[p])
+                    del buffer[:]
+            for buffer, file in zip(buffers, files):
+                buffer.tofile(file)
+            del buffers
+            for file in files:
+                file.seek(0)
+                entries = array('q')
+                entries.frombytes(file.read())
+                file.close()
+                yield zip(entries[::2], entries[1::2])
+        finally:
+            for file in files:
+                file.close()
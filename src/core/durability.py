@@ -0,0 +1,355 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+from .database import Database
+from .service import Service
+from .dedup import KeepNames
+from .schema import IndexNames
+from .table import Table
+from .filesystem.coder import Coder
+from .filesystem.snapshot import SnapshotCoder
+from .storage import StorageNames
+
+
+class WriteAheadLog:
+    def __init__(self, path: Path, sync_every: int = 100, sync_interval: float = 1.0):
+        self._path = path
+        self._f = path.open('a', encoding='utf-8')
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        # entries appended through this object, counted from where the file was opened
+        self._entries = 0
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def entries(self) -> int:
+        return self._entries
+
+    @property
+    def size(self) -> int:
+        return self._f.tell()
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self._f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        # flushing hands the entry to the OS, so it survives a process crash;
+        # fsync (which protects against power loss) is batched
+        self._f.flush()
+        self._entries += 1
+        self._pending += 1
+        if self._pending >= self._sync_every or time.monotonic() - self._last_sync >= self._sync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._pending:
+            os.fsync(self._f.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        self.sync()
+        self._f.close()
+
+    @staticmethod
+    def read(path: Path) -> Iterator[Dict[str, Any]]:
+        if not path.exists():
+            return
+        with path.open(encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    # the last entry was torn by a crash before it was fully written
+                    return
+                yield json.loads(line)
+
+    @staticmethod
+    def truncate_torn_tail(path: Path) -> None:
+        if not path.exists():
+            return
+        with path.open('r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                step = min(position, 1 << 16)
+                f.seek(position - step)
+                newline = f.read(step).rfind(b'\n')
+                if newline >= 0:
+                    position = position - step + newline + 1
+                    break
+                position -= step
+            if position < end:
+                f.truncate(position)
+
+
+class Durability:
+    # snapshot entry with the number of entries of the new log that each table's copy already holds
+    MARKS = 'marks.json'
+    CATALOG_OPS = ('add_database', 'remove_database', 'add_table', 'remove_table')
+
+    def __init__(self, directory: Path, checkpoint_bytes: int = 64 * 2 ** 20,
+                 sync_every: int = 100, sync_interval: float = 1.0):
+        self._directory = directory
+        self._checkpoint_bytes = checkpoint_bytes
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._service: Union[Service, None] = None
+        self._wal: Union[WriteAheadLog, None] = None
+        self._generation = 0
+        # the generation of the log that is appended to; later than the one of the snapshot
+        # while a checkpoint is written, or after one that failed
+        self._log_generation = 0
+        # imported snapshots that entries of the current log refer to
+        self._imports: List[str] = []
+        # the log lock orders appends; checkpoints run on their own thread so that
+        # writers never wait for other tables while holding their own table lock
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._checkpoint_requested = threading.Event()
+        self._checkpointer: Union[threading.Thread, None] = None
+        self._closing = False
+
+    def recover(self) -> Service:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        p_current = self._directory / 'CURRENT'
+        self._generation = int(p_current.read_text()) if p_current.exists() else 0
+
+        databases = []
+        marks: Dict[str, Dict[str, int]] = {}
+        p_snapshot = self._snapshot_dir(self._generation)
+        if p_snapshot.exists():
+            p_marks = p_snapshot / Durability.MARKS
+            if p_marks.exists():
+                marks = json.loads(p_marks.read_text())
+            p_databases = [p for p in p_snapshot.iterdir() if p.stem.isdigit()]
+            for p_db in sorted(p_databases, key=lambda p: int(p.stem)):
+                databases.append(Durability._read_database(p_db))
+        service = Service(databases)
+        # the log of the snapshot, followed by those of checkpoints that did not complete
+        generation = self._generation
+        while True:
+            p_wal = self._wal_path(generation)
+            for i, entry in enumerate(WriteAheadLog.read(p_wal)):
+                if 'import' in entry:
+                    self._imports.append(entry['import'])
+                # changes a table made after the log was switched but before it was copied are in the snapshot
+                if (generation == self._generation and entry['op'] not in Durability.CATALOG_OPS
+                        and i < marks.get(entry['db'], {}).get(entry['table'], 0)):
+                    continue
+                self._apply(service, entry)
+            if not self._wal_path(generation + 1).exists():
+                break
+            generation += 1
+        WriteAheadLog.truncate_torn_tail(p_wal)
+        self._log_generation = generation
+
+        self._service = service
+        self._wal = WriteAheadLog(p_wal, self._sync_every, self._sync_interval)
+        service.attach_journal(self.record)
+        self._checkpointer = threading.Thread(target=self._run_checkpoints, name='checkpointer', daemon=True)
+        self._checkpointer.start()
+        return service
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        op = entry['op']
+        if op in ('add_database', 'add_table'):
+            obj = entry.pop('object')
+            if (op == 'add_database' and obj.tables) or (op == 'add_table' and len(obj)):
+                # imported data goes into a snapshot of its own that the log refers to;
+                # nobody else can reach the object before the caller releases the catalog
+                p_import = self._directory / f'import-{uuid.uuid4().hex}'
+                Durability._write_database(obj if op == 'add_database' else Database(entry['db'], [obj]), p_import)
+                Durability._fsync_dir(self._directory)
+                entry['import'] = p_import.name
+            elif op == 'add_table':
+                entry['schema'] = Coder.schema_to_list(obj.schema)
+                entry['storage'] = obj.storage_name.value
+        with self._lock:
+            self._wal.append(entry)
+            if 'import' in entry:
+                self._imports.append(entry['import'])
+            if self._wal.size >= self._checkpoint_bytes:
+                self._checkpoint_requested.set()
+
+    def checkpoint(self) -> None:
+        # must not be called while holding a table lock
+        with self._checkpoint_lock:
+            self._checkpoint()
+
+    def close(self) -> None:
+        if self._checkpointer is not None:
+            self._closing = True
+            self._checkpoint_requested.set()
+            self._checkpointer.join()
+            self._checkpointer = None
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+    def _run_checkpoints(self) -> None:
+        while True:
+            self._checkpoint_requested.wait()
+            if self._closing:
+                return
+            with self._checkpoint_lock:
+                if self._checkpoint_requested.is_set():
+                    self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        # writers are only held up while a table is copied, never while the snapshot is written:
+        # the log is switched first and each table is copied under its own lock afterwards, with
+        # the number of entries the new log had by then, which recovery skips for that table
+        self._checkpoint_requested.clear()
+        generation = self._log_generation + 1
+        copies: List[Tuple[Database, Dict[str, int]]] = []
+        imports: List[str] = []
+        try:
+            with ExitStack() as stack:
+                # the catalog stays as it is until every table is copied; table writes go on
+                stack.enter_context(self._service.lock)
+                databases = [self._service.get_database(name) for name in self._service.databases]
+                for db in databases:
+                    stack.enter_context(db.lock)
+                with self._lock:
+                    wal = WriteAheadLog(self._wal_path(generation), self._sync_every, self._sync_interval)
+                    old_wal, self._wal = self._wal, wal
+                    old_wal.close()
+                    self._log_generation = generation
+                    imports, self._imports = self._imports, []
+                for db in databases:
+                    tables = []
+                    marks = {}
+                    for table_name in db.tables:
+                        table, marks[table_name] = self._copy_table(db.get_table(table_name), wal)
+                        tables.append(table)
+                    copies.append((Database(db.name, tables), marks))
+            self._write_snapshot(generation, copies)
+        except BaseException:
+            # the older logs stay until a checkpoint completes, and recovery replays them all
+            with self._lock:
+                self._imports[:0] = imports
+            raise
+        # everything before the new log is in the snapshot now
+        for p_old in self._directory.glob('wal-*.log'):
+            if int(p_old.stem[len('wal-'):]) < generation:
+                p_old.unlink(missing_ok=True)
+        for p_old in self._directory.glob('snapshot-*'):
+            if int(p_old.name[len('snapshot-'):]) != generation:
+                shutil.rmtree(p_old, ignore_errors=True)
+        for name in imports:
+            (self._directory / name).unlink(missing_ok=True)
+        self._generation = generation
+
+    def _write_snapshot(self, generation: int, copies: List[Tuple[Database, Dict[str, int]]]) -> None:
+        p_snapshot = self._snapshot_dir(generation)
+        if p_snapshot.exists():
+            shutil.rmtree(p_snapshot)
+        p_snapshot.mkdir()
+        for i, (db, _) in enumerate(copies):
+            Durability._write_database(db, p_snapshot / str(i))
+        p_marks = p_snapshot / Durability.MARKS
+        p_marks.write_text(json.dumps({db.name: marks for db, marks in copies}))
+        with p_marks.open('rb') as f:
+            os.fsync(f.fileno())
+        Durability._fsync_dir(p_snapshot)
+
+        p_current = self._directory / 'CURRENT'
+        p_tmp = self._directory / 'CURRENT.tmp'
+        with p_tmp.open('w') as f:
+            f.write(str(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(p_tmp, p_current)
+        Durability._fsync_dir(self._directory)
+
+    def _copy_table(self, table: Table, wal: WriteAheadLog) -> Tuple[Table, int]:
+        # the rows are taken under the table's read lock, the copy is indexed after it is released
+        with table.lock.read():
+            sch = Coder.list_to_schema(Coder.schema_to_list(table.schema))
+            rows = list(table.iter_rows())
+            with self._lock:
+                mark = wal.entries
+        return Table(table.name, sch, rows, table.storage_name), mark
+
+    def _snapshot_dir(self, generation: int) -> Path:
+        return self._directory / f'snapshot-{generation}'
+
+    def _wal_path(self, generation: int) -> Path:
+        return self._directory / f'wal-{generation}.log'
+
+    @staticmethod
+    def _read_database(path: Path) -> Database:
+        if SnapshotCoder.is_snapshot(path):
+            return SnapshotCoder.import_database(path)
+        return Coder.import_database(path)
+
+    @staticmethod
+    def _write_database(db: Database, path: Path) -> None:
+        try:
+            SnapshotCoder.export_database(db, path)
+        except ValueError:
+            # e.g. integers that do not fit into 64 bits
+            Coder.export_database(db, path)
+        with path.open('rb') as f:
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _fsync_dir(path: Path) -> None:
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _apply(self, service: Service, entry: Dict[str, Any]) -> None:
+        op = entry['op']
+        if op == 'add_database':
+            if 'import' in entry:
+                service.add_database(Durability._read_database(self._directory / entry['import']))
+            else:
+                service.add_database(Database(entry['db'], []))
+            return
+        if op == 'remove_database':
+            service.remove_database(entry['db'])
+            return
+        db = service.get_database(entry['db'])
+        if op == 'add_table':
+            if 'import' in entry:
+                imported = Durability._read_database(self._directory / entry['import'])
+                db.add_table(imported.get_table(entry['table']))
+                return
+            schema = Coder.list_to_schema(entry['schema'])
+            db.add_table(Table(entry['table'], schema, [], StorageNames(entry['storage'])))
+            return
+        if op == 'remove_table':
+            db.remove_table(entry['table'])
+            return
+        table = db.get_table(entry['table'])
+        codec = table.schema.codec
+        if op == 'insert':
+            rejected = table.insert_many([codec.decode(r) for r in entry['rows']])
+            if rejected:
+                raise ValueError(f'Cannot replay insert into {table.name}: {rejected[0][1]}')
+        elif op == 'update':
+            table.update(codec.decode(entry['row']))
+        elif op == 'delete':
+            table.delete(table.schema.id_type.from_string(entry['id']))
+        elif op == 'drop_duplicates':
+            table.drop_duplicates(entry.get('subset'), KeepNames(entry.get('keep', KeepNames.FIRST.value)))
+        elif op == 'create_index':
+            table.create_index(entry['column'], IndexNames(entry['kind']))
+        elif op == 'drop_index':
+            table.drop_index(entry['column'])
+        else:
+            raise ValueError(f'Unknown log entry: {op}')
@@ -0,0 +1,270 @@
+import io
+import json
+import zipfile
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Union
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # optional, only the Arrow and Parquet formats need it
+    pa = None
+    pq = None
+
+from core.database import Database
+from core.row import Row
+from core.schema import TableSchema, TypeNames
+from core.storage import StorageNames
+from core.table import Table
+
+from .coder import BytesSink, Coder
+from .formats import ExportFormats
+
+
+PARQUET_MAGIC = b'PAR1'
+# streams start with the continuation marker of the first message
+ARROW_STREAM_MAGIC = b'\xff\xff\xff\xff'
+ARCHIVE_MAGIC = b'PK\x03\x04'
+MANIFEST = 'database.json'
+BATCH_ROWS = 64 * 1024
+
+
+class ArrowCoder:
+    # tables as Arrow IPC streams or Parquet files; databases as a zip archive holding one
+    # such file per table. Money is int64 cents, intervals a struct of two int64, text utf8.
+    # The schema, indexes and storage travel in the schema metadata, so tables round-trip
+
+    @staticmethod
+    def available() -> bool:
+        return pa is not None
+
+    @staticmethod
+    def require() -> None:
+        if pa is None:
+            raise ImportError('pyarrow is required for the Arrow and Parquet formats')
+
+    @staticmethod
+    def detect(head: bytes) -> Union[ExportFormats, None]:
+        # the format of a table file from its first bytes
+        if head.startswith(PARQUET_MAGIC):
+            return ExportFormats.PARQUET
+        if head.startswith(ARROW_STREAM_MAGIC):
+            return ExportFormats.ARROW
+        return None
+
+    @staticmethod
+    def is_archive(head: bytes) -> bool:
+        return head.startswith(ARCHIVE_MAGIC)
+
+    @staticmethod
+    def table_to_arrow(table: Table) -> 'pa.Table':
+        ArrowCoder.require()
+        sch = table.schema
+        names = ['id', *sch.column_names]
+        type_names = [sch.id_type_name, *sch.type_names]
+        # one copy out of the table's column buffers under its read lock;
+        # numbers are then wrapped by Arrow without copying again
+        arrays = table.column_arrays(names)
+        fields = []
+        columns = []
+        for name, type_name in zip(names, type_names):
+            parts = [ArrowCoder._to_arrow(part, type_name, name) for part in arrays[name]]
+            if type_name is TypeNames.MONEY_INTERVAL:
+                column = pa.StructArray.from_arrays(parts, names=['lower', 'upper'])
+            else:
+                column = parts[0]
+            columns.append(column)
+            fields.append(pa.field(name, column.type, nullable=False, metadata={'type': type_name.value}))
+        metadata = {
+            'name': table.name,
+            'schema': json.dumps(Coder.schema_to_list(sch)),
+            'storage': table.storage_name.value,
+        }
+        return pa.Table.from_arrays(columns, schema=pa.schema(fields, metadata=metadata))
+
+    @staticmethod
+    def arrow_to_table(data: 'pa.Table', name: Union[str, None] = None,
+                       storage_name: Union[StorageNames, None] = None) -> Table:
+        ArrowCoder.require()
+        metadata = {k.decode(): v.decode() for k, v in (data.schema.metadata or {}).items()}
+        if 'schema' in metadata:
+            sch = Coder.list_to_schema(json.loads(metadata['schema']))
+        else:
+            sch = ArrowCoder._infer_schema(data.schema)
+        name = name or metadata.get('name')
+        if not name:
+            raise ValueError('The table has no name')
+        if storage_name is None:
+            storage_name = StorageNames(metadata.get('storage', StorageNames.ROWS.value))
+        names = ['id', *sch.column_names]
+        missing = [n for n in names if n not in data.column_names]
+        if missing:
+            raise ValueError(f'Missing columns: {", ".join(missing)}')
+
+        columns = []
+        for column_name, type_name in zip(names, [sch.id_type_name, *sch.type_names]):
+            column = data.column(column_name)
+            if column.null_count:
+                raise ValueError(f'Column {column_name} contains nulls')
+            columns.append(ArrowCoder._natives(column, type_name, column_name))
+        if len(set(columns[0])) != len(columns[0]):
+            raise ValueError('The id column contains duplicates')
+        id_type = sch.id_type
+        types = sch.types
+        rows = [Row(id_type.from_native(natives[0]), [t.from_native(v) for t, v in zip(types, natives[1:])])
+                for natives in zip(*columns)]
+        codec = sch.codec
+        for row in rows:
+            if not codec.validate(row):
+                raise ValueError(f'Row {row.identifier} does not match the table schema')
+        return Table(name, sch, rows, storage_name)
+
+    @staticmethod
+    def write_table(table: Table, f: BinaryIO, export_format: ExportFormats) -> None:
+        for _ in ArrowCoder._write_batches(ArrowCoder.table_to_arrow(table), f, export_format):
+            pass
+
+    @staticmethod
+    def iter_table_bytes(table: Table, export_format: ExportFormats) -> Iterator[bytes]:
+        # the table is copied out under its read lock first, so no lock is held between chunks
+        data = ArrowCoder.table_to_arrow(table)
+        sink = BytesSink()
+        for _ in ArrowCoder._write_batches(data, sink, export_format):
+            yield from sink.drain()
+        yield from sink.drain()
+
+    @staticmethod
+    def read_table(f: BinaryIO, name: Union[str, None] = None) -> Table:
+        ArrowCoder.require()
+        export_format = ArrowCoder.detect(f.read(len(PARQUET_MAGIC)))
+        f.seek(0)
+        if export_format is ExportFormats.PARQUET:
+            data = pq.read_table(f)
+        elif export_format is ExportFormats.ARROW:
+            data = pa.ipc.open_stream(f).read_all()
+        else:
+            raise ValueError('File is neither an Arrow stream nor a Parquet file')
+        return ArrowCoder.arrow_to_table(data, name)
+
+    @staticmethod
+    def export_database(db: Database, path: Path, export_format: ExportFormats) -> None:
+        with path.open('wb') as f:
+            for chunk in ArrowCoder.iter_database_bytes(db, export_format):
+                f.write(chunk)
+
+    @staticmethod
+    def iter_database_bytes(db: Database, export_format: ExportFormats) -> Iterator[bytes]:
+        # the archive is written to an unseekable sink, so its entries carry data descriptors;
+        # a chunk follows every batch of rows
+        ArrowCoder.require()
+        suffix = 'parquet' if export_format is ExportFormats.PARQUET else 'arrows'
+        sink = BytesSink()
+        # the files are compressed already (Parquet) or meant to be mapped as they are (Arrow)
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+            files = []
+            for i, table_name in enumerate(db.tables):
+                table = db.get_table(table_name)
+                if table is None:
+                    continue
+                data = ArrowCoder.table_to_arrow(table)
+                file_name = f'{i}.{suffix}'
+                with archive.open(file_name, 'w', force_zip64=True) as f:
+                    for _ in ArrowCoder._write_batches(data, f, export_format):
+                        yield from sink.drain()
+                files.append({'table': table_name, 'file': file_name})
+            archive.writestr(MANIFEST, json.dumps({'name': db.name, 'format': export_format.value, 'tables': files}))
+        yield from sink.drain()
+
+    @staticmethod
+    def import_database(path: Union[Path, BinaryIO]) -> Database:
+        ArrowCoder.require()
+        try:
+            archive = zipfile.ZipFile(path)
+        except zipfile.BadZipFile as e:
+            raise ValueError(f'Not a database archive: {e}') from None
+        with archive:
+            try:
+                manifest = json.loads(archive.read(MANIFEST))
+            except KeyError:
+                raise ValueError('The archive has no database manifest') from None
+            tables = []
+            for entry in manifest['tables']:
+                # Arrow and Parquet readers need to seek, so each file is read into memory
+                with archive.open(entry['file']) as f:
+                    tables.append(ArrowCoder.read_table(io.BytesIO(f.read()), entry['table']))
+        return Database(manifest['name'], tables)
+
+    @staticmethod
+    def _write_batches(data: 'pa.Table', f: BinaryIO, export_format: ExportFormats) -> Iterator[None]:
+        # pauses after each batch of BATCH_ROWS rows; the file is complete once this is exhausted
+        batches = data.to_batches(max_chunksize=BATCH_ROWS)
+        if export_format is ExportFormats.PARQUET:
+            with pq.ParquetWriter(f, data.schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+                    yield
+        else:
+            with pa.ipc.new_stream(f, data.schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+                    yield
+
+    @staticmethod
+    def _to_arrow(part: np.ndarray, type_name: TypeNames, name: str) -> 'pa.Array':
+        if type_name in (TypeNames.STRING, TypeNames.CHAR):
+            return pa.array(part, type=pa.string())
+        if part.dtype == object:
+            # integers that did not fit into 64 bits
+            raise ValueError(f'Column {name} does not fit into a 64-bit Arrow column')
+        return pa.array(part)
+
+    @staticmethod
+    def _natives(column: 'pa.ChunkedArray', type_name: TypeNames, name: str) -> List[Any]:
+        column = column.combine_chunks()
+        if type_name is TypeNames.MONEY_INTERVAL:
+            if not pa.types.is_struct(column.type) or column.type.num_fields != 2:
+                raise ValueError(f'Column {name} is not a struct of two bounds')
+            return list(zip(ArrowCoder._natives(pa.chunked_array([column.field(0)]), TypeNames.MONEY, name),
+                            ArrowCoder._natives(pa.chunked_array([column.field(1)]), TypeNames.MONEY, name)))
+        if type_name in (TypeNames.STRING, TypeNames.CHAR):
+            if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+                raise ValueError(f'Column {name} is not text')
+            return column.to_pylist()
+        if type_name is TypeNames.REAL:
+            if not pa.types.is_floating(column.type):
+                raise ValueError(f'Column {name} is not a floating point column')
+            return column.to_numpy().astype(np.float64).tolist()
+        if not pa.types.is_integer(column.type):
+            raise ValueError(f'Column {name} is not an integer column')
+        values = column.to_numpy()
+        # unsigned 64-bit values above the signed range would wrap around in the cast
+        if values.dtype == np.uint64 and len(values) and values.max() > np.iinfo(np.int64).max:
+            raise ValueError(f'Column {name} has values beyond the 64-bit integer range')
+        return values.astype(np.int64).tolist()
+
+    @staticmethod
+    def _infer_schema(schema: 'pa.Schema') -> TableSchema:
+        # files written elsewhere: types come from the field metadata, or else from the Arrow types
+        type_names: Dict[str, TypeNames] = {}
+        for field in schema:
+            declared = (field.metadata or {}).get(b'type')
+            if declared is not None:
+                type_names[field.name] = TypeNames(declared.decode())
+            elif pa.types.is_integer(field.type):
+                type_names[field.name] = TypeNames.INT
+            elif pa.types.is_floating(field.type):
+                type_names[field.name] = TypeNames.REAL
+            elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+                type_names[field.name] = TypeNames.STRING
+            elif pa.types.is_struct(field.type) and field.type.num_fields == 2:
+                type_names[field.name] = TypeNames.MONEY_INTERVAL
+            else:
+                raise ValueError(f'Column {field.name} has an unsupported type {field.type}')
+        if 'id' not in type_names:
+            raise ValueError('The table has no id column')
+        columns = [n for n in schema.names if n != 'id']
+        return TableSchema(col_names=columns, type_names=[type_names[c] for c in columns],
+                           id_type_name=type_names['id'])
@@ -1,77 +1,362 @@
+import gzip
+import io
 import json
+import shutil
 from pathlib import Path
-from typing import List, Dict
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, TextIO, Union
 
-from core.row import Row
+try:
+    import zstandard
+except ImportError:
+    # optional, only the zstd encoding needs it
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    # optional, only the lz4 encoding needs it
+    lz4 = None
+
+from core import metrics
 from core.table import Table
 from core.database import Database
-from core.schema import TableSchema, TypeNames
+from core.schema import IndexNames, TableSchema, TypeNames
+from core.storage import StorageNames
+
+from .formats import EncodingNames
+from .json_stream import JsonStreamReader
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+LZ4_MAGIC = b'\x04\x22\x4d\x18'
+COPY_CHUNK = 1024 * 1024
+
+
+class BytesSink(io.RawIOBase):
+    # a write-only stream whose contents are taken out as they are written, so that writers
+    # which need a file object (compressors, zip, Arrow) can feed a chunked response
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> Iterator[bytes]:
+        # what was written since the last drain, as a single chunk if there is any
+        if self._chunks:
+            data = b''.join(self._chunks)
+            self._chunks = []
+            yield data
+
+
+class Compression:
+    # streaming codecs: data passes through them in chunks, so neither an export nor an
+    # upload is ever held in memory as a whole. The levels favour throughput over size,
+    # as exports are compressed while the client waits
+    GZIP_LEVEL = 6
+    ZSTD_LEVEL = 3
+
+    @staticmethod
+    def available(encoding: EncodingNames) -> bool:
+        if encoding is EncodingNames.ZSTD:
+            return zstandard is not None
+        if encoding is EncodingNames.LZ4:
+            return lz4 is not None
+        return True
+
+    @staticmethod
+    def require(encoding: EncodingNames) -> None:
+        if not Compression.available(encoding):
+            package = 'zstandard' if encoding is EncodingNames.ZSTD else encoding.value
+            raise ImportError(f'{package} is required for the {encoding.value} encoding')
+
+    @staticmethod
+    def detect(head: bytes) -> EncodingNames:
+        if head.startswith(GZIP_MAGIC):
+            return EncodingNames.GZIP
+        if head.startswith(ZSTD_MAGIC):
+            return EncodingNames.ZSTD
+        if head.startswith(LZ4_MAGIC):
+            return EncodingNames.LZ4
+        return EncodingNames.IDENTITY
+
+    @staticmethod
+    def decode_errors() -> tuple:
+        # what the readers raise on corrupt or truncated data
+        errors = (OSError, EOFError)
+        if zstandard is not None:
+            errors += (zstandard.ZstdError,)
+        if lz4 is not None:
+            errors += (RuntimeError,)
+        return errors
+
+    @staticmethod
+    def open(path: Path, mode: str, encoding: Union[EncodingNames, None] = None) -> BinaryIO:
+        # mode is 'rb' or 'wb'; without an encoding files are read as they were written
+        # and written uncompressed
+        assert mode in ('rb', 'wb'), 'Mode must be rb or wb'
+        if encoding is None:
+            if mode == 'wb':
+                encoding = EncodingNames.IDENTITY
+            else:
+                with path.open('rb') as f:
+                    encoding = Compression.detect(f.read(len(ZSTD_MAGIC)))
+        Compression.require(encoding)
+        if encoding is EncodingNames.GZIP:
+            return gzip.open(path, mode, compresslevel=Compression.GZIP_LEVEL)
+        if encoding is EncodingNames.ZSTD:
+            return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=Compression.ZSTD_LEVEL))
+        if encoding is EncodingNames.LZ4:
+            return lz4.frame.open(path, mode)
+        return path.open(mode)
+
+    @staticmethod
+    def reader(f: BinaryIO, encoding: EncodingNames) -> BinaryIO:
+        # decompresses f as it is read and leaves it open; the readers of compressed data support peek
+        Compression.require(encoding)
+        if encoding is EncodingNames.GZIP:
+            return gzip.GzipFile(fileobj=f, mode='rb')
+        if encoding is EncodingNames.ZSTD:
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=False), COPY_CHUNK)
+        if encoding is EncodingNames.LZ4:
+            return lz4.frame.LZ4FrameFile(f, mode='rb')
+        return f
+
+    @staticmethod
+    def writer(f: BinaryIO, encoding: EncodingNames) -> BinaryIO:
+        # compresses what is written to it into f; closing it finishes the stream and leaves f open
+        Compression.require(encoding)
+        if encoding is EncodingNames.GZIP:
+            return gzip.GzipFile(fileobj=f, mode='wb', compresslevel=Compression.GZIP_LEVEL)
+        if encoding is EncodingNames.ZSTD:
+            return zstandard.ZstdCompressor(level=Compression.ZSTD_LEVEL).stream_writer(f, closefd=False)
+        if encoding is EncodingNames.LZ4:
+            return lz4.frame.LZ4FrameFile(f, mode='wb')
+        return f
+
+    @staticmethod
+    def iter_compressed(chunks: Iterable[bytes], encoding: EncodingNames) -> Iterator[bytes]:
+        if encoding is EncodingNames.IDENTITY:
+            yield from chunks
+            return
+        sink = BytesSink()
+        with Compression.writer(sink, encoding) as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield from sink.drain()
+        yield from sink.drain()
+
+    @staticmethod
+    def compress_file(source: Path, target: Path, encoding: EncodingNames) -> None:
+        with source.open('rb') as f_source, Compression.open(target, 'wb', encoding) as f_target:
+            shutil.copyfileobj(f_source, f_target, COPY_CHUNK)
 
 
 class Coder:
+    CHUNK_ROWS = 1000
+
     @staticmethod
-    def export_database(db: Database, path: Path) -> None:
-        path.write_text(Coder.database_to_json(db))
+    def export_database(db: Database, path: Path, encoding: EncodingNames = EncodingNames.IDENTITY) -> None:
+        with Compression.open(path, 'wb', encoding) as raw, io.TextIOWrapper(raw, encoding='utf-8') as f:
+            Coder.write_database(db, f)
 
     @staticmethod
-    def import_database(path: Path) -> Database:
-        return Coder.json_to_database(path.read_text())
+    def import_database(path: Path, progress: Union[Callable[[int, int], None], None] = None) -> Database:
+        # compressed files are recognised by their first bytes
+        with Compression.open(path, 'rb') as raw, io.TextIOWrapper(raw, encoding='utf-8') as f:
+            return Coder.read_database(f, progress=progress)
+
+    @staticmethod
+    def read_database(f: TextIO, batch_size: int = 1000,
+                      progress: Union[Callable[[int, int], None], None] = None) -> Database:
+        with metrics.timed('import'):
+            return DatabaseReader(f, batch_size, progress).read()
+
+    @staticmethod
+    def write_database(db: Database, f: TextIO) -> None:
+        with metrics.timed('export'):
+            for chunk in Coder.iter_database_json(db):
+                f.write(chunk)
 
     @staticmethod
     def database_to_json(db: Database) -> str:
-        data = {
-            'name': db.name,
-            'tables': []
-        }
+        return ''.join(Coder.iter_database_json(db))
+
+    @staticmethod
+    def iter_database_json(db: Database) -> Iterator[str]:
+        yield f'{{\n  "name": {json.dumps(db.name)},\n  "tables": ['
+        exported = 0
         for table_name in db.tables:
-            data['tables'].append(Coder.table_to_dict(db.get_table(table_name)))
-        return json.dumps(data, indent=2)
+            table = db.get_table(table_name)
+            if table is None:
+                # removed while the database was being exported
+                continue
+            if exported:
+                yield ','
+            yield from Coder.iter_table_json(table)
+            exported += 1
+        yield '\n  ]\n}\n'
+
+    @staticmethod
+    def iter_table_json(table: Table) -> Iterator[str]:
+        # rows in identifier order, a page at a time; the read lock is only held while a page
+        # is copied, never while a chunk is consumed, so a chunk may go to another thread
+        yield (
+            f'\n    {{\n      "name": {json.dumps(table.name)},'
+            f'\n      "schema": {json.dumps(Coder.schema_to_list(table.schema))},'
+            f'\n      "storage": {json.dumps(table.storage_name.value)},'
+            f'\n      "rows": ['
+        )
+        encode = table.schema.codec.encode
+        separator = '\n        '
+        after = None
+        while True:
+            rows = table.page(Coder.CHUNK_ROWS, after)
+            if not rows:
+                break
+            yield separator + (',\n        '.join(json.dumps(encode(row)) for row in rows))
+            separator = ',\n        '
+            after = rows[-1].identifier
+        yield '\n      ]\n    }'
 
     @staticmethod
     def json_to_database(json_data: str) -> Database:
-        data = json.loads(json_data)
-        tables = []
-        for table_data in data['tables']:
-            tables.append(Coder.dict_to_table(table_data))
-        return Database(data['name'], tables=tables)
+        return Coder.read_database(io.StringIO(json_data))
 
     @staticmethod
     def table_to_dict(table: Table) -> Dict:
-        return {
-            'name': table.name,
-            'schema': Coder._schema_to_list(table.schema),
-            'rows': [(row.identifier.value, *[v.value for v in row.values]) for row in table.rows],
-        }
+        with table.lock.read():
+            return {
+                'name': table.name,
+                'schema': Coder.schema_to_list(table.schema),
+                'storage': table.storage_name.value,
+                'rows': [table.schema.codec.encode(row) for row in table.rows],
+            }
 
     @staticmethod
     def dict_to_table(data: Dict) -> Table:
         name = data['name']
-        schema = Coder._list_to_schema(data['schema'])
-        rows = []
-        for row_data in data['rows']:
-            identifier = schema.id_type.from_string(row_data[0])
-            values = []
-            for t, s in zip(schema.types, row_data[1:]):
-                values.append(t.from_string(str(s)))
-            rows.append(Row(identifier, values))
-        return Table(name, schema, rows)
-
-    @staticmethod
-    def _schema_to_list(schema: TableSchema) -> List:
+        schema = Coder.list_to_schema(data['schema'])
+        rows = [schema.codec.decode(row_data) for row_data in data['rows']]
+        if len({row.identifier.native for row in rows}) != len(rows):
+            raise ValueError(f'Table {name} has duplicate row identifiers')
+        return Table(name, schema, rows, StorageNames(data.get('storage', StorageNames.ROWS.value)))
+
+    @staticmethod
+    def schema_to_list(schema: TableSchema) -> List:
         column_defs = [(schema.id_type_name.value, 'id')]
         for tn, cn in zip(schema.type_names, schema.column_names):
-            column_defs.append((tn.value, cn))
+            if cn in schema.indexes:
+                column_defs.append((tn.value, cn, schema.indexes[cn].value))
+            else:
+                column_defs.append((tn.value, cn))
         return column_defs
 
     @staticmethod
-    def _list_to_schema(lst: List) -> TableSchema:
+    def list_to_schema(lst: List) -> TableSchema:
+        # schemas come from files, so anything malformed is a ValueError
+        if not isinstance(lst, (list, tuple)):
+            raise ValueError('Schema must be a list of columns')
         id_type = None
         column_types = []
         column_names = []
-        for tn, cn in lst:
+        indexes = {}
+        for column_def in lst:
+            if not isinstance(column_def, (list, tuple)) or len(column_def) not in (2, 3) \
+                    or not all(isinstance(part, str) for part in column_def):
+                raise ValueError(f'Invalid column definition: {column_def}')
+            tn, cn, *index = column_def
             if cn == 'id':
+                if id_type is not None:
+                    raise ValueError('Schema has more than one id column')
                 id_type = TypeNames(tn)
             else:
+                if cn in column_names:
+                    raise ValueError(f'Duplicate column: {cn}')
                 column_names.append(cn)
                 column_types.append(TypeNames(tn))
-        return TableSchema(col_names=column_names, type_names=column_types, id_type_name=id_type)
+                if index:
+                    indexes[cn] = IndexNames(index[0])
+                    if indexes[cn] is IndexNames.INTERVAL and column_types[-1] is not TypeNames.MONEY_INTERVAL:
+                        raise ValueError(f'Interval index requires a money interval column, {cn} is not')
+        if id_type is None:
+            raise ValueError('Schema has no id column')
+        return TableSchema(col_names=column_names, type_names=column_types, id_type_name=id_type, indexes=indexes)
+
+
+class DatabaseReader:
+    def __init__(self, f: TextIO, batch_size: int = 1000,
+                 progress: Union[Callable[[int, int], None], None] = None):
+        assert batch_size > 0, 'Batch size must be positive'
+        self._reader = JsonStreamReader(f)
+        self._batch_size = batch_size
+        self._progress = progress
+        self._rows_loaded = 0
+
+    def read(self) -> Database:
+        name = None
+        tables = []
+        for key in self._reader.iter_object():
+            if key == 'tables':
+                for _ in self._reader.iter_array():
+                    table = self._read_table()
+                    if any(t.name == table.name for t in tables):
+                        raise ValueError(f'Duplicate table: {table.name}')
+                    tables.append(table)
+            elif key == 'name':
+                name = self._reader.value()
+            else:
+                self._reader.value()
+        if not isinstance(name, str):
+            raise ValueError('Database name is missing')
+        return Database(name, tables=tables)
+
+    def _read_table(self) -> Table:
+        name = None
+        schema = None
+        storage_name = StorageNames.ROWS
+        table = None
+        for key in self._reader.iter_object():
+            if key == 'rows':
+                if not isinstance(name, str) or schema is None:
+                    raise ValueError('Table name and schema must precede its rows')
+                table = Table(name, schema, [], storage_name)
+                batch = []
+                for _ in self._reader.iter_array():
+                    batch.append(schema.codec.decode(self._reader.value()))
+                    if len(batch) >= self._batch_size:
+                        self._insert(table, batch)
+                        batch = []
+                self._insert(table, batch)
+            elif key == 'name':
+                name = self._reader.value()
+            elif key == 'schema':
+                schema = Coder.list_to_schema(self._reader.value())
+            elif key == 'storage':
+                storage_name = StorageNames(self._reader.value())
+            else:
+                self._reader.value()
+        if table is None:
+            if not isinstance(name, str) or schema is None:
+                raise ValueError('Table name or schema is missing')
+            table = Table(name, schema, [], storage_name)
+        return table
+
+    def _insert(self, table: Table, rows: List) -> None:
+        rejected = table.insert_many(rows)
+        if rejected:
+            raise ValueError(f'Cannot import table {table.name}: {rejected[0][1]}')
+        self._rows_loaded += len(rows)
+        if self._progress is not None:
+            self._progress(self._rows_loaded, self._reader.position)
@@ -0,0 +1,24 @@
+from enum import Enum
+
+
+class ExportFormats(Enum):
+    JSON = 'json'
+    SNAPSHOT = 'snapshot'
+    ARROW = 'arrow'
+    PARQUET = 'parquet'
+
+
+MEDIA_TYPES = {
+    ExportFormats.JSON: 'application/json',
+    ExportFormats.SNAPSHOT: 'application/octet-stream',
+    ExportFormats.ARROW: 'application/vnd.apache.arrow.stream',
+    ExportFormats.PARQUET: 'application/vnd.apache.parquet',
+}
+
+
+class EncodingNames(Enum):
+    # HTTP content codings of exports and uploads
+    IDENTITY = 'identity'
+    GZIP = 'gzip'
+    ZSTD = 'zstd'
+    LZ4 = 'lz4'
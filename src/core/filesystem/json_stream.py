@@ -0,0 +1,108 @@
+import json
+from typing import Any, Iterator, TextIO, Union
+
+
+class JsonStreamReader:
+    # a single value (a row, a schema) is decoded from the buffer as a whole, so its size is
+    # capped; a longer one is taken for a malformed document instead of buffering to the end
+    MAX_VALUE_SIZE = 1 << 24
+
+    def __init__(self, f: TextIO, chunk_size: int = 1 << 16, max_value_size: int = MAX_VALUE_SIZE):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._max_value_size = max_value_size
+        self._buffer = ''
+        self._pos = 0
+        self._consumed = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    @property
+    def position(self) -> int:
+        return self._consumed + self._pos
+
+    def peek(self) -> str:
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer):
+            raise ValueError('Unexpected end of JSON document')
+        return self._buffer[self._pos]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f'Expected {char!r} at position {self.position}, got {self._buffer[self._pos]!r}')
+        self._pos += 1
+
+    def accept(self, char: str) -> bool:
+        if self.peek() == char:
+            self._pos += 1
+            return True
+        return False
+
+    def iter_object(self) -> Iterator[str]:
+        self.expect('{')
+        if self.accept('}'):
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if not self.accept(','):
+                self.expect('}')
+                return
+
+    def iter_array(self) -> Iterator[None]:
+        self.expect('[')
+        if self.accept(']'):
+            return
+        while True:
+            yield
+            if not self.accept(','):
+                self.expect(']')
+                return
+
+    def value(self) -> Any:
+        self._skip_whitespace()
+        # the read size doubles, so a long value is decoded a logarithmic number of times
+        size = self._chunk_size
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill_value(size)
+                size *= 2
+                continue
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and not self._eof:
+                self._fill_value(size)
+                size *= 2
+                continue
+            self._pos = end
+            return obj
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            buffer = self._buffer
+            pos = self._pos
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer) or self._eof:
+                return
+            self._fill()
+
+    def _fill_value(self, size: int) -> None:
+        if len(self._buffer) - self._pos >= self._max_value_size:
+            raise ValueError(f'JSON value at position {self.position} is malformed '
+                             f'or longer than {self._max_value_size} characters')
+        self._fill(size)
+
+    def _fill(self, size: Union[int, None] = None) -> None:
+        chunk = self._f.read(size or self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return
+        self._consumed += self._pos
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
@@ -0,0 +1,173 @@
+import json
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Generator, Iterable, Iterator, List, Type
+
+from core.table import Table
+from core.database import Database
+from core.schema import TypeNames
+from core.storage import Store, StorageNames, MappedStore, MappedFile, MappedArray, MappedInterval, MappedStrings
+from core import datatypes, metrics
+
+from .coder import Coder
+
+
+MAGIC = b'ITDBSNP1'
+TRAILER = struct.Struct('<Q')
+
+
+class SegmentWriter:
+    ALIGNMENT = 8
+    CHUNK_BYTES = 1 << 20
+
+    def __init__(self):
+        self._offset = 0
+
+    def raw(self, data: bytes) -> Iterator[bytes]:
+        self._offset += len(data)
+        for start in range(0, len(data), SegmentWriter.CHUNK_BYTES):
+            yield data[start:start + SegmentWriter.CHUNK_BYTES]
+
+    def segment(self, data: bytes) -> Generator[bytes, None, List[int]]:
+        yield from self._align()
+        start = self._offset
+        yield from self.raw(data)
+        return [start, len(data)]
+
+    @staticmethod
+    def numbers(typecode: str, natives: Iterable[Any]) -> bytes:
+        try:
+            return array(typecode, natives).tobytes()
+        except OverflowError:
+            raise ValueError('Value does not fit into a 64-bit snapshot column') from None
+
+    @staticmethod
+    def strings(natives: Iterable[str]) -> List[bytes]:
+        # the offsets of the strings and the utf-8 blob they point into
+        offsets = array('q', [0])
+        chunks = []
+        size = 0
+        for s in natives:
+            encoded = s.encode('utf-8')
+            chunks.append(encoded)
+            size += len(encoded)
+            offsets.append(size)
+        return [offsets.tobytes(), b''.join(chunks)]
+
+    def _align(self) -> Iterator[bytes]:
+        padding = -self._offset % SegmentWriter.ALIGNMENT
+        if padding:
+            yield from self.raw(b'\0' * padding)
+
+
+class SnapshotCoder:
+    @staticmethod
+    def is_snapshot(path: Path) -> bool:
+        with path.open('rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+
+    @staticmethod
+    def export_database(db: Database, path: Path) -> None:
+        with metrics.timed('export_snapshot'), path.open('wb') as f:
+            for chunk in SnapshotCoder.iter_database_bytes(db):
+                f.write(chunk)
+
+    @staticmethod
+    def iter_database_bytes(db: Database) -> Iterator[bytes]:
+        writer = SegmentWriter()
+        yield from writer.raw(MAGIC)
+        tables = []
+        for table_name in db.tables:
+            table = db.get_table(table_name)
+            if table is None:
+                # removed while the database was being exported
+                continue
+            type_names = [table.schema.id_type_name, *table.schema.type_names]
+            # a table is encoded under its read lock and written out after the lock is released,
+            # so no lock is held while a chunk is consumed, possibly on another thread
+            with table.lock.read():
+                rows = len(table)
+                encoded = [SnapshotCoder._encode_column(table.store, position, type_name)
+                           for position, type_name in enumerate(type_names)]
+            columns = []
+            for parts in encoded:
+                segments = []
+                for part in parts:
+                    segments.extend((yield from writer.segment(part)))
+                columns.append(segments)
+            tables.append({
+                'name': table.name,
+                'schema': Coder.schema_to_list(table.schema),
+                'storage': table.storage_name.value,
+                'rows': rows,
+                'columns': columns,
+            })
+        metadata = json.dumps({'name': db.name, 'byteorder': sys.byteorder, 'tables': tables}).encode('utf-8')
+        yield from writer.raw(metadata)
+        yield from writer.raw(TRAILER.pack(len(metadata)))
+        yield from writer.raw(MAGIC)
+
+    @staticmethod
+    def _encode_column(store: Store, position: int, type_name: TypeNames) -> List[bytes]:
+        # the segments of a column in the order _map_column reads them
+        natives = store.natives(position)
+        if type_name in (TypeNames.INT, TypeNames.MONEY):
+            return [SegmentWriter.numbers('q', natives)]
+        if type_name is TypeNames.REAL:
+            return [SegmentWriter.numbers('d', natives)]
+        if type_name is TypeNames.MONEY_INTERVAL:
+            return [SegmentWriter.numbers('q', (v[0] for v in natives)),
+                    SegmentWriter.numbers('q', (v[1] for v in store.natives(position)))]
+        return SegmentWriter.strings(natives)
+
+    @staticmethod
+    def import_database(path: Path, owned: bool = False) -> Database:
+        # the tables are read straight from the mapped file; an owned file is deleted along with the mapping
+        backing = MappedFile(path, owned)
+        try:
+            return SnapshotCoder._map_database(backing)
+        except Exception:
+            backing.close()
+            raise
+
+    @staticmethod
+    def _map_database(backing: MappedFile) -> Database:
+        view = backing.view
+        footer = len(MAGIC) + TRAILER.size
+        if len(view) < len(MAGIC) + footer or view[:len(MAGIC)] != MAGIC or view[-len(MAGIC):] != MAGIC:
+            raise ValueError('File is not a database snapshot')
+        metadata_size, = TRAILER.unpack_from(view, len(view) - footer)
+        metadata_start = len(view) - footer - metadata_size
+        metadata = json.loads(bytes(view[metadata_start:metadata_start + metadata_size]))
+        if metadata['byteorder'] != sys.byteorder:
+            raise ValueError(f'Snapshot was written on a {metadata["byteorder"]}-endian machine')
+
+        tables = []
+        for table_data in metadata['tables']:
+            schema = Coder.list_to_schema(table_data['schema'])
+            storage_name = StorageNames(table_data['storage'])
+            columns = []
+            type_names = [schema.id_type_name, *schema.type_names]
+            for d_type, type_name, segments in zip([schema.id_type, *schema.types], type_names, table_data['columns']):
+                columns.append(SnapshotCoder._map_column(backing, d_type, type_name, segments))
+            if any(len(c) != table_data['rows'] for c in columns):
+                raise ValueError(f'Snapshot of table {table_data["name"]} is corrupted')
+            store = MappedStore(schema, storage_name, columns, backing)
+            tables.append(Table(table_data['name'], schema, [], storage_name, store=store))
+        return Database(metadata['name'], tables)
+
+    @staticmethod
+    def _map_column(backing: MappedFile, d_type: Type[datatypes.DataType], type_name: TypeNames,
+                    segments: List[int]):
+        def segment(i: int, typecode: str) -> memoryview:
+            return backing.segment(segments[i], segments[i + 1], typecode)
+
+        if type_name in (TypeNames.INT, TypeNames.MONEY):
+            return MappedArray(segment(0, 'q'), d_type)
+        if type_name is TypeNames.REAL:
+            return MappedArray(segment(0, 'd'), d_type)
+        if type_name is TypeNames.MONEY_INTERVAL:
+            return MappedInterval(segment(0, 'q'), segment(2, 'q'))
+        return MappedStrings(segment(0, 'q'), segment(2, 'B'), d_type)
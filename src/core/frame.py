@@ -0,0 +1,173 @@
+from array import array
+from typing import Any, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from . import storage
+from .row import Row
+from .schema import TableSchema, TypeNames
+
+
+# money columns hold integer cents, dollars are the values divided by MONEY_SCALE
+MONEY_SCALE = 100
+
+
+class ObjectBuffer:
+    # a numpy object array with spare capacity, so that appends are amortised O(1) like those
+    # of array('q') and pandas can wrap the values without converting them one by one
+    def __init__(self):
+        self._data = np.empty(16, dtype=object)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> Any:
+        assert 0 <= index < self._size, 'Index out of range'
+        return self._data[index]
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        assert 0 <= index < self._size, 'Index out of range'
+        self._data[index] = value
+
+    def append(self, value: Any) -> None:
+        if self._size == len(self._data):
+            data = np.empty(2 * len(self._data), dtype=object)
+            data[:self._size] = self._data
+            self._data = data
+        self._data[self._size] = value
+        self._size += 1
+
+    def pop(self) -> Any:
+        self._size -= 1
+        value = self._data[self._size]
+        self._data[self._size] = None
+        return value
+
+    def values(self) -> np.ndarray:
+        return self._data[:self._size].copy()
+
+
+class FrameColumn:
+    # natives of one column in store order, kept in buffers that pandas wraps
+    # without converting every value; intervals use one buffer per bound
+    def __init__(self, type_name: TypeNames):
+        self._type_name = type_name
+        if type_name in (TypeNames.INT, TypeNames.MONEY):
+            self._buffers: List[Union[array, list, ObjectBuffer]] = [array('q')]
+        elif type_name is TypeNames.REAL:
+            self._buffers = [array('d')]
+        elif type_name is TypeNames.MONEY_INTERVAL:
+            self._buffers = [array('q'), array('q')]
+        else:
+            self._buffers = [ObjectBuffer()]
+
+    def append(self, native: Any) -> None:
+        for k, part in enumerate(self._parts(native)):
+            try:
+                self._buffers[k].append(part)
+            except OverflowError:
+                # integers beyond 64 bits fall back to Python objects
+                self._buffers[k] = list(self._buffers[k])
+                self._buffers[k].append(part)
+
+    def set(self, index: int, native: Any) -> bool:
+        # whether the value changed
+        changed = False
+        for k, part in enumerate(self._parts(native)):
+            if self._buffers[k][index] == part:
+                continue
+            changed = True
+            try:
+                self._buffers[k][index] = part
+            except OverflowError:
+                self._buffers[k] = list(self._buffers[k])
+                self._buffers[k][index] = part
+        return changed
+
+    def swap_remove(self, index: int) -> None:
+        for buffer in self._buffers:
+            last = buffer.pop()
+            if index < len(buffer):
+                buffer[index] = last
+
+    def to_array(self):
+        # int64 for int and money (cents, see MONEY_SCALE), float64 for real, a closed
+        # IntervalArray of cents for intervals and the string dtype for text. Integers beyond
+        # 64 bits give object arrays, and intervals of them an object array of pd.Interval
+        type_name = self._type_name
+        if type_name is TypeNames.STRING or type_name is TypeNames.CHAR:
+            return pd.arrays.StringArray(self._buffers[0].values())
+        if type_name is TypeNames.REAL:
+            return np.frombuffer(self._buffers[0], dtype=np.float64).copy()
+        if type_name is TypeNames.MONEY_INTERVAL:
+            lower, upper = self.natives()
+            if lower.dtype == object or upper.dtype == object:
+                return np.array([pd.Interval(a, b, closed='both') for a, b in zip(lower, upper)], dtype=object)
+            return pd.arrays.IntervalArray.from_arrays(lower, upper, closed='both')
+        return self.natives()[0]
+
+    def natives(self) -> List[np.ndarray]:
+        # copies of the buffers: int64 (cents for money), float64, or object arrays;
+        # intervals give one array per bound
+        arrays = []
+        for buffer in self._buffers:
+            if isinstance(buffer, ObjectBuffer):
+                arrays.append(buffer.values())
+            elif isinstance(buffer, list):
+                arrays.append(np.array(buffer, dtype=object))
+            else:
+                arrays.append(np.array(buffer))
+        return arrays
+
+    def _parts(self, native: Any):
+        return native if self._type_name is TypeNames.MONEY_INTERVAL else (native,)
+
+
+class TableFrame:
+    # a DataFrame mirror of a table's store that follows single-row changes. Every column
+    # keeps its pandas array until it changes, so an update only rebuilds the columns whose
+    # values differ, and a rebuild wraps the column buffers instead of converting rows
+    def __init__(self, sch: TableSchema, store: storage.Store):
+        self._names = ['id', *sch.column_names]
+        self._columns = [FrameColumn(tn) for tn in [sch.id_type_name, *sch.type_names]]
+        for position, column in enumerate(self._columns):
+            for native in store.natives(position):
+                column.append(native)
+        self._arrays: List[Any] = [None] * len(self._columns)
+        self._df: Union[pd.DataFrame, None] = None
+
+    def append(self, row: Row) -> None:
+        for column, value in zip(self._columns, (row.identifier, *row.values)):
+            column.append(value.native)
+        self._invalidate(range(len(self._columns)))
+
+    def set(self, index: int, row: Row) -> None:
+        changed = [k for k, (column, value) in enumerate(zip(self._columns, (row.identifier, *row.values)))
+                   if column.set(index, value.native)]
+        self._invalidate(changed)
+
+    def swap_remove(self, index: int) -> None:
+        for column in self._columns:
+            column.swap_remove(index)
+        self._invalidate(range(len(self._columns)))
+
+    def natives(self, position: int) -> List[np.ndarray]:
+        return self._columns[position].natives()
+
+    def to_df(self) -> pd.DataFrame:
+        df = self._df
+        if df is None:
+            for k, column in enumerate(self._columns):
+                if self._arrays[k] is None:
+                    self._arrays[k] = column.to_array()
+            # the arrays are private to the frame, which callers must not modify
+            df = pd.DataFrame(dict(zip(self._names, self._arrays)), copy=False)
+            self._df = df
+        return df
+
+    def _invalidate(self, positions: Iterable[int]) -> None:
+        for k in positions:
+            self._arrays[k] = None
+            self._df = None
@@ -0,0 +1,344 @@
+import random
+import sys
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple, Union
+
+
+class SortedIndex:
+    # keys are kept in a list of sorted blocks, so that inserts and deletes
+    # shift at most one block instead of the whole index
+    LOAD = 1000
+
+    def __init__(self, keys: Iterable[Any] = ()):
+        ordered = sorted(keys)
+        self._blocks: List[List[Any]] = [
+            ordered[i:i + SortedIndex.LOAD] for i in range(0, len(ordered), SortedIndex.LOAD)
+        ]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(ordered)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        for block in self._blocks:
+            yield from block
+
+    @property
+    def nbytes(self) -> int:
+        return (sys.getsizeof(self._blocks) + sys.getsizeof(self._maxes)
+                + sum(sys.getsizeof(block) for block in self._blocks))
+
+    def add(self, key: Any) -> None:
+        self._len += 1
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            return
+        i = bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            i -= 1
+        block = self._blocks[i]
+        insort(block, key)
+        self._maxes[i] = block[-1]
+        if len(block) > 2 * SortedIndex.LOAD:
+            half = len(block) // 2
+            self._blocks[i:i + 1] = [block[:half], block[half:]]
+            self._maxes[i:i + 1] = [block[half - 1], block[-1]]
+
+    def remove(self, key: Any) -> None:
+        i = bisect_left(self._maxes, key)
+        block = self._blocks[i] if i < len(self._blocks) else []
+        j = bisect_left(block, key)
+        assert j < len(block) and block[j] == key, f'{key} is not in the index'
+        del block[j]
+        self._len -= 1
+        if block:
+            self._maxes[i] = block[-1]
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+
+    def after(self, key: Union[Any, None], limit: int) -> List[Any]:
+        result = []
+        for k in self.iter_from(key, inclusive=False):
+            if len(result) >= limit:
+                break
+            result.append(k)
+        return result
+
+    def iter_from(self, key: Union[Any, None], inclusive: bool = True) -> Iterator[Any]:
+        if key is None:
+            yield from self
+            return
+        bisect = bisect_left if inclusive else bisect_right
+        i = bisect(self._maxes, key)
+        if i == len(self._blocks):
+            return
+        yield from self._blocks[i][bisect(self._blocks[i], key):]
+        for block in self._blocks[i + 1:]:
+            yield from block
+
+    def iter_before(self, key: Union[Any, None], inclusive: bool = True) -> Iterator[Any]:
+        # the keys up to key, largest first
+        if not self._blocks:
+            return
+        i = len(self._blocks) - 1
+        j = len(self._blocks[i])
+        if key is not None:
+            i = bisect_left(self._maxes, key)
+            if i == len(self._blocks):
+                i -= 1
+            else:
+                j = (bisect_right if inclusive else bisect_left)(self._blocks[i], key)
+        yield from reversed(self._blocks[i][:j])
+        for block in reversed(self._blocks[:i]):
+            yield from reversed(block)
+
+
+class ColumnIndex(ABC):
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        ...
+
+    @abstractmethod
+    def add(self, value: Any, identifier: Any) -> None:
+        ...
+
+    @abstractmethod
+    def remove(self, value: Any, identifier: Any) -> None:
+        ...
+
+    @abstractmethod
+    def lookup(self, value: Any) -> Iterator[Any]:
+        ...
+
+
+class HashColumnIndex(ColumnIndex):
+    def __init__(self):
+        self._ids: Dict[Any, Set[Any]] = {}
+        self._len = 0
+
+    @property
+    def nbytes(self) -> int:
+        # estimated from the counts, like the other indexes, instead of a walk over the sets
+        return sys.getsizeof(self._ids) + len(self._ids) * sys.getsizeof(set()) + 64 * self._len
+
+    def add(self, value: Any, identifier: Any) -> None:
+        ids = self._ids.get(value)
+        if ids is None:
+            self._ids[value] = {identifier}
+        else:
+            ids.add(identifier)
+        self._len += 1
+
+    def remove(self, value: Any, identifier: Any) -> None:
+        ids = self._ids[value]
+        ids.remove(identifier)
+        self._len -= 1
+        if not ids:
+            del self._ids[value]
+
+    def lookup(self, value: Any) -> Iterator[Any]:
+        return iter(self._ids.get(value, ()))
+
+
+class SortedColumnIndex(ColumnIndex):
+    # entries are (value, identifier) pairs, so equal values are ordered by identifier
+    def __init__(self):
+        self._entries = SortedIndex()
+
+    @property
+    def nbytes(self) -> int:
+        return self._entries.nbytes + 64 * len(self._entries)
+
+    def add(self, value: Any, identifier: Any) -> None:
+        self._entries.add((value, identifier))
+
+    def remove(self, value: Any, identifier: Any) -> None:
+        self._entries.remove((value, identifier))
+
+    def lookup(self, value: Any) -> Iterator[Any]:
+        return self.range(value, value)
+
+    def range(self, lower: Union[Any, None], upper: Union[Any, None]) -> Iterator[Any]:
+        # identifiers of entries with lower <= value <= upper, in value order
+        for value, identifier in self._entries.iter_from((lower,) if lower is not None else None):
+            if upper is not None and value > upper:
+                return
+            yield identifier
+
+    def scan(self, after: Union[Tuple[Any, Any], None] = None, descending: bool = False) -> Iterator[Any]:
+        # identifiers in (value, identifier) order, strictly after the given entry
+        if descending:
+            entries = self._entries.iter_before(after, inclusive=False)
+        else:
+            entries = self._entries.iter_from(after, inclusive=False)
+        for _, identifier in entries:
+            yield identifier
+
+    def prefix(self, prefix: str) -> Iterator[Any]:
+        for value, identifier in self._entries.iter_from((prefix,)):
+            if not value.startswith(prefix):
+                return
+            yield identifier
+
+
+class _IntervalNode:
+    __slots__ = ('key', 'priority', 'left', 'right', 'max_upper')
+
+    def __init__(self, key: Tuple[Any, Any, Any], priority: float):
+        self.key = key
+        self.priority = priority
+        self.left: Union['_IntervalNode', None] = None
+        self.right: Union['_IntervalNode', None] = None
+        self.max_upper = key[1]
+
+    def refresh(self) -> None:
+        max_upper = self.key[1]
+        if self.left is not None and self.left.max_upper > max_upper:
+            max_upper = self.left.max_upper
+        if self.right is not None and self.right.max_upper > max_upper:
+            max_upper = self.right.max_upper
+        self.max_upper = max_upper
+
+
+class IntervalColumnIndex(ColumnIndex):
+    # a treap ordered by (lower, upper, identifier) where every node also keeps
+    # the largest upper bound of its subtree, so that subtrees which end before
+    # the queried range are skipped: queries take O(log n + k) on average
+    def __init__(self):
+        self._root: Union[_IntervalNode, None] = None
+        self._len = 0
+        self._random = random.Random()
+
+    @property
+    def nbytes(self) -> int:
+        return self._len * (sys.getsizeof(_IntervalNode((0, 0, 0), 0.0)) + 64)
+
+    def build(self, entries: Iterable[Tuple[Tuple[Any, Any], Any]]) -> None:
+        nodes = [_IntervalNode((value[0], value[1], identifier), self._random.random())
+                 for value, identifier in entries]
+        nodes.sort(key=lambda n: n.key)
+        # linear-time Cartesian tree construction over the sorted keys
+        stack: List[_IntervalNode] = []
+        for node in nodes:
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        self._root = stack[0] if stack else None
+        self._len = len(nodes)
+        for node in reversed(IntervalColumnIndex._preorder(self._root)):
+            node.refresh()
+
+    def add(self, value: Tuple[Any, Any], identifier: Any) -> None:
+        node = _IntervalNode((value[0], value[1], identifier), self._random.random())
+        self._root = IntervalColumnIndex._insert(self._root, node)
+        self._len += 1
+
+    def remove(self, value: Tuple[Any, Any], identifier: Any) -> None:
+        self._root = IntervalColumnIndex._remove(self._root, (value[0], value[1], identifier))
+        self._len -= 1
+
+    def lookup(self, value: Tuple[Any, Any]) -> Iterator[Any]:
+        for lower, upper, identifier in self._overlapping(value[0], value[1]):
+            if lower == value[0] and upper == value[1]:
+                yield identifier
+
+    def overlaps(self, lower: Any, upper: Any) -> Iterator[Any]:
+        return (identifier for _, _, identifier in self._overlapping(lower, upper))
+
+    def contains(self, point: Any) -> Iterator[Any]:
+        return self.overlaps(point, point)
+
+    def _overlapping(self, lower: Any, upper: Any) -> List[Tuple[Any, Any, Any]]:
+        result = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            while node is not None and node.max_upper >= lower:
+                stack.append(node.left)
+                if node.key[0] > upper:
+                    # everything to the right starts even later
+                    break
+                if node.key[1] >= lower:
+                    result.append(node.key)
+                node = node.right
+        return result
+
+    @staticmethod
+    def _preorder(root: Union[_IntervalNode, None]) -> List[_IntervalNode]:
+        result = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                result.append(node)
+                stack.append(node.right)
+                stack.append(node.left)
+        return result
+
+    @staticmethod
+    def _insert(node: Union[_IntervalNode, None], new: _IntervalNode) -> _IntervalNode:
+        if node is None:
+            return new
+        if new.key < node.key:
+            node.left = IntervalColumnIndex._insert(node.left, new)
+            if node.left.priority > node.priority:
+                node = IntervalColumnIndex._rotate_right(node)
+        else:
+            node.right = IntervalColumnIndex._insert(node.right, new)
+            if node.right.priority > node.priority:
+                node = IntervalColumnIndex._rotate_left(node)
+        node.refresh()
+        return node
+
+    @staticmethod
+    def _remove(node: Union[_IntervalNode, None], key: Tuple[Any, Any, Any]) -> Union[_IntervalNode, None]:
+        assert node is not None, f'{key} is not in the index'
+        if key < node.key:
+            node.left = IntervalColumnIndex._remove(node.left, key)
+        elif key > node.key:
+            node.right = IntervalColumnIndex._remove(node.right, key)
+        else:
+            return IntervalColumnIndex._merge(node.left, node.right)
+        node.refresh()
+        return node
+
+    @staticmethod
+    def _merge(left: Union[_IntervalNode, None], right: Union[_IntervalNode, None]) -> Union[_IntervalNode, None]:
+        if left is None:
+            return right
+        if right is None:
+            return left
+        if left.priority > right.priority:
+            left.right = IntervalColumnIndex._merge(left.right, right)
+            left.refresh()
+            return left
+        right.left = IntervalColumnIndex._merge(left, right.left)
+        right.refresh()
+        return right
+
+    @staticmethod
+    def _rotate_right(node: _IntervalNode) -> _IntervalNode:
+        pivot = node.left
+        node.left = pivot.right
+        pivot.right = node
+        node.refresh()
+        pivot.refresh()
+        return pivot
+
+    @staticmethod
+    def _rotate_left(node: _IntervalNode) -> _IntervalNode:
+        pivot = node.right
+        node.right = pivot.left
+        pivot.left = node
+        node.refresh()
+        pivot.refresh()
+        return pivot
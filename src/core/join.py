@@ -0,0 +1,236 @@
+import itertools
+import tempfile
+import zlib
+from array import array
+from contextlib import closing
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+from .row import Row
+from .table import Table
+
+
+class JoinNames(Enum):
+    INNER = 'inner'
+    LEFT = 'left'
+
+
+# pairs of store positions; None stands for the missing side of an unmatched left row
+Positions = Tuple[Union[int, None], Union[int, None]]
+Pair = Tuple[Row, Union[Row, None]]
+# where a page of the join ends: the build side and number of partitions it was planned with,
+# the partition, the probe row and how many of its pairs are done (past the last probe row,
+# the next build row of the unmatched ones instead)
+JoinCursor = Tuple[int, int, int, int, int]
+
+
+class HashJoin:
+    # rough cost of one build row in the in-memory hash table, as in Deduplicator
+    ENTRY_BYTES = 100
+    DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+    CHUNK_ENTRIES = 8192
+
+    def __init__(self, left: Table, right: Table, left_on: str = 'id', right_on: str = 'id',
+                 how: JoinNames = JoinNames.INNER, memory_limit: Union[int, None] = None):
+        self._tables = (left, right)
+        self._key_positions = (HashJoin._key_position(left, left_on), HashJoin._key_position(right, right_on))
+        left_type = left.schema.id_type_name if left_on == 'id' else left.schema.type_names[self._key_positions[0] - 1]
+        right_type = (right.schema.id_type_name if right_on == 'id'
+                      else right.schema.type_names[self._key_positions[1] - 1])
+        if left_type is not right_type:
+            raise ValueError(f'Cannot join {left_type.value} column {left_on} with {right_type.value} column {right_on}')
+        self._how = how
+        self._memory_limit = memory_limit or HashJoin.DEFAULT_MEMORY_LIMIT
+
+    @property
+    def columns(self) -> List[str]:
+        left, right = self._tables
+        prefixes = (left.name, right.name) if left.name != right.name else ('left', 'right')
+        return [f'{prefix}.{c}' for prefix, t in zip(prefixes, self._tables) for c in ['id', *t.schema.column_names]]
+
+    @property
+    def build_side(self) -> int:
+        # 0 for the left table, 1 for the right one; the smaller table is hashed
+        left, right = self._tables
+        return 0 if len(left) < len(right) else 1
+
+    @property
+    def partitions(self) -> int:
+        rows = len(self._tables[self.build_side])
+        return max(1, -(-rows * HashJoin.ENTRY_BYTES // self._memory_limit))
+
+    def describe(self) -> str:
+        build = self._tables[self.build_side]
+        probe = self._tables[1 - self.build_side]
+        partitions = self.partitions
+        spill = f', spilled to {partitions} partitions' if partitions > 1 else ''
+        return f'{self._how.value} hash join: build {build.name} ({len(build)} rows), probe {probe.name}{spill}'
+
+    def page(self, limit: int, after: Union[JoinCursor, None] = None) -> Tuple[List[Pair], Union[JoinCursor, None]]:
+        # up to limit pairs after the cursor and the cursor of the last one, None once the join is
+        # exhausted; cursors stay valid for as long as neither table changes
+        assert limit > 0, 'Limit must be positive'
+        with closing(self._iter_pairs(after)) as pairs:
+            taken = list(itertools.islice(pairs, limit + 1))
+        return [pair for pair, _ in taken[:limit]], taken[limit - 1][1] if len(taken) > limit else None
+
+    def iter_rows(self) -> Iterator[Pair]:
+        with closing(self._iter_pairs(None)) as pairs:
+            for pair, _ in pairs:
+                yield pair
+
+    def _iter_pairs(self, after: Union[JoinCursor, None]) -> Iterator[Tuple[Pair, JoinCursor]]:
+        # holds both read locks until exhausted or closed, which has to happen in the same thread;
+        # they are taken in a fixed order, so that joins of the same tables in opposite
+        # directions do not wait for each other behind a queued writer
+        left, right = self._tables
+        first, second = sorted(self._tables, key=id)
+        with first.lock.read(), second.lock.read():
+            build_side, partitions = self.build_side, self.partitions
+            if after is None:
+                after = (build_side, partitions, 0, 0, 0)
+            if len(after) != 5 or not all(isinstance(v, int) and v >= 0 for v in after):
+                raise ValueError('Invalid join cursor')
+            if after[:2] != (build_side, partitions):
+                raise ValueError('The tables changed since the join cursor was taken')
+            _, _, partition, probe_row, done = after
+            if partition >= partitions:
+                raise ValueError('Invalid join cursor')
+            if partitions == 1:
+                pairs = ((positions, (0, *place)) for positions, place in self._join(build_side, (probe_row, done)))
+            else:
+                pairs = self._join_spilled(build_side, partitions, (partition, probe_row, done))
+            for positions, place in pairs:
+                left_position, right_position = positions if build_side == 0 else positions[::-1]
+                pair = left.store.row(left_position), None if right_position is None else right.store.row(right_position)
+                yield pair, (build_side, partitions, *place)
+
+    def _join(self, build_side: int, start: Tuple[int, int]) -> Iterator[Tuple[Positions, Tuple[int, int]]]:
+        # yields (build, probe) positions in the order of the probe side, each with the place after
+        # it: the probe row and how many of its pairs are done, or, past the last probe row, the
+        # build row from which the unmatched ones of a left join continue
+        build, probe = self._tables[build_side], self._tables[1 - build_side]
+        probe_position = self._key_positions[1 - build_side]
+        hashed: Dict[Any, Union[int, List[int]]] = {}
+        for i, key in enumerate(build.store.natives(self._key_positions[build_side])):
+            found = hashed.get(key)
+            if found is None:
+                hashed[key] = i
+            elif isinstance(found, list):
+                found.append(i)
+            else:
+                hashed[key] = [found, i]
+        keep_unmatched = self._how is JoinNames.LEFT and build_side == 1
+        probe_row, done = start
+        end = len(probe.store)
+        for j, key in enumerate(itertools.islice(probe.store.natives(probe_position), probe_row, None), probe_row):
+            found = hashed.get(key)
+            if found is None:
+                if keep_unmatched:
+                    yield (None, j), (j + 1, 0)
+                continue
+            found = found if isinstance(found, list) else [found]
+            skip = done if j == probe_row else 0
+            for k, i in enumerate(found[skip:], skip + 1):
+                yield (i, j), (j, k) if k < len(found) else (j + 1, 0)
+        if self._how is JoinNames.LEFT and build_side == 0:
+            # a second pass over the probe keys, as the rows before the cursor are matched as well
+            matched = {key for key in probe.store.natives(probe_position) if key in hashed}
+            first = done if probe_row >= end else 0
+            for i, key in enumerate(itertools.islice(build.store.natives(self._key_positions[0]), first, None), first):
+                if key not in matched:
+                    yield (i, None), (end, i + 1)
+
+    def _join_spilled(self, build_side: int, partitions: int,
+                      start: Tuple[int, int, int]) -> Iterator[Tuple[Positions, Tuple[int, int, int]]]:
+        # both sides are partitioned by the hash of the key, so equal keys meet in the
+        # same partition and only one partition of the build side is in memory at a time;
+        # the unmatched rows of a left join follow the probe rows of their partition
+        build, probe = self._tables[build_side], self._tables[1 - build_side]
+        build_position, probe_position = self._key_positions[build_side], self._key_positions[1 - build_side]
+        keep_unmatched = self._how is JoinNames.LEFT and build_side == 1
+        first_partition, probe_row, done = start
+        end = len(probe.store)
+        build_files = HashJoin._spill(build.store.natives(build_position), partitions, first_partition)
+        probe_files = HashJoin._spill(probe.store.natives(probe_position), partitions, first_partition)
+        try:
+            for partition in range(first_partition, partitions):
+                if partition > first_partition:
+                    probe_row, done = 0, 0
+                hashed: Dict[int, List[int]] = {}
+                for fingerprint, i in HashJoin._read(build_files[partition]):
+                    hashed.setdefault(fingerprint, []).append(i)
+
+                def matches(fingerprint: int, j: int) -> List[int]:
+                    # fingerprints may collide, so the keys themselves are compared
+                    candidates = hashed.get(fingerprint, ())
+                    if not candidates:
+                        return []
+                    key = HashJoin._key(probe.store.row(j), probe_position)
+                    return [i for i in candidates if HashJoin._key(build.store.row(i), build_position) == key]
+
+                for fingerprint, j in HashJoin._read(probe_files[partition]):
+                    if j < probe_row:
+                        continue
+                    found = matches(fingerprint, j)
+                    if not found and keep_unmatched:
+                        yield (None, j), (partition, j + 1, 0)
+                    skip = done if j == probe_row else 0
+                    for k, i in enumerate(found[skip:], skip + 1):
+                        yield (i, j), (partition, j, k) if k < len(found) else (partition, j + 1, 0)
+                if self._how is JoinNames.LEFT and build_side == 0:
+                    matched = {i for fingerprint, j in HashJoin._read(probe_files[partition])
+                               for i in matches(fingerprint, j)}
+                    first = done if probe_row >= end else 0
+                    for _, i in HashJoin._read(build_files[partition]):
+                        if i >= first and i not in matched:
+                            yield (i, None), (partition, end, i + 1)
+        finally:
+            for file in [*build_files, *probe_files]:
+                file.close()
+
+    @staticmethod
+    def _spill(natives: Iterable[Any], partitions: int, first: int = 0) -> List[Any]:
+        # partitions before first are left empty, a cursor has gone past them
+        files = [tempfile.TemporaryFile() for _ in range(partitions)]
+        buffers = [array('q') for _ in range(partitions)]
+        for i, key in enumerate(natives):
+            fingerprint = HashJoin._fingerprint(key)
+            if fingerprint % partitions < first:
+                continue
+            buffer = buffers[fingerprint % partitions]
+            buffer.append(fingerprint)
+            buffer.append(i)
+            if len(buffer) >= 2 * HashJoin.CHUNK_ENTRIES:
+                buffer.tofile(files[fingerprint % partitions])
+                del buffer[:]
+        for buffer, file in zip(buffers, files):
+            buffer.tofile(file)
+        return files
+
+    @staticmethod
+    def _fingerprint(key: Any) -> int:
+        # the same in every process, unlike hash() of text, so cursors survive restarts and workers
+        return zlib.crc32(repr(key).encode('utf-8'))
+
+    @staticmethod
+    def _read(file) -> Iterator[Tuple[int, int]]:
+        file.seek(0)
+        while True:
+            chunk = array('q')
+            chunk.frombytes(file.read(16 * HashJoin.CHUNK_ENTRIES))
+            if not chunk:
+                return
+            yield from zip(chunk[::2], chunk[1::2])
+
+    @staticmethod
+    def _key(row: Row, position: int) -> Any:
+        return (row.identifier if position == 0 else row.values[position - 1]).native
+
+    @staticmethod
+    def _key_position(table: Table, column: str) -> int:
+        if column == 'id':
+            return 0
+        if column not in table.schema.column_names:
+            raise ValueError(f'Unknown column {column} in table {table.name}')
+        return table.schema.column_names.index(column) + 1
@@ -0,0 +1,199 @@
+import bisect
+import contextlib
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+# Metrics in the Prometheus text format. Everything is off until enable() is called, and
+# the hooks in the hot paths then cost a single check of a module global
+
+_enabled = False
+
+Labels = Tuple[str, ...]
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = on
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+class Metric(ABC):
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self._name = name
+        self._description = description
+        self._label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self._name} {self._description}'
+        yield f'# TYPE {self._name} {self.TYPE}'
+        for suffix, labels, value in self.samples():
+            yield f'{self._name}{suffix}{_format_labels(labels)} {_format_value(value)}'
+
+    @abstractmethod
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        ...
+
+    def _labels(self, values: Labels) -> Dict[str, str]:
+        assert len(values) == len(self._label_names), f'{self._name} expects labels {self._label_names}'
+        return dict(zip(self._label_names, values))
+
+
+class Counter(Metric):
+    TYPE = 'counter'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield '', self._labels(labels), value
+
+
+class Gauge(Metric):
+    TYPE = 'gauge'
+
+    # with a callback, the values are read when the metrics are rendered
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (),
+                 callback: Union[Callable[[], Dict[Labels, float]], None] = None):
+        super().__init__(name, description, label_names)
+        self._values: Dict[Labels, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, *labels: str) -> None:
+        self.inc(-amount, *labels)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        if self._callback is not None:
+            values = list(self._callback().items())
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        for labels, value in values:
+            yield '', self._labels(labels), value
+
+
+class Histogram(Metric):
+    TYPE = 'histogram'
+    # seconds, from a single row operation up to a whole export
+    DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, label_names)
+        self._buckets = tuple(sorted(buckets))
+        # per label set: count in each bucket (the last one is +Inf), sum and count
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self._buckets) + 1), [0.0, 0])
+            entry[0][i] += 1
+            entry[1][0] += value
+            entry[1][1] += 1
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = [(labels, list(counts), list(totals)) for labels, (counts, totals) in self._values.items()]
+        for labels, counts, (total, count) in values:
+            named = self._labels(labels)
+            cumulative = 0
+            for bound, bucket_count in zip((*self._buckets, math.inf), counts):
+                cumulative += bucket_count
+                yield '_bucket', {**named, 'le': _format_value(bound)}, cumulative
+            yield '_sum', named, total
+            yield '_count', named, count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            assert metric.name not in self._metrics, f'Metric {metric.name} is already registered'
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return ''.join(f'{line}\n' for metric in metrics for line in metric.render())
+
+
+registry = Registry()
+
+operation_seconds: Histogram = registry.register(Histogram(
+    'db_core_operation_seconds', 'Time spent in core operations', ['operation'],
+))
+
+
+class _Timer:
+    __slots__ = ('_operation', '_start')
+
+    def __init__(self, operation: str):
+        self._operation = operation
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        operation_seconds.observe(time.perf_counter() - self._start, self._operation)
+
+
+_NOT_TIMED = contextlib.nullcontext()
+
+
+def timed(operation: str):
+    # with metrics.timed('insert'): ...
+    if not _enabled:
+        return _NOT_TIMED
+    return _Timer(operation)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
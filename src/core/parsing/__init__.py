@@ -1 +1 @@
-from . import row, schema
\ No newline at end of file
+from . import row, schema, bulk
\ No newline at end of file
@@ -0,0 +1,57 @@
+from typing import List, Tuple
+
+from core.table import Table
+
+from .row import parse_rows
+
+
+class BulkLoader:
+    def __init__(self, table: Table, batch_size: int = 1000):
+        assert batch_size > 0, 'Batch size must be positive'
+        self._table = table
+        self._batch_size = batch_size
+        self._tail = ''
+        self._line_no = 0
+        self._batch: List[Tuple[int, str]] = []
+        self._inserted = 0
+        self._errors: List[Tuple[int, str]] = []
+
+    @property
+    def inserted(self) -> int:
+        return self._inserted
+
+    @property
+    def errors(self) -> List[Tuple[int, str]]:
+        return self._errors
+
+    def feed(self, text: str) -> None:
+        *lines, self._tail = (self._tail + text).split('\n')
+        for line in lines:
+            self._add_line(line)
+
+    def close(self) -> None:
+        if self._tail:
+            self._add_line(self._tail)
+            self._tail = ''
+        self._flush()
+
+    def _add_line(self, line: str) -> None:
+        self._line_no += 1
+        line = line.rstrip('\r')
+        if not line.strip():
+            return
+        self._batch.append((self._line_no, line))
+        if len(self._batch) >= self._batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._batch:
+            return
+        line_numbers = [n for n, _ in self._batch]
+        rows, errors = parse_rows(self._table.schema, [d for _, d in self._batch])
+        rejected = self._table.insert_many([r for _, r in rows])
+        errors += [(rows[i][0], message) for i, message in rejected]
+        errors.sort()
+        self._errors += [(line_numbers[i], message) for i, message in errors]
+        self._inserted += len(rows) - len(rejected)
+        self._batch = []
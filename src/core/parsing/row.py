@@ -1,12 +1,21 @@
+from typing import List, Tuple
+
+from core import metrics
 from core.schema import TableSchema
 from core.row import Row
 
 
 def parse_row(schema: TableSchema, definition: str) -> Row:
-    str_values = definition.split(';')
-    identifier = schema.id_type.from_string(str_values[0])
-    values = []
-    for str_v, v_type in zip(str_values[1:], schema.types):
-        values.append(v_type.from_string(str_v.strip()))
+    with metrics.timed('parse'):
+        return schema.codec.parse(definition)
+
 
-    return Row(identifier, values)
+def parse_rows(schema: TableSchema, definitions: List[str]) -> Tuple[List[Tuple[int, Row]], List[Tuple[int, str]]]:
+    rows = []
+    errors = []
+    for i, definition in enumerate(definitions):
+        try:
+            rows.append((i, parse_row(schema, definition)))
+        except ValueError as e:
+            errors.append((i, str(e)))
+    return rows, errors
@@ -1,20 +1,24 @@
-from core.schema import TableSchema, TypeNames
+from core.schema import IndexNames, TableSchema, TypeNames
 
 
 def parse_schema(table_schema: str) -> TableSchema:
     id_col_type = None
     col_names = []
     col_types = []
+    indexes = {}
     for line in table_schema.strip().splitlines():
         type_name, col_name, *other = line.split()
-        assert len(other) == 0
+        # optional index declaration: `MONEY price INDEX [HASH|SORTED|INTERVAL]`
+        assert len(other) == 0 or (other[0].lower() == 'index' and len(other) <= 2), f'Invalid column: {line}'
         col_type = TypeNames(type_name.lower())
         if col_name.lower() == 'id':
+            assert len(other) == 0, 'id column is always indexed'
             id_col_type = col_type
         else:
             col_names.append(col_name)
             col_types.append(col_type)
+            if other:
+                indexes[col_name] = IndexNames(other[1].lower()) if len(other) == 2 else IndexNames.HASH
     assert id_col_type is not None, 'id column is not defined!'
 
-    return TableSchema(id_type_name=id_col_type, col_names=col_names, type_names=col_types)
-
+    return TableSchema(id_type_name=id_col_type, col_names=col_names, type_names=col_types, indexes=indexes)
@@ -0,0 +1,337 @@
+import heapq
+import itertools
+from enum import Enum
+from typing import Any, Callable, Iterator, List, Sequence, Tuple, Union
+
+from .row import Row
+from .schema import IndexNames
+from .table import Table
+from . import datatypes
+
+
+class Operators(Enum):
+    EQ = '='
+    LT = '<'
+    GT = '>'
+    BETWEEN = 'between'
+    PREFIX = 'prefix'
+    CONTAINS = 'contains'
+    OVERLAPS = 'overlaps'
+
+
+class Condition:
+    def __init__(self, column: str, operator: Operators, operands: List[datatypes.DataType]):
+        self._column = column
+        self._operator = operator
+        self._operands = operands
+        self._test = Condition._make_test(operator, [o.native for o in operands])
+
+    @property
+    def column(self) -> str:
+        return self._column
+
+    @property
+    def operator(self) -> Operators:
+        return self._operator
+
+    @property
+    def operands(self) -> List[datatypes.DataType]:
+        return self._operands
+
+    def matches(self, value: datatypes.DataType) -> bool:
+        return self._test(value.native)
+
+    def __str__(self) -> str:
+        return f'{self._column} {self._operator.value} {" and ".join(str(o) for o in self._operands)}'
+
+    @staticmethod
+    def from_strings(table: Table, column: str, operator: Operators, operands: Sequence[str]) -> 'Condition':
+        d_type = Query.column_type(table, column)
+        if operator is Operators.BETWEEN:
+            expected = 2
+        else:
+            expected = 1
+        if len(operands) != expected:
+            raise ValueError(f'Operator {operator.value} expects {expected} operand(s)')
+        if operator is Operators.PREFIX:
+            if d_type not in (datatypes.String, datatypes.Char):
+                raise ValueError(f'Operator prefix is not supported for column {column}')
+            return Condition(column, operator, [datatypes.String.from_string(operands[0])])
+        if operator in (Operators.CONTAINS, Operators.OVERLAPS):
+            if d_type is not datatypes.MoneyInterval:
+                raise ValueError(f'Operator {operator.value} is only supported for money interval columns')
+            operand_type = datatypes.Money if operator is Operators.CONTAINS else datatypes.MoneyInterval
+            return Condition(column, operator, [operand_type.from_string(operands[0])])
+        return Condition(column, operator, [d_type.from_string(o) for o in operands])
+
+    @staticmethod
+    def _make_test(operator: Operators, operands: List[Any]) -> Callable[[Any], bool]:
+        if operator is Operators.EQ:
+            return lambda v: v == operands[0]
+        if operator is Operators.LT:
+            return lambda v: v < operands[0]
+        if operator is Operators.GT:
+            return lambda v: v > operands[0]
+        if operator is Operators.BETWEEN:
+            return lambda v: operands[0] <= v <= operands[1]
+        if operator is Operators.PREFIX:
+            return lambda v: v.startswith(operands[0])
+        if operator is Operators.CONTAINS:
+            return lambda v: v[0] <= operands[0] <= v[1]
+        # overlaps
+        return lambda v: v[0] <= operands[0][1] and operands[0][0] <= v[1]
+
+
+class Ordering:
+    def __init__(self, column: str, descending: bool = False):
+        self._column = column
+        self._descending = descending
+
+    @property
+    def column(self) -> str:
+        return self._column
+
+    @property
+    def descending(self) -> bool:
+        return self._descending
+
+
+class Plan:
+    def __init__(self, description: str, candidates: Callable[[], Iterator[Row]], ordered: bool):
+        self._description = description
+        self._candidates = candidates
+        self._ordered = ordered
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @property
+    def ordered(self) -> bool:
+        # whether the candidates already come in the requested order
+        return self._ordered
+
+    def candidates(self) -> Iterator[Row]:
+        return self._candidates()
+
+
+class Query:
+    # skipped rows are still read one by one, so pages further on follow a cursor instead
+    MAX_OFFSET = 10_000
+
+    def __init__(self, table: Table, where: Union[List[Condition], None] = None,
+                 select: Union[List[str], None] = None, order_by: Union[List[Ordering], None] = None,
+                 limit: Union[int, None] = None, offset: int = 0,
+                 after: Union[List[datatypes.DataType], None] = None):
+        # after is the cursor of the last row of the previous page, see cursor()
+        self._table = table
+        self._where = where or []
+        self._columns = ['id', *table.schema.column_names]
+        self._select = select or self._columns
+        self._order_by = order_by or []
+        self._limit = limit
+        self._offset = offset
+        self._after = after
+        for column in [*self._select, *(c.column for c in self._where), *(o.column for o in self._order_by)]:
+            Query.column_type(table, column)
+        if limit is not None and limit < 0:
+            raise ValueError('Limit must not be negative')
+        if offset < 0:
+            raise ValueError('Offset must not be negative')
+        if offset > Query.MAX_OFFSET:
+            raise ValueError(f'Offset must not exceed {Query.MAX_OFFSET}, continue from a cursor instead')
+        if after is not None:
+            if not self.keyset:
+                raise ValueError('A cursor needs an ordering by id or by a column with a sorted index')
+            column = self._order_by[0].column
+            types = [table.schema.id_type] if column == 'id' else [Query.column_type(table, column),
+                                                                    table.schema.id_type]
+            if len(after) != len(types) or any(type(v) is not t for v, t in zip(after, types)):
+                raise ValueError('The cursor does not match the ordering')
+
+    @property
+    def select(self) -> List[str]:
+        return self._select
+
+    @property
+    def positions(self) -> List[int]:
+        return [self._columns.index(c) for c in self._select]
+
+    @property
+    def keyset(self) -> bool:
+        # whether pages can continue from a cursor: a single ordering by id or by a column
+        # with a sorted index, which the cursor seeks to in O(log n)
+        if len(self._order_by) != 1:
+            return False
+        column = self._order_by[0].column
+        return column == 'id' or self._table.indexes.get(column) is IndexNames.SORTED
+
+    def cursor(self, row: Row) -> List[datatypes.DataType]:
+        # the position after row for a keyset query: its identifier, preceded by the
+        # value of the ordering column unless that is the identifier
+        assert self.keyset, 'The query has no keyset ordering'
+        column = self._order_by[0].column
+        if column == 'id':
+            return [row.identifier]
+        return [row.values[self._columns.index(column) - 1], row.identifier]
+
+    @staticmethod
+    def column_type(table: Table, column: str):
+        if column == 'id':
+            return table.schema.id_type
+        if column not in table.schema.column_names:
+            raise ValueError(f'Unknown column: {column}')
+        return table.schema.types[table.schema.column_names.index(column)]
+
+    def plan(self) -> Plan:
+        if self._after is not None:
+            return self._keyset_plan()
+
+        id_conditions = [c for c in self._where if c.column == 'id']
+        for c in id_conditions:
+            if c.operator is Operators.EQ:
+                identifier = c.operands[0]
+                return Plan(
+                    f'id lookup {identifier}',
+                    lambda: iter([r for r in [self._table.get(identifier)] if r is not None]),
+                    True,
+                )
+
+        indexes = self._table.indexes
+        for c in self._where:
+            if c.operator is Operators.EQ and c.column in indexes:
+                return Plan(
+                    f'{indexes[c.column].value} index lookup {c}',
+                    lambda c=c: self._table.lookup(c.column, c.operands[0]),
+                    not self._order_by,
+                )
+
+        for c in self._where:
+            if c.operator in (Operators.CONTAINS, Operators.OVERLAPS) and indexes.get(c.column) is IndexNames.INTERVAL:
+                if c.operator is Operators.CONTAINS:
+                    candidates = lambda c=c: self._table.scan_containing(c.column, c.operands[0])
+                else:
+                    candidates = lambda c=c: self._table.scan_overlapping(
+                        c.column, c.operands[0].lower, c.operands[0].upper)
+                return Plan(f'interval index scan {c}', candidates, not self._order_by)
+
+        lower, upper = Query._bounds(id_conditions)
+        wants_id_order = self._wants_order_of('id')
+        if lower is not None or upper is not None:
+            return Plan(
+                f'id range scan [{Query._describe_bounds(lower, upper)}]',
+                lambda: self._table.iter_range(lower, upper),
+                wants_id_order or not self._order_by,
+            )
+
+        sorted_columns = [c for c, index_name in indexes.items() if index_name is IndexNames.SORTED]
+        for column in sorted_columns:
+            column_conditions = [c for c in self._where if c.column == column]
+            for c in column_conditions:
+                if c.operator is Operators.PREFIX:
+                    return Plan(
+                        f'sorted index prefix scan {c}',
+                        lambda c=c: self._table.scan_prefix(c.column, c.operands[0].native),
+                        self._wants_order_of(column) or not self._order_by,
+                    )
+            column_lower, column_upper = Query._bounds(column_conditions)
+            if column_lower is not None or column_upper is not None:
+                return Plan(
+                    f'sorted index range scan {column} [{Query._describe_bounds(column_lower, column_upper)}]',
+                    lambda column=column, lo=column_lower, hi=column_upper: self._table.scan_index(column, lo, hi),
+                    self._wants_order_of(column) or not self._order_by,
+                )
+
+        if wants_id_order:
+            return Plan('id ordered scan', self._table.iter_range, True)
+        for column in sorted_columns:
+            if self._wants_order_of(column):
+                return Plan(
+                    f'sorted index ordered scan {column}',
+                    lambda column=column: self._table.scan_index(column),
+                    True,
+                )
+        return Plan('full scan', self._table.iter_rows, not self._order_by)
+
+    def _keyset_plan(self) -> Plan:
+        # seeks past the cursor; a bound on the ordering column ends the scan early
+        ordering = self._order_by[0]
+        column = ordering.column
+        after = tuple(v.native for v in self._after)
+        lower, upper = Query._bounds([c for c in self._where if c.column == column])
+        end = lower if ordering.descending else upper
+        position = self._columns.index(column)
+
+        def candidates() -> Iterator[Row]:
+            rows = self._table.scan_keyset(column, after, ordering.descending)
+            if end is None:
+                return rows
+            if ordering.descending:
+                return itertools.takewhile(lambda r: (r.identifier, *r.values)[position].native >= end.native, rows)
+            return itertools.takewhile(lambda r: (r.identifier, *r.values)[position].native <= end.native, rows)
+
+        direction = 'descending' if ordering.descending else 'ascending'
+        return Plan(f'keyset scan {column} {direction} after {", ".join(str(v) for v in self._after)}',
+                    candidates, True)
+
+    def _wants_order_of(self, column: str) -> bool:
+        return len(self._order_by) == 1 and self._order_by[0].column == column and not self._order_by[0].descending
+
+    @staticmethod
+    def _bounds(conditions: List[Condition]) -> Tuple[Union[datatypes.DataType, None], Union[datatypes.DataType, None]]:
+        # inclusive bounds; the conditions themselves are re-checked on every candidate
+        lower = None
+        upper = None
+        for c in conditions:
+            if c.operator in (Operators.GT, Operators.BETWEEN):
+                if lower is None or c.operands[0].native > lower.native:
+                    lower = c.operands[0]
+            if c.operator in (Operators.LT, Operators.BETWEEN):
+                if upper is None or c.operands[-1].native < upper.native:
+                    upper = c.operands[-1]
+        return lower, upper
+
+    @staticmethod
+    def _describe_bounds(lower: Union[datatypes.DataType, None], upper: Union[datatypes.DataType, None]) -> str:
+        return f'{lower if lower is not None else "-inf"}, {upper if upper is not None else "+inf"}'
+
+    def execute(self) -> List[Row]:
+        plan = self.plan()
+        with self._table.lock.read():
+            matches = self._filter(plan.candidates())
+            if self._order_by and not plan.ordered:
+                return self._sort(matches)[self._offset:]
+            return list(itertools.islice(matches, self._offset, self._stop))
+
+    @property
+    def _stop(self) -> Union[int, None]:
+        # rows up to this position are needed, the first offset of them are skipped
+        return None if self._limit is None else self._offset + self._limit
+
+    def _filter(self, rows: Iterator[Row]) -> Iterator[Row]:
+        tests = [(self._columns.index(c.column), c) for c in self._where]
+        for row in rows:
+            values = (row.identifier, *row.values)
+            if all(c.matches(values[p]) for p, c in tests):
+                yield row
+
+    def _sort(self, rows: Iterator[Row]) -> List[Row]:
+        keys: List[Tuple[int, bool]] = [(self._columns.index(o.column), o.descending) for o in self._order_by]
+        if all(p != 0 for p, _ in keys):
+            # equal rows in identifier order, as a keyset scan returns them
+            keys.append((0, keys[-1][1]))
+
+        def key(row: Row) -> Tuple:
+            values = (row.identifier, *row.values)
+            return tuple(values[p].native for p, _ in keys)
+
+        directions = {descending for _, descending in keys}
+        stop = self._stop
+        if stop is not None and len(directions) == 1:
+            select = heapq.nlargest if directions.pop() else heapq.nsmallest
+            return select(stop, rows, key=key)
+        result = list(rows)
+        # stable sorts from the least significant key allow mixed directions
+        for p, descending in reversed(keys):
+            result.sort(key=lambda r: (r.identifier, *r.values)[p].native, reverse=descending)
+        return result if stop is None else result[:stop]
@@ -1,7 +1,8 @@
 from enum import Enum
-from typing import List, Type
+from typing import Dict, List, Type, Union
 
 from . import datatypes
+from .codec import RowCodec
 
 
 class TypeNames(Enum):
@@ -13,11 +14,24 @@ class TypeNames(Enum):
     MONEY_INTERVAL = 'money_interval'
 
 
+class IndexNames(Enum):
+    HASH = 'hash'
+    SORTED = 'sorted'
+    INTERVAL = 'interval'
+
+
 class TableSchema:
-    def __init__(self, col_names: List[str], type_names: List[TypeNames], id_type_name: TypeNames):
+    def __init__(self, col_names: List[str], type_names: List[TypeNames], id_type_name: TypeNames,
+                 indexes: Union[Dict[str, IndexNames], None] = None):
         self._col_names = col_names
         self._type_names = type_names
         self._id_type_name = id_type_name
+        self._id_type = self._type_name_to_type(id_type_name)
+        self._types = [self._type_name_to_type(n) for n in type_names]
+        self._codec = None
+        self._indexes = dict(indexes or {})
+        for column, index_name in self._indexes.items():
+            self._check_index(column, index_name)
 
     @property
     def id_type_name(self) -> TypeNames:
@@ -25,7 +39,7 @@ class TableSchema:
 
     @property
     def id_type(self) -> Type[datatypes.DataType]:
-        return self._type_name_to_type(self._id_type_name)
+        return self._id_type
 
     @property
     def type_names(self) -> List[TypeNames]:
@@ -35,9 +49,34 @@ class TableSchema:
     def column_names(self) -> List[str]:
         return self._col_names
 
+    @property
+    def indexes(self) -> Dict[str, IndexNames]:
+        return self._indexes
+
+    def add_index(self, column: str, index_name: IndexNames) -> None:
+        assert column not in self._indexes, f'Column {column} is already indexed'
+        self._check_index(column, index_name)
+        self._indexes[column] = index_name
+
+    def remove_index(self, column: str) -> None:
+        assert column in self._indexes, f'Column {column} is not indexed'
+        del self._indexes[column]
+
+    def _check_index(self, column: str, index_name: IndexNames) -> None:
+        assert column in self._col_names, f'Cannot index unknown column {column}'
+        if index_name is IndexNames.INTERVAL:
+            assert self._type_names[self._col_names.index(column)] is TypeNames.MONEY_INTERVAL, \
+                f'Interval index requires a money interval column, {column} is not'
+
     @property
     def types(self) -> List[Type[datatypes.DataType]]:
-        return [self._type_name_to_type(n) for n in self._type_names]
+        return self._types
+
+    @property
+    def codec(self) -> RowCodec:
+        if self._codec is None:
+            self._codec = RowCodec(self._id_type, self._types)
+        return self._codec
 
     @staticmethod
     def _type_name_to_type(name: TypeNames) -> Type[datatypes.DataType]:
@@ -1,29 +1,250 @@
-from typing import List, Union
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+from urllib.parse import quote, unquote
 
 from .database import Database
+from .filesystem.coder import Coder
+from .filesystem.snapshot import SnapshotCoder
+from .table import Journal
 
 
 class Service:
-    def __init__(self, databases: List[Database]):
-        self._databases = databases
+    SUFFIX = '.db'
+
+    def __init__(self, databases: List[Database], directory: Union[Path, None] = None,
+                 memory_budget: Union[int, None] = None):
+        # keyed by name; dicts keep insertion order for listing.
+        # With a directory, None stands for a database that is only on disk
+        self._databases: Dict[str, Union[Database, None]] = {}
+        for database in databases:
+            assert database.name not in self._databases, "Database already exists"
+            self._databases[database.name] = database
+        self._journal: Union[Journal, None] = None
+        # guards changes to the catalog; lookups are single dict reads, the tables lock themselves
+        self._lock = threading.RLock()
+
+        assert memory_budget is None or directory is not None, 'Evicting databases requires a directory'
+        self._directory = directory
+        self._memory_budget = memory_budget
+        # loaded databases from least to most recently used, with their approximate size
+        self._recent: 'OrderedDict[str, int]' = OrderedDict((name, 0) for name in self._databases)
+        self._memory = 0
+        # versions of the databases as they are on disk
+        self._saved: Dict[str, Tuple[int, ...]] = {}
+        # evicted databases that somebody still holds on to are taken back instead of reloaded.
+        # One that is written to through such a reference is pinned until it is saved again,
+        # so the change cannot be lost when the last reference goes away
+        self._evicted: 'weakref.WeakValueDictionary[str, Database]' = weakref.WeakValueDictionary()
+        self._pinned: Dict[str, Database] = {}
+        # files are written outside the catalog lock, one writer per database at a time
+        self._save_locks: Dict[str, threading.Lock] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+            for path in sorted(directory.glob(f'*{Service.SUFFIX}')):
+                self._databases.setdefault(unquote(path.name[:-len(Service.SUFFIX)]), None)
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'databases': len(self._databases),
+                'loaded': len(self._recent),
+                'memory': self._memory,
+                'memory_budget': self._memory_budget or 0,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
+
+    def contains(self, database_name: str) -> bool:
+        return database_name in self._databases
 
     def get_database(self, database_name: str) -> Union[Database, None]:
-        for database in self._databases:
-            if database.name == database_name:
-                return database
-        return None
+        if self._directory is None:
+            return self._databases.get(database_name)
+        with self._lock:
+            if database_name not in self._databases:
+                return None
+            database = self._databases[database_name]
+            if database is None:
+                self._misses += 1
+                database = self._load(database_name)
+                self._touch(database_name, database)
+                unsaved = self._evict()
+            else:
+                # a hit only moves the database up; sizes are taken when one is loaded
+                self._hits += 1
+                self._recent.move_to_end(database_name)
+                unsaved = []
+            unsaved.extend(self._take_pinned())
+        self._save_all(unsaved)
+        return database
+
+    def attach_journal(self, journal: Union[Journal, None]) -> None:
+        with self._lock:
+            self._journal = journal
+            for database in self._databases.values():
+                if database is not None:
+                    database.attach_journal(journal)
 
     def add_database(self, database: Database):
-        assert not self.get_database(database.name), "Database already exists"
-        self._databases.append(database)
+        with self._lock:
+            assert database.name not in self._databases, "Database already exists"
+            self._databases[database.name] = database
+            if self._journal is not None:
+                database.attach_journal(self._journal)
+                self._journal({'op': 'add_database', 'db': database.name, 'object': database})
+            if self._directory is not None:
+                self._touch(database.name, database)
+                unsaved = self._evict()
+            else:
+                unsaved = []
+        self._save_all(unsaved)
 
     def remove_database(self, database_name: str):
-        for i in range(len(self._databases)):
-            if self._databases[i].name == database_name:
-                del self._databases[i]
-                return
-        raise ValueError('Database does not exist')
+        with self._lock:
+            if database_name not in self._databases:
+                raise ValueError('Database does not exist')
+            database = self._databases.pop(database_name)
+            evicted = self._evicted.pop(database_name, None)
+            self._pinned.pop(database_name, None)
+            if database is not None:
+                database.attach_journal(None)
+                database.close()
+            elif evicted is not None:
+                evicted.close()
+            self._memory -= self._recent.pop(database_name, 0)
+            self._saved.pop(database_name, None)
+            if self._directory is not None:
+                self._path(database_name).unlink(missing_ok=True)
+            if self._journal is not None:
+                self._journal({'op': 'remove_database', 'db': database_name})
 
     @property
     def databases(self) -> List[str]:
-        return [d.name for d in self._databases]
+        with self._lock:
+            return list(self._databases)
+
+    @property
+    def loaded_databases(self) -> List[Database]:
+        # does not load anything, databases that are only on disk are left out
+        with self._lock:
+            return [d for d in self._databases.values() if d is not None]
+
+    def flush(self) -> None:
+        # writes every database that changed since it was read or written, evicted ones included
+        with self._lock:
+            unsaved = [(name, self._databases[name]) for name in self._recent]
+            unsaved.extend(self._take_pinned())
+            unsaved.extend(self._evicted.items())
+        self._save_all(unsaved)
+
+    def close(self) -> None:
+        if self._directory is not None:
+            self.flush()
+
+    def _path(self, database_name: str) -> Path:
+        return self._directory / f'{quote(database_name, safe="")}{Service.SUFFIX}'
+
+    def _load(self, database_name: str) -> Database:
+        database = self._evicted.pop(database_name, None)
+        self._pinned.pop(database_name, None)
+        if database is None:
+            path = self._path(database_name)
+            if SnapshotCoder.is_snapshot(path):
+                database = SnapshotCoder.import_database(path)
+            else:
+                database = Coder.import_database(path)
+            self._saved[database_name] = database.version
+        if self._journal is not None:
+            database.attach_journal(self._journal)
+        self._databases[database_name] = database
+        return database
+
+    def _touch(self, database_name: str, database: Database) -> None:
+        nbytes = database.nbytes
+        self._memory += nbytes - self._recent.pop(database_name, 0)
+        self._recent[database_name] = nbytes
+
+    def _evict(self) -> List[Tuple[str, Database]]:
+        # returns the evicted databases, which the caller saves once it has let go of the lock;
+        # until then they are held here and found in _evicted by anyone loading them again
+        if self._memory_budget is None:
+            return []
+        # writes since the last load count from here on; the stores keep their sizes up to date
+        for name, nbytes in list(self._recent.items()):
+            updated = self._databases[name].nbytes
+            self._memory += updated - nbytes
+            self._recent[name] = updated
+        evicted = []
+        # the most recently used database always stays
+        while self._memory > self._memory_budget and len(self._recent) > 1:
+            name = next(iter(self._recent))
+            database = self._databases[name]
+            # parked before it is saved, so that no write slips in between unnoticed
+            database.attach_journal(self._parked_journal(name, weakref.ref(database)))
+            self._databases[name] = None
+            self._memory -= self._recent.pop(name)
+            self._evicted[name] = database
+            self._evictions += 1
+            evicted.append((name, database))
+        return evicted
+
+    def _parked_journal(self, database_name: str, ref: 'weakref.ReferenceType[Database]') -> Journal:
+        # runs under the lock of the table being written, so it must not take the catalog lock
+        def record(entry: Dict[str, Any]) -> None:
+            database = ref()
+            if database is not None:
+                self._pinned[database_name] = database
+            if self._journal is not None:
+                self._journal(entry)
+        return record
+
+    def _take_pinned(self) -> List[Tuple[str, Database]]:
+        pinned = list(self._pinned.items())
+        self._pinned.clear()
+        return pinned
+
+    def _save_all(self, databases: List[Tuple[str, Database]]) -> None:
+        for name, database in databases:
+            self._save(name, database)
+
+    def _save(self, database_name: str, database: Database) -> None:
+        # called without the catalog lock, which is only taken for the bookkeeping
+        with self._lock:
+            save_lock = self._save_locks.setdefault(database_name, threading.Lock())
+        with save_lock:
+            version = database.version
+            with self._lock:
+                if self._saved.get(database_name) == version:
+                    return
+            path = self._path(database_name)
+            p_tmp = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+            try:
+                try:
+                    SnapshotCoder.export_database(database, p_tmp)
+                except ValueError:
+                    # e.g. integers that do not fit into 64 bits
+                    Coder.export_database(database, p_tmp)
+            except BaseException:
+                p_tmp.unlink(missing_ok=True)
+                raise
+            with self._lock:
+                current = self._databases.get(database_name) or self._evicted.get(database_name)
+                if current is not database:
+                    # removed, and perhaps replaced, while it was written
+                    p_tmp.unlink(missing_ok=True)
+                    return
+                os.replace(p_tmp, path)
+                self._saved[database_name] = version
@@ -0,0 +1,4 @@
+from .store import Store, StorageNames
+from .row_store import RowStore
+from .column_store import ColumnStore
+from .mapped_store import MappedStore, MappedFile, MappedArray, MappedInterval, MappedStrings
@@ -0,0 +1,309 @@
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from typing import Any, Dict, Hashable, Iterator, List, Tuple, Type, Union
+
+from core.row import Row
+from core.schema import TableSchema, TypeNames
+from core import datatypes
+
+from .store import Store
+
+
+class Column(ABC):
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        ...
+
+    @abstractmethod
+    def get(self, index: int) -> datatypes.DataType:
+        ...
+
+    def accepts(self, value: datatypes.DataType) -> bool:
+        return True
+
+    @abstractmethod
+    def natives(self) -> Iterator[Any]:
+        ...
+
+    @abstractmethod
+    def key(self, index: int) -> Hashable:
+        ...
+
+    @abstractmethod
+    def append(self, value: datatypes.DataType) -> None:
+        ...
+
+    @abstractmethod
+    def set(self, index: int, value: datatypes.DataType) -> None:
+        ...
+
+    @abstractmethod
+    def swap_remove(self, index: int) -> None:
+        ...
+
+    @abstractmethod
+    def retain(self, indices: List[int]) -> None:
+        ...
+
+
+class ArrayColumn(Column):
+    def __init__(self, typecode: str, data_type: Type[datatypes.DataType]):
+        self._buffer = array(typecode)
+        self._data_type = data_type
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def buffer(self) -> array:
+        return self._buffer
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self._buffer)
+
+    def get(self, index: int) -> datatypes.DataType:
+        return self._data_type.from_native(self._buffer[index])
+
+    def natives(self) -> Iterator[Any]:
+        return iter(self._buffer)
+
+    def accepts(self, value: datatypes.DataType) -> bool:
+        if self._buffer.typecode == 'q':
+            return -2 ** 63 <= value.native < 2 ** 63
+        return True
+
+    def key(self, index: int) -> Hashable:
+        return self._buffer[index]
+
+    def append(self, value: datatypes.DataType) -> None:
+        self._buffer.append(value.native)
+
+    def set(self, index: int, value: datatypes.DataType) -> None:
+        self._buffer[index] = value.native
+
+    def swap_remove(self, index: int) -> None:
+        last = self._buffer.pop()
+        if index < len(self._buffer):
+            self._buffer[index] = last
+
+    def retain(self, indices: List[int]) -> None:
+        buffer = self._buffer
+        self._buffer = array(buffer.typecode, [buffer[i] for i in indices])
+
+
+class IntervalColumn(Column):
+    def __init__(self):
+        self._lower = ArrayColumn('q', datatypes.Money)
+        self._upper = ArrayColumn('q', datatypes.Money)
+
+    def __len__(self) -> int:
+        return len(self._lower)
+
+    @property
+    def lower(self) -> array:
+        return self._lower.buffer
+
+    @property
+    def upper(self) -> array:
+        return self._upper.buffer
+
+    @property
+    def nbytes(self) -> int:
+        return self._lower.nbytes + self._upper.nbytes
+
+    def get(self, index: int) -> datatypes.DataType:
+        return datatypes.MoneyInterval(self._lower.get(index), self._upper.get(index))
+
+    def natives(self) -> Iterator[Any]:
+        return zip(self._lower.buffer, self._upper.buffer)
+
+    def key(self, index: int) -> Hashable:
+        return self._lower.key(index), self._upper.key(index)
+
+    def append(self, value: datatypes.MoneyInterval) -> None:
+        self._lower.append(value.lower)
+        self._upper.append(value.upper)
+
+    def set(self, index: int, value: datatypes.MoneyInterval) -> None:
+        self._lower.set(index, value.lower)
+        self._upper.set(index, value.upper)
+
+    def swap_remove(self, index: int) -> None:
+        self._lower.swap_remove(index)
+        self._upper.swap_remove(index)
+
+    def retain(self, indices: List[int]) -> None:
+        self._lower.retain(indices)
+        self._upper.retain(indices)
+
+
+class DictionaryColumn(Column):
+    # every entry counts the rows that use it; an entry no row uses any more is dropped
+    # and its code is given to the next new value, so turnover does not grow the dictionary
+    def __init__(self, data_type: Type[datatypes.DataType]):
+        self._codes = array('I')
+        self._dictionary: List[Union[str, None]] = []
+        self._counts = array('Q')
+        self._free: List[int] = []
+        self._lookup: Dict[str, int] = {}
+        self._text_bytes = 0
+        self._data_type = data_type
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @property
+    def nbytes(self) -> int:
+        return (sys.getsizeof(self._codes) + sys.getsizeof(self._dictionary) + sys.getsizeof(self._lookup)
+                + sys.getsizeof(self._counts) + sys.getsizeof(self._free) + self._text_bytes)
+
+    @property
+    def entries(self) -> int:
+        return len(self._lookup)
+
+    def get(self, index: int) -> datatypes.DataType:
+        return self._data_type.from_native(self._dictionary[self._codes[index]])
+
+    def natives(self) -> Iterator[Any]:
+        dictionary = self._dictionary
+        return (dictionary[c] for c in self._codes)
+
+    def key(self, index: int) -> Hashable:
+        return self._codes[index]
+
+    def append(self, value: datatypes.DataType) -> None:
+        self._codes.append(self._encode(value.native))
+
+    def set(self, index: int, value: datatypes.DataType) -> None:
+        code = self._encode(value.native)
+        self._release(self._codes[index])
+        self._codes[index] = code
+
+    def swap_remove(self, index: int) -> None:
+        self._release(self._codes[index])
+        last = self._codes.pop()
+        if index < len(self._codes):
+            self._codes[index] = last
+
+    def retain(self, indices: List[int]) -> None:
+        codes = self._codes
+        self._codes = array('I', [codes[i] for i in indices])
+        counts = array('Q', bytes(8 * len(self._counts)))
+        for code in self._codes:
+            counts[code] += 1
+        self._counts = counts
+        for code, count in enumerate(counts):
+            if not count and self._dictionary[code] is not None:
+                self._drop(code)
+
+    def _encode(self, s: str) -> int:
+        code = self._lookup.get(s)
+        if code is None:
+            if self._free:
+                code = self._free.pop()
+                self._dictionary[code] = s
+            else:
+                code = len(self._dictionary)
+                self._dictionary.append(s)
+                self._counts.append(0)
+            self._lookup[s] = code
+            self._text_bytes += sys.getsizeof(s)
+        self._counts[code] += 1
+        return code
+
+    def _release(self, code: int) -> None:
+        self._counts[code] -= 1
+        if not self._counts[code]:
+            self._drop(code)
+
+    def _drop(self, code: int) -> None:
+        s = self._dictionary[code]
+        del self._lookup[s]
+        self._text_bytes -= sys.getsizeof(s)
+        self._dictionary[code] = None
+        self._free.append(code)
+
+
+def make_column(type_name: TypeNames) -> Column:
+    if type_name is TypeNames.INT:
+        return ArrayColumn('q', datatypes.Integer)
+    if type_name is TypeNames.REAL:
+        return ArrayColumn('d', datatypes.Real)
+    if type_name is TypeNames.MONEY:
+        return ArrayColumn('q', datatypes.Money)
+    if type_name is TypeNames.MONEY_INTERVAL:
+        return IntervalColumn()
+    if type_name is TypeNames.CHAR:
+        return DictionaryColumn(datatypes.Char)
+    return DictionaryColumn(datatypes.String)
+
+
+class ColumnStore(Store):
+    def __init__(self, sch: TableSchema, rows: List[Row]):
+        self._id_column = make_column(sch.id_type_name)
+        self._columns = [make_column(tn) for tn in sch.type_names]
+        for row in rows:
+            self.append(row)
+
+    def __len__(self) -> int:
+        return len(self._id_column)
+
+    @property
+    def rows(self) -> List[Row]:
+        return [self.row(i) for i in range(len(self))]
+
+    @property
+    def columns(self) -> List[Column]:
+        return self._columns
+
+    @property
+    def nbytes(self) -> int:
+        return self._id_column.nbytes + sum(c.nbytes for c in self._columns)
+
+    def row(self, index: int) -> Row:
+        return Row(self._id_column.get(index), [c.get(index) for c in self._columns])
+
+    def identifier(self, index: int) -> datatypes.DataType:
+        return self._id_column.get(index)
+
+    def values_key(self, index: int) -> Tuple[Hashable, ...]:
+        return tuple(c.key(index) for c in self._columns)
+
+    def natives(self, position: int) -> Iterator[Any]:
+        return (self._columns[position - 1] if position else self._id_column).natives()
+
+    def append(self, row: Row) -> None:
+        self.check(row)
+        self._id_column.append(row.identifier)
+        for c, v in zip(self._columns, row.values):
+            c.append(v)
+
+    def set(self, index: int, row: Row) -> None:
+        self.check(row)
+        self._id_column.set(index, row.identifier)
+        for c, v in zip(self._columns, row.values):
+            c.set(index, v)
+
+    def swap_remove(self, index: int) -> None:
+        self._id_column.swap_remove(index)
+        for c in self._columns:
+            c.swap_remove(index)
+
+    def retain(self, indices: List[int]) -> None:
+        self._id_column.retain(indices)
+        for c in self._columns:
+            c.retain(indices)
+
+    def check(self, row: Row) -> None:
+        if not self._id_column.accepts(row.identifier):
+            raise ValueError(f'Identifier {row.identifier} does not fit into column storage')
+        for c, v in zip(self._columns, row.values):
+            if not c.accepts(v):
+                raise ValueError(f'Value {v} does not fit into column storage')
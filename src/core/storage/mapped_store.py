@@ -0,0 +1,222 @@
+import mmap
+import weakref
+from pathlib import Path
+from typing import Any, Hashable, Iterator, List, Tuple, Type, Union
+
+from core.row import Row
+from core.schema import TableSchema
+from core import datatypes
+
+from .store import Store, StorageNames
+from .row_store import RowStore
+from .column_store import ColumnStore
+
+
+class MappedFile:
+    def __init__(self, path: Path, owned: bool = False):
+        # an owned file, e.g. an uploaded snapshot, is deleted together with its mapping.
+        # The mapping is closed explicitly, or once no store refers to it any more
+        with path.open('rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._path = path
+        self._view = memoryview(mapped)
+        self._segments: List[memoryview] = []
+        self._finalizer = weakref.finalize(self, MappedFile._release, mapped, self._view, self._segments,
+                                           path if owned else None)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def view(self) -> memoryview:
+        return self._view
+
+    @property
+    def closed(self) -> bool:
+        return not self._finalizer.alive
+
+    def segment(self, start: int, size: int, typecode: str) -> memoryview:
+        segment = self._view[start:start + size].cast(typecode)
+        self._segments.append(segment)
+        return segment
+
+    def close(self) -> None:
+        self._finalizer()
+
+    @staticmethod
+    def _release(mapped: mmap.mmap, view: memoryview, segments: List[memoryview], owned: Union[Path, None]) -> None:
+        try:
+            for segment in segments:
+                segment.release()
+            view.release()
+            mapped.close()
+        except BufferError:
+            # somebody still holds a buffer of the mapping, it is unmapped when they let go
+            pass
+        if owned is not None:
+            owned.unlink(missing_ok=True)
+
+
+class MappedArray:
+    def __init__(self, view: memoryview, data_type: Type[datatypes.DataType]):
+        self._view = view
+        self._data_type = data_type
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    @property
+    def nbytes(self) -> int:
+        return self._view.nbytes
+
+    def native(self, index: int) -> Any:
+        return self._view[index]
+
+    def natives(self) -> Iterator[Any]:
+        return iter(self._view)
+
+    def get(self, index: int) -> datatypes.DataType:
+        return self._data_type.from_native(self._view[index])
+
+
+class MappedInterval:
+    def __init__(self, lower: memoryview, upper: memoryview):
+        self._lower = lower
+        self._upper = upper
+
+    def __len__(self) -> int:
+        return len(self._lower)
+
+    @property
+    def nbytes(self) -> int:
+        return self._lower.nbytes + self._upper.nbytes
+
+    def native(self, index: int) -> Any:
+        return self._lower[index], self._upper[index]
+
+    def natives(self) -> Iterator[Any]:
+        return zip(self._lower, self._upper)
+
+    def get(self, index: int) -> datatypes.DataType:
+        return datatypes.MoneyInterval.from_native(self.native(index))
+
+
+class MappedStrings:
+    def __init__(self, offsets: memoryview, blob: memoryview, data_type: Type[datatypes.DataType]):
+        self._offsets = offsets
+        self._blob = blob
+        self._data_type = data_type
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self._offsets.nbytes + self._blob.nbytes
+
+    def native(self, index: int) -> Any:
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    def natives(self) -> Iterator[Any]:
+        for i in range(len(self)):
+            yield self.native(i)
+
+    def get(self, index: int) -> datatypes.DataType:
+        return self._data_type.from_native(self.native(index))
+
+
+MappedColumn = Union[MappedArray, MappedInterval, MappedStrings]
+
+
+class MappedStore(Store):
+    def __init__(self, sch: TableSchema, storage_name: StorageNames, columns: List[MappedColumn],
+                 backing: Union[MappedFile, None] = None):
+        # columns[0] holds the identifiers; the store is read-only until the first write,
+        # which copies it into the regular store of the table and lets go of the backing file
+        assert len(columns) == len(sch.type_names) + 1
+        self._schema = sch
+        self._storage_name = storage_name
+        self._columns = columns
+        self._backing = backing
+        self._thawed: Union[Store, None] = None
+
+    @property
+    def backing(self) -> Union[MappedFile, None]:
+        return self._backing
+
+    def __len__(self) -> int:
+        if self._thawed is not None:
+            return len(self._thawed)
+        return len(self._columns[0])
+
+    @property
+    def rows(self) -> List[Row]:
+        if self._thawed is not None:
+            return self._thawed.rows
+        return list(self.iter_rows())
+
+    @property
+    def nbytes(self) -> int:
+        if self._thawed is not None:
+            return self._thawed.nbytes
+        return sum(c.nbytes for c in self._columns)
+
+    def row(self, index: int) -> Row:
+        if self._thawed is not None:
+            return self._thawed.row(index)
+        return Row(self._columns[0].get(index), [c.get(index) for c in self._columns[1:]])
+
+    def iter_rows(self) -> Iterator[Row]:
+        if self._thawed is not None:
+            return self._thawed.iter_rows()
+        return super().iter_rows()
+
+    def natives(self, position: int) -> Iterator[Any]:
+        if self._thawed is not None:
+            return self._thawed.natives(position)
+        return self._columns[position].natives()
+
+    def identifier(self, index: int) -> datatypes.DataType:
+        if self._thawed is not None:
+            return self._thawed.identifier(index)
+        return self._columns[0].get(index)
+
+    def values_key(self, index: int) -> Tuple[Hashable, ...]:
+        if self._thawed is not None:
+            return self._thawed.values_key(index)
+        return tuple(c.native(index) for c in self._columns[1:])
+
+    def check(self, row: Row) -> None:
+        if self._thawed is not None:
+            self._thawed.check(row)
+        elif self._storage_name is StorageNames.COLUMNS:
+            # the checks of the store it would be thawed into
+            ColumnStore(self._schema, []).check(row)
+
+    def append(self, row: Row) -> None:
+        self._thaw().append(row)
+
+    def set(self, index: int, row: Row) -> None:
+        self._thaw().set(index, row)
+
+    def swap_remove(self, index: int) -> None:
+        self._thaw().swap_remove(index)
+
+    def retain(self, indices: List[int]) -> None:
+        self._thaw().retain(indices)
+
+    def close(self) -> None:
+        if self._backing is not None:
+            self._backing.close()
+
+    def _thaw(self) -> Store:
+        if self._thawed is None:
+            rows = list(self.iter_rows())
+            if self._storage_name is StorageNames.COLUMNS:
+                self._thawed = ColumnStore(self._schema, rows)
+            else:
+                self._thawed = RowStore(rows)
+            self._columns = []
+            self._backing = None
+        return self._thawed
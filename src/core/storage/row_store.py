@@ -0,0 +1,62 @@
+import sys
+from typing import Hashable, Iterator, List, Tuple
+
+from core.row import Row
+from core import datatypes
+
+from .store import Store
+
+
+class RowStore(Store):
+    def __init__(self, rows: List[Row]):
+        self._rows = rows
+        # kept up to date by every change, so the size is known without a walk over the rows
+        self._row_bytes = sum(RowStore._row_nbytes(row) for row in rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def rows(self) -> List[Row]:
+        return self._rows
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self._rows) + self._row_bytes
+
+    @staticmethod
+    def _row_nbytes(row: Row) -> int:
+        total = sys.getsizeof(row) + sys.getsizeof(row.values)
+        for v in (row.identifier, *row.values):
+            total += sys.getsizeof(v) + sys.getsizeof(v.native)
+        return total
+
+    def row(self, index: int) -> Row:
+        return self._rows[index]
+
+    def iter_rows(self) -> Iterator[Row]:
+        return iter(self._rows)
+
+    def identifier(self, index: int) -> datatypes.DataType:
+        return self._rows[index].identifier
+
+    def values_key(self, index: int) -> Tuple[Hashable, ...]:
+        return tuple(v.value for v in self._rows[index].values)
+
+    def append(self, row: Row) -> None:
+        self._rows.append(row)
+        self._row_bytes += RowStore._row_nbytes(row)
+
+    def set(self, index: int, row: Row) -> None:
+        self._row_bytes += RowStore._row_nbytes(row) - RowStore._row_nbytes(self._rows[index])
+        self._rows[index] = row
+
+    def swap_remove(self, index: int) -> None:
+        self._row_bytes -= RowStore._row_nbytes(self._rows[index])
+        last = self._rows.pop()
+        if index < len(self._rows):
+            self._rows[index] = last
+
+    def retain(self, indices: List[int]) -> None:
+        self._rows[:] = [self._rows[i] for i in indices]
+        self._row_bytes = sum(RowStore._row_nbytes(row) for row in self._rows)
@@ -0,0 +1,72 @@
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Any, Hashable, Iterator, List, Tuple
+
+from core.row import Row
+from core import datatypes
+
+
+class StorageNames(Enum):
+    ROWS = 'rows'
+    COLUMNS = 'columns'
+
+
+class Store(ABC):
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def rows(self) -> List[Row]:
+        ...
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        ...
+
+    @abstractmethod
+    def row(self, index: int) -> Row:
+        ...
+
+    def iter_rows(self) -> Iterator[Row]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def natives(self, position: int) -> Iterator[Any]:
+        # position 0 is the identifier, position i > 0 is the (i - 1)-th value column
+        for row in self.iter_rows():
+            yield (row.identifier if position == 0 else row.values[position - 1]).native
+
+    @abstractmethod
+    def identifier(self, index: int) -> datatypes.DataType:
+        ...
+
+    @abstractmethod
+    def values_key(self, index: int) -> Tuple[Hashable, ...]:
+        ...
+
+    def check(self, row: Row) -> None:
+        # raises ValueError for a row the store cannot hold, before anything is changed
+        pass
+
+    @abstractmethod
+    def append(self, row: Row) -> None:
+        ...
+
+    @abstractmethod
+    def set(self, index: int, row: Row) -> None:
+        ...
+
+    @abstractmethod
+    def swap_remove(self, index: int) -> None:
+        ...
+
+    @abstractmethod
+    def retain(self, indices: List[int]) -> None:
+        ...
+
+    def close(self) -> None:
+        # releases what the store keeps outside of memory, e.g. a mapped file
+        pass
@@ -1,16 +1,47 @@
-from typing import List, Union
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
 
+import sys
+
+import numpy as np
 import pandas as pd
 
+from .dedup import Deduplicator, KeepNames
+from .frame import TableFrame
+from .locking import ReadWriteLock
 from .row import Row
-from . import schema, datatypes
+from . import schema, datatypes, metrics, storage
+from .indexes import ColumnIndex, HashColumnIndex, IntervalColumnIndex, SortedColumnIndex, SortedIndex
+from .schema import IndexNames
+
+
+Journal = Callable[[Dict[str, Any]], None]
 
 
 class Table:
-    def __init__(self, name: str, sch: schema.TableSchema, rows: List[Row]):
+    def __init__(self, name: str, sch: schema.TableSchema, rows: List[Row],
+                 storage_name: storage.StorageNames = storage.StorageNames.ROWS,
+                 store: Union[storage.Store, None] = None):
         self._name = name
         self._schema = sch
-        self._rows = rows
+        self._storage_name = storage_name
+        if store is not None:
+            assert len(rows) == 0, 'Rows cannot be passed together with a store'
+            self._store = store
+        elif storage_name is storage.StorageNames.COLUMNS:
+            self._store = storage.ColumnStore(sch, rows)
+        else:
+            self._store = storage.RowStore(rows)
+        self._index: Dict[Any, int] = {}
+        self._column_indexes: Dict[str, ColumnIndex] = {}
+        self._reindex()
+        assert len(self._index) == len(self._store), 'Row identifiers must be unique'
+        self._journal: Union[Journal, None] = None
+        self._lock = ReadWriteLock()
+        # bumped by every change; lets callers cache things derived from the table
+        self._version = 0
+        self._nbytes = (-1, 0)
+        # built on the first to_df call and kept in step with the store afterwards
+        self._frame: Union[TableFrame, None] = None
 
     @property
     def name(self) -> str:
@@ -18,73 +49,317 @@ class Table:
 
     @property
     def rows(self) -> List[Row]:
-        return self._rows
+        return self._store.rows
 
     @property
     def schema(self) -> schema.TableSchema:
         return self._schema
 
+    @property
+    def storage_name(self) -> storage.StorageNames:
+        return self._storage_name
+
+    @property
+    def store(self) -> storage.Store:
+        return self._store
+
+    @property
+    def lock(self) -> ReadWriteLock:
+        # single-row reads and all writes lock on their own; callers consuming
+        # one of the row iterators hold the read lock for the whole iteration
+        return self._lock
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def nbytes(self) -> int:
+        # approximate memory of the rows and all indexes
+        with self._lock.read():
+            if self._nbytes[0] != self._version:
+                self._nbytes = (self._version, self._store.nbytes + sum(self.index_nbytes.values()))
+            return self._nbytes[1]
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    @property
+    def indexes(self) -> Dict[str, IndexNames]:
+        return self._schema.indexes
+
+    @property
+    def index_nbytes(self) -> Dict[str, int]:
+        with self._lock.read():
+            return {
+                'id': sys.getsizeof(self._index) + self._sorted_ids.nbytes,
+                **{column: index.nbytes for column, index in self._column_indexes.items()},
+            }
+
+    def attach_journal(self, journal: Union[Journal, None]) -> None:
+        self._journal = journal
+
+    def iter_rows(self) -> Iterator[Row]:
+        return self._store.iter_rows()
+
     def to_df(self) -> pd.DataFrame:
-        data = [(r.identifier, *(v.value for v in r.values)) for r in self._rows]
-        df = pd.DataFrame(
-            data=data,
-            columns=['id', *self.schema.column_names],
-        )
-        return df
+        # the frame is cached until the next change; callers must not modify it
+        with self._lock.read():
+            return self._get_frame().to_df()
+
+    def column_arrays(self, columns: List[str]) -> Dict[str, List[np.ndarray]]:
+        # copies of the columns taken together, see FrameColumn.natives
+        names = ['id', *self._schema.column_names]
+        with self._lock.read():
+            frame = self._get_frame()
+            return {c: frame.natives(names.index(c)) for c in columns}
+
+    def _get_frame(self) -> TableFrame:
+        frame = self._frame
+        if frame is None:
+            frame = TableFrame(self._schema, self._store)
+            self._frame = frame
+        return frame
 
     def validate(self) -> bool:
         # validate rows
-        for row in self._rows:
-            if not self.validate_row(row):
-                return False
-        # validate uniqueness of identifiers
-        identifiers = [row.identifier.value for row in self._rows]
-        if len(identifiers) != len(set(identifiers)):
-            return False
-        return True
+        with self._lock.read():
+            for row in self.rows:
+                if not self.validate_row(row):
+                    return False
+            # validate uniqueness of identifiers
+            return len(self._index) == len(self._store)
 
     def validate_row(self, row: Row) -> bool:
-        # validate values
-        if not row.validate():
-            return False
-        # validate schema
-        if not type(row.identifier) is self._schema.id_type:
-            return False
-        for v, d_type in zip(row.values, self._schema.types):
-            if not type(v) is d_type:
-                return False
-        return True
+        return self._schema.codec.validate(row)
+
+    def contains(self, identifier: datatypes.DataType) -> bool:
+        with self._lock.read():
+            return identifier.native in self._index
+
+    def get(self, identifier: datatypes.DataType) -> Union[Row, None]:
+        assert type(identifier) is self._schema.id_type, (type(identifier), self._schema.id_type)
+        with self._lock.read():
+            index = self._index.get(identifier.native)
+            if index is None:
+                return None
+            return self._store.row(index)
+
+    def page(self, limit: int, after: Union[datatypes.DataType, None] = None) -> List[Row]:
+        # keyset pagination in identifier order
+        if after is not None:
+            assert type(after) is self._schema.id_type, (type(after), self._schema.id_type)
+        with self._lock.read():
+            keys = self._sorted_ids.after(after.native if after is not None else None, limit)
+            return [self._store.row(self._index[k]) for k in keys]
+
+    def iter_range(self, lower: Union[datatypes.DataType, None] = None,
+                   upper: Union[datatypes.DataType, None] = None) -> Iterator[Row]:
+        # rows with lower <= identifier <= upper in identifier order
+        upper_key = upper.native if upper is not None else None
+        for key in self._sorted_ids.iter_from(lower.native if lower is not None else None):
+            if upper_key is not None and key > upper_key:
+                return
+            yield self._store.row(self._index[key])
+
+    def lookup(self, column: str, value: datatypes.DataType) -> Iterator[Row]:
+        assert column in self._column_indexes, f'Column {column} is not indexed'
+        for identifier in list(self._column_indexes[column].lookup(value.native)):
+            yield self._store.row(self._index[identifier])
+
+    def scan_index(self, column: str, lower: Union[datatypes.DataType, None] = None,
+                   upper: Union[datatypes.DataType, None] = None) -> Iterator[Row]:
+        # rows with lower <= value <= upper in the order of the column
+        index = self._column_indexes.get(column)
+        assert isinstance(index, SortedColumnIndex), f'Column {column} has no sorted index'
+        identifiers = index.range(lower.native if lower is not None else None,
+                                  upper.native if upper is not None else None)
+        for identifier in identifiers:
+            yield self._store.row(self._index[identifier])
+
+    def scan_keyset(self, column: str, after: Union[Tuple[Any, ...], None] = None,
+                    descending: bool = False) -> Iterator[Row]:
+        # rows in the order of the identifier or of a sorted index, equal values by identifier,
+        # strictly after a key taken from a row: (identifier,) or (value, identifier) in natives
+        if column == 'id':
+            key = after[0] if after is not None else None
+            if descending:
+                identifiers = self._sorted_ids.iter_before(key, inclusive=False)
+            else:
+                identifiers = self._sorted_ids.iter_from(key, inclusive=False)
+        else:
+            index = self._column_indexes.get(column)
+            assert isinstance(index, SortedColumnIndex), f'Column {column} has no sorted index'
+            identifiers = index.scan(after, descending)
+        for identifier in identifiers:
+            yield self._store.row(self._index[identifier])
+
+    def scan_prefix(self, column: str, prefix: str) -> Iterator[Row]:
+        index = self._column_indexes.get(column)
+        assert isinstance(index, SortedColumnIndex), f'Column {column} has no sorted index'
+        for identifier in index.prefix(prefix):
+            yield self._store.row(self._index[identifier])
+
+    def scan_containing(self, column: str, point: datatypes.Money) -> Iterator[Row]:
+        # rows whose interval contains the point
+        return self.scan_overlapping(column, point, point)
+
+    def scan_overlapping(self, column: str, lower: datatypes.Money, upper: datatypes.Money) -> Iterator[Row]:
+        # rows whose interval shares at least one point with [lower, upper]
+        index = self._column_indexes.get(column)
+        assert isinstance(index, IntervalColumnIndex), f'Column {column} has no interval index'
+        for identifier in list(index.overlaps(lower.native, upper.native)):
+            yield self._store.row(self._index[identifier])
+
+    def create_index(self, column: str, index_name: IndexNames) -> None:
+        with self._lock.write():
+            self._schema.add_index(column, index_name)
+            self._column_indexes[column] = self._build_index(column, index_name)
+            self._version += 1
+            if self._journal is not None:
+                self._journal({'op': 'create_index', 'table': self._name, 'column': column, 'kind': index_name.value})
+
+    def drop_index(self, column: str) -> None:
+        with self._lock.write():
+            self._schema.remove_index(column)
+            del self._column_indexes[column]
+            self._version += 1
+            if self._journal is not None:
+                self._journal({'op': 'drop_index', 'table': self._name, 'column': column})
 
     def insert(self, row: Row) -> None:
-        assert row.identifier.value not in {r.identifier.value for r in self._rows}
-        assert self.validate_row(row)
-        self._rows.append(row)
+        with metrics.timed('insert'), self._lock.write():
+            assert row.identifier.native not in self._index
+            assert self.validate_row(row)
+            self._store.append(row)
+            self._index[row.identifier.native] = len(self._store) - 1
+            self._sorted_ids.add(row.identifier.native)
+            self._add_to_indexes(row)
+            if self._frame is not None:
+                self._frame.append(row)
+            self._version += 1
+            if self._journal is not None:
+                self._journal({'op': 'insert', 'table': self._name, 'rows': [self._schema.codec.encode(row)]})
+
+    def insert_many(self, rows: List[Row]) -> List[Tuple[int, str]]:
+        with metrics.timed('insert_many'), self._lock.write():
+            rejected = []
+            for i, row in enumerate(rows):
+                if row.identifier.native in self._index:
+                    rejected.append((i, f'Row {row.identifier} already exists'))
+                elif not self.validate_row(row):
+                    rejected.append((i, f'Row {row.identifier} does not match the table schema'))
+                elif not self._accepts(row):
+                    rejected.append((i, f'Row {row.identifier} does not fit into the {self._storage_name.value} store'))
+                else:
+                    self._store.append(row)
+                    self._index[row.identifier.native] = len(self._store) - 1
+                    self._sorted_ids.add(row.identifier.native)
+                    self._add_to_indexes(row)
+                    if self._frame is not None:
+                        self._frame.append(row)
+            if len(rejected) < len(rows):
+                self._version += 1
+            if self._journal is not None and len(rejected) < len(rows):
+                skip = {i for i, _ in rejected}
+                encode = self._schema.codec.encode
+                self._journal({
+                    'op': 'insert',
+                    'table': self._name,
+                    'rows': [encode(row) for i, row in enumerate(rows) if i not in skip],
+                })
+            return rejected
 
     def update(self, row: Row) -> None:
-        assert self.validate_row(row)
-        for i in range(len(self._rows)):
-            if self._rows[i].identifier.value == row.identifier.value:
-                self._rows[i] = row
-                return
-        raise ValueError(f"Cannot update row {row.identifier} — not found")
+        with metrics.timed('update'), self._lock.write():
+            assert self.validate_row(row)
+            index = self._index.get(row.identifier.native)
+            if index is None:
+                raise ValueError(f"Cannot update row {row.identifier} — not found")
+            old = self._store.row(index) if self._column_indexes else None
+            # set first: it raises for a row the store cannot hold, before the indexes change
+            self._store.set(index, row)
+            if old is not None:
+                self._remove_from_indexes(old)
+            self._add_to_indexes(row)
+            if self._frame is not None:
+                self._frame.set(index, row)
+            self._version += 1
+            if self._journal is not None:
+                self._journal({'op': 'update', 'table': self._name, 'row': self._schema.codec.encode(row)})
 
     def delete(self, identifier: datatypes.DataType) -> None:
-        assert type(identifier) is self._schema.id_type, (type(identifier), self._schema.id_type)
-        index = None
-        for i, row in enumerate(self._rows):
-            if row.identifier.value == identifier.value:
-                index = i
-                break
-        assert index is not None, f"Cannot delete row {identifier} — not found"
-        del self._rows[index]
-
-    def drop_duplicates(self) -> None:
-        unique_rows = set()
-        idx = 0
-        while idx < len(self._rows):
-            row_repr = tuple(v.value for v in self._rows[idx].values)
-            if row_repr not in unique_rows:
-                unique_rows.add(row_repr)
-                idx += 1
-            else:
-                del self._rows[idx]
+        with metrics.timed('delete'), self._lock.write():
+            assert type(identifier) is self._schema.id_type, (type(identifier), self._schema.id_type)
+            index = self._index.pop(identifier.native, None)
+            if index is None:
+                raise ValueError(f"Cannot delete row {identifier} — not found")
+            self._sorted_ids.remove(identifier.native)
+            if self._column_indexes:
+                self._remove_from_indexes(self._store.row(index))
+            # the last row is moved into the freed slot so that removal stays O(1)
+            self._store.swap_remove(index)
+            if index < len(self._store):
+                self._index[self._store.identifier(index).native] = index
+            if self._frame is not None:
+                self._frame.swap_remove(index)
+            self._version += 1
+            if self._journal is not None:
+                self._journal({'op': 'delete', 'table': self._name, 'id': identifier.value})
+
+    def drop_duplicates(self, subset: Union[List[str], None] = None, keep: KeepNames = KeepNames.FIRST,
+                        memory_limit: Union[int, None] = None) -> int:
+        # rows are compared on the subset columns (all value columns by default);
+        # returns the number of removed rows
+        with metrics.timed('dedup'), self._lock.write():
+            columns = ['id', *self._schema.column_names]
+            for column in subset or []:
+                assert column in columns, f'Unknown column {column}'
+            positions = [columns.index(c) for c in subset] if subset else list(range(1, len(columns)))
+            if not positions or not len(self._store):
+                return 0
+            keep_positions = Deduplicator(self._store, positions, keep, memory_limit).retained()
+            removed = len(self._store) - len(keep_positions)
+            if removed:
+                self._store.retain(keep_positions)
+                self._reindex()
+                self._frame = None
+                self._version += 1
+                if self._journal is not None:
+                    self._journal({'op': 'drop_duplicates', 'table': self._name, 'subset': subset, 'keep': keep.value})
+            return removed
+
+    def _accepts(self, row: Row) -> bool:
+        # checked before a batch is changed, so that the store cannot fail halfway through it
+        try:
+            self._store.check(row)
+        except ValueError:
+            return False
+        return True
+
+    def _reindex(self) -> None:
+        self._index = {key: i for i, key in enumerate(self._store.natives(0))}
+        self._sorted_ids = SortedIndex(self._index)
+        self._column_indexes = {
+            column: self._build_index(column, index_name) for column, index_name in self._schema.indexes.items()
+        }
+
+    def _build_index(self, column: str, index_name: IndexNames) -> ColumnIndex:
+        position = self._schema.column_names.index(column) + 1
+        entries = zip(self._store.natives(position), self._store.natives(0))
+        if index_name is IndexNames.INTERVAL:
+            index = IntervalColumnIndex()
+            index.build(entries)
+            return index
+        index = HashColumnIndex() if index_name is IndexNames.HASH else SortedColumnIndex()
+        for value, identifier in entries:
+            index.add(value, identifier)
+        return index
+
+    def _add_to_indexes(self, row: Row) -> None:
+        for column, index in self._column_indexes.items():
+            index.add(row.values[self._schema.column_names.index(column)].native, row.identifier.native)
+
+    def _remove_from_indexes(self, row: Row) -> None:
+        for column, index in self._column_indexes.items():
+            index.remove(row.values[self._schema.column_names.index(column)].native, row.identifier.native)
@@ -1,22 +1,39 @@
 from pathlib import Path
+from typing import List, Tuple
 
 import gradio as gr
 import pandas as pd
 
 from core.service import Service
 from core.database import Database
+from core.datatypes import Money, MoneyInterval
+from core.dedup import KeepNames
+from core.query import Condition, Operators, Ordering, Query
+from core.row import Row
 from core.table import Table
 from core.parsing.schema import parse_schema
 from core.parsing.row import parse_row
 from core.filesystem.coder import Coder
+from core.filesystem.snapshot import SnapshotCoder
+from core.storage import StorageNames
 
 
 class GUI:
+    PAGE_SIZES = [25, 50, 100, 250, 500]
+
     def __init__(self):
         self._service = Service([])
         self._current_database = None
         self._current_table = None
 
+        # the visible window of the current table; only its rows are fetched
+        self._page = 0
+        self._page_size = GUI.PAGE_SIZES[1]
+        self._ordering = None
+        self._where: List[Condition] = []
+        # first identifier after which each page starts, for keyset pagination in id order
+        self._cursors = [None]
+
         self._demo = self._build()
 
     def _build(self) -> gr.Blocks:
@@ -50,12 +67,33 @@ class GUI:
                         MONEY product_price
                         """
                     ))
+                    self._new_table_storage_entry = gr.Dropdown(label='Storage',
+                                                                choices=[s.value for s in StorageNames],
+                                                                value=StorageNames.ROWS.value)
                     self._create_table_button = gr.Button(value='Create Table')
                     self._delete_table_button = gr.Button(value='Delete Database')
 
             with gr.Column():
-                self._table_df = self._get_table_df()
-                self._drop_duplicates_button = gr.Button(value='Drop Duplicates')
+                with gr.Row():
+                    self._filter_entry = gr.Textbox(label='Filter',
+                                                    placeholder='price < $5; name prefix Mi; id between 10, 20')
+                    self._sort_selector = self._get_sort_selector()
+                    self._sort_descending_entry = gr.Checkbox(label='Descending')
+                    self._apply_view_button = gr.Button(value='Apply')
+                self._table_df = gr.Dataframe()
+                with gr.Row():
+                    self._previous_page_button = gr.Button(value='Previous')
+                    self._page_text = gr.Markdown()
+                    self._next_page_button = gr.Button(value='Next')
+                    self._page_size_entry = gr.Dropdown(label='Rows per page', choices=GUI.PAGE_SIZES,
+                                                        value=self._page_size)
+                with gr.Row():
+                    self._drop_duplicates_subset_entry = gr.Textbox(label='Compared columns',
+                                                                    placeholder='name, price (all by default)')
+                    self._drop_duplicates_keep_entry = gr.Dropdown(label='Keep',
+                                                                   choices=[k.value for k in KeepNames],
+                                                                   value=KeepNames.FIRST.value)
+                    self._drop_duplicates_button = gr.Button(value='Drop Duplicates')
 
                 with gr.Row():
                     with gr.Column():
@@ -103,11 +141,35 @@ class GUI:
             self._table_selector.select(
                 self._select_table,
                 inputs=self._table_selector,
-                outputs=[self._table_df, self._current_schema_text]
+                outputs=[self._table_df, self._page_text, self._current_schema_text, self._sort_selector]
+            )
+            view_inputs = [self._filter_entry, self._sort_selector, self._sort_descending_entry]
+            self._apply_view_button.click(
+                self._apply_view,
+                inputs=view_inputs,
+                outputs=[self._table_df, self._page_text]
+            )
+            self._filter_entry.submit(
+                self._apply_view,
+                inputs=view_inputs,
+                outputs=[self._table_df, self._page_text]
+            )
+            self._previous_page_button.click(
+                self._previous_page,
+                outputs=[self._table_df, self._page_text]
+            )
+            self._next_page_button.click(
+                self._next_page,
+                outputs=[self._table_df, self._page_text]
+            )
+            self._page_size_entry.change(
+                self._set_page_size,
+                inputs=[self._page_size_entry],
+                outputs=[self._table_df, self._page_text]
             )
             self._create_table_button.click(
                 self._create_table,
-                inputs=[self._table_name_entry, self._new_table_schema_entry],
+                inputs=[self._table_name_entry, self._new_table_schema_entry, self._new_table_storage_entry],
                 outputs=[self._table_selector]
             )
             self._delete_table_button.click(
@@ -118,21 +180,22 @@ class GUI:
             self._add_row_button.click(
                 self._add_row,
                 inputs=[self._new_row_entry],
-                outputs=[self._table_df]
+                outputs=[self._table_df, self._page_text]
             )
             self._update_row_button.click(
                 self._update_row,
                 inputs=[self._new_row_entry],
-                outputs=[self._table_df]
+                outputs=[self._table_df, self._page_text]
             )
             self._delete_row_button.click(
                 self._delete_row,
                 inputs=[self._delete_row_identifier_entry],
-                outputs=[self._table_df]
+                outputs=[self._table_df, self._page_text]
             )
             self._drop_duplicates_button.click(
                 self._drop_duplicates,
-                outputs=[self._table_df]
+                inputs=[self._drop_duplicates_subset_entry, self._drop_duplicates_keep_entry],
+                outputs=[self._table_df, self._page_text]
             )
 
         return demo
@@ -145,7 +208,7 @@ class GUI:
                            choices=self._service.databases,)
 
     def _create_database(self, database_name: str):
-        if database_name in self._service.databases:
+        if self._service.contains(database_name):
             raise gr.Error(f"Database {database_name} already exists")
         self._service.add_database(Database(database_name, []))
         return self._get_database_selector()
@@ -161,10 +224,18 @@ class GUI:
         self._current_database = self._service.get_database(database_name)
         return self._get_table_selector()
 
-    def _import_database(self, database_path: str):
+    def _import_database(self, database_path: str, progress=gr.Progress()):
         p_db = Path(database_path)
         assert p_db.exists(), "File does not exist"
-        self._service.add_database(Coder.import_database(p_db))
+        if SnapshotCoder.is_snapshot(p_db):
+            db = SnapshotCoder.import_database(p_db)
+        else:
+            size = max(p_db.stat().st_size, 1)
+            db = Coder.import_database(
+                p_db,
+                progress=lambda rows, position: progress(min(position / size, 1), desc=f'{rows} rows loaded'),
+            )
+        self._service.add_database(db)
         return self._get_database_selector()
 
     def _export_database(self):
@@ -180,12 +251,15 @@ class GUI:
 
     def _select_table(self, table_name: str):
         self._current_table = self._current_database.get_table(table_name)
-        return self._get_table_df(), self._get_current_schema_text()
+        self._ordering = None
+        self._where = []
+        self._reset_page()
+        return *self._render(), self._get_current_schema_text(), self._get_sort_selector()
 
-    def _create_table(self, table_name: str, schema_definition: str):
+    def _create_table(self, table_name: str, schema_definition: str, storage_name: str):
         try:
             schema = parse_schema(schema_definition)
-            table = Table(name=table_name, sch=schema, rows=[])
+            table = Table(name=table_name, sch=schema, rows=[], storage_name=StorageNames(storage_name))
             self._current_database.add_table(table)
         except Exception as e:
             raise gr.Error(e)
@@ -198,27 +272,116 @@ class GUI:
             raise gr.Error(e)
         return self._get_table_selector()
 
-    def _get_table_df(self):
-        df = self._current_table.to_df() if self._current_table else None
-        return gr.Dataframe(df) if df is not None else gr.Dataframe()
+    def _get_sort_selector(self):
+        choices = ['id', *self._current_table.schema.column_names] if self._current_table else []
+        return gr.Dropdown(label='Sort by', choices=choices, value=None)
+
+    def _reset_page(self):
+        self._page = 0
+        self._cursors = [None]
+
+    def _apply_view(self, filter_str: str, sort_column: str, descending: bool):
+        assert self._current_table is not None, "Select the table first"
+        try:
+            self._where = self._parse_filter(filter_str or '')
+        except Exception as e:
+            raise gr.Error(e)
+        self._ordering = Ordering(sort_column, descending) if sort_column else None
+        self._reset_page()
+        return self._render()
+
+    def _parse_filter(self, filter_str: str) -> List[Condition]:
+        # conditions like "price < $5" separated by semicolons; between takes "low, high"
+        conditions = []
+        for part in filter_str.split(';'):
+            if not part.strip():
+                continue
+            words = part.split(maxsplit=2)
+            if len(words) != 3:
+                raise ValueError(f'Condition "{part.strip()}" must be "column operator value"')
+            column, operator, operand = words
+            operator = Operators(operator.lower())
+            operands = [o.strip() for o in operand.split(',')] if operator is Operators.BETWEEN else [operand.strip()]
+            conditions.append(Condition.from_strings(self._current_table, column, operator, operands))
+        return conditions
+
+    def _previous_page(self):
+        self._page = max(self._page - 1, 0)
+        return self._render()
+
+    def _next_page(self):
+        if not self._keyset() and (self._page + 1) * self._page_size > Query.MAX_OFFSET:
+            gr.Warning('Pages this far need a sorted index on the sort column')
+            return self._render()
+        self._page += 1
+        return self._render()
+
+    def _set_page_size(self, page_size: int):
+        self._page_size = int(page_size)
+        self._reset_page()
+        return self._render()
+
+    def _query(self, limit: int, offset: int = 0, after=None) -> Query:
+        # without a chosen ordering the rows come by identifier
+        return Query(self._current_table, self._where, order_by=[self._ordering or Ordering('id')],
+                     limit=limit, offset=offset, after=after)
+
+    def _keyset(self) -> bool:
+        # orderings by id or by a sorted index seek straight to the page instead of skipping rows
+        return self._query(0).keyset
+
+    def _fetch_page(self) -> Tuple[List[Row], bool]:
+        # one row beyond the page tells whether there is a next one
+        size = self._page_size
+        if self._keyset():
+            rows = self._query(size + 1, after=self._cursors[self._page]).execute()
+        else:
+            rows = self._query(size + 1, offset=min(self._page * size, Query.MAX_OFFSET)).execute()
+        return rows[:size], len(rows) > size
+
+    def _render(self):
+        if self._current_table is None:
+            return gr.Dataframe(), ''
+        if self._keyset():
+            # there is no cursor beyond the last page
+            self._page = min(self._page, len(self._cursors) - 1)
+        rows, more = self._fetch_page()
+        # edits may have emptied the page, then the window moves back to the last page with rows
+        while not rows and self._page > 0:
+            self._page -= 1
+            rows, more = self._fetch_page()
+        if self._keyset():
+            del self._cursors[self._page + 1:]
+            if more:
+                self._cursors.append(self._query(0).cursor(rows[-1]))
+        schema = self._current_table.schema
+        df = pd.DataFrame([self._display_row(row) for row in rows], columns=['id', *schema.column_names])
+        first = self._page * self._page_size
+        text = f'Page {self._page + 1}, rows {first + 1 if rows else 0}-{first + len(rows)}{" (more)" if more else ""}'
+        return gr.Dataframe(df), text
+
+    @staticmethod
+    def _display_row(row: Row) -> list:
+        # money and intervals are not JSON serialisable, so they are shown as text
+        return [v.value if isinstance(v, (Money, MoneyInterval)) else v.native for v in (row.identifier, *row.values)]
 
     def _add_row(self, row_str: str):
         assert self._current_table is not None, "Select the table first"
         row = parse_row(self._current_table.schema, row_str)
         self._current_table.insert(row)
-        return self._get_table_df()
+        return self._render()
 
     def _update_row(self, row_str: str):
         assert self._current_table is not None, "Select the table first"
         row = parse_row(self._current_table.schema, row_str)
         self._current_table.update(row)
-        return self._get_table_df()
+        return self._render()
 
     def _delete_row(self, row_id: str):
         assert self._current_table is not None, "Select the table first"
         identifier = self._current_table.schema.id_type.from_string(row_id)
         self._current_table.delete(identifier)
-        return self._get_table_df()
+        return self._render()
 
     def _get_current_schema_text(self):
         if self._current_table is None:
@@ -229,7 +392,9 @@ class GUI:
         ])
         return gr.Dataframe(df)
 
-    def _drop_duplicates(self):
+    def _drop_duplicates(self, subset: str, keep: str):
         assert self._current_table is not None, "Select the table first"
-        self._current_table.drop_duplicates()
-        return self._get_table_df()
+        columns = [c.strip() for c in subset.split(',') if c.strip()]
+        removed = self._current_table.drop_duplicates(columns or None, KeepNames(keep))
+        gr.Info(f'Removed {removed} duplicate row(s)')
+        return self._render()
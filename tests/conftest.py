@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the packages live in src/, which is also where the API and GUI are started from
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+from core.filesystem.arrow import ArrowCoder
+from core.filesystem.formats import ExportFormats
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.storage import StorageNames
+from core.table import Table
+
+pa = pytest.importorskip('pyarrow')
+
+
+SCHEMA = """INT id
+STRING name
+MONEY price
+MONEY_INTERVAL price_range
+"""
+
+
+@pytest.mark.parametrize('export_format', [ExportFormats.ARROW, ExportFormats.PARQUET])
+def test_round_trip(export_format):
+    schema = parse_schema(SCHEMA)
+    rows = [parse_row(schema, f'{i}; item-{i}; ${i}.05; $1-${i + 1}') for i in range(50)]
+    table = Table('items', schema, rows, StorageNames.COLUMNS)
+    f = io.BytesIO()
+    ArrowCoder.write_table(table, f, export_format)
+    f.seek(0)
+    imported = ArrowCoder.read_table(f)
+    assert sorted(r.values[1].native for r in imported.iter_rows()) == sorted(r.values[1].native for r in rows)
+    assert imported.validate()
+
+
+def test_duplicate_ids_are_refused():
+    data = pa.table({'id': pa.array([1, 2, 1], pa.int64()), 'name': ['a', 'b', 'c']})
+    with pytest.raises(ValueError, match='duplicates'):
+        ArrowCoder.arrow_to_table(data, 'items')
+
+
+def test_unsigned_values_beyond_the_signed_range_are_refused():
+    data = pa.table({'id': pa.array([1, 2 ** 63], pa.uint64())})
+    with pytest.raises(ValueError, match='64-bit'):
+        ArrowCoder.arrow_to_table(data, 'items')
+    # unsigned columns within the range are taken as they are
+    table = ArrowCoder.arrow_to_table(pa.table({'id': pa.array([1, 2 ** 63 - 1], pa.uint64())}), 'items')
+    assert sorted(r.identifier.native for r in table.iter_rows()) == [1, 2 ** 63 - 1]
@@ -0,0 +1,197 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Set
+
+import pytest
+
+from core.database import Database
+from core.dedup import KeepNames
+from core.durability import Durability
+from core.filesystem.coder import Coder
+from core.filesystem.snapshot import SnapshotCoder
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.query import Condition, Operators, Query
+from core.storage import StorageNames
+from core.table import Table
+
+
+SCHEMA = """INT id
+STRING name INDEX HASH
+MONEY price INDEX SORTED
+MONEY_INTERVAL price_range INDEX INTERVAL
+"""
+
+WRITERS = 4
+READERS = 2
+OPERATIONS = 300
+# no thread may run longer than this, a hung lock fails the test instead of the run
+TIMEOUT = 60
+
+# every writer owns its own range of identifiers, so the expected contents are known
+ID_SPAN = 1_000_000
+
+
+def definition(identifier: int, version: int) -> str:
+    lower = identifier % 1000
+    return f'{identifier}; row-{identifier}-{version}; ${version}.{identifier % 100:02d}; ${lower}-${lower + 50}'
+
+
+def writer(table: Table, worker: int, expected: Dict[int, Set[int]]) -> None:
+    rnd = random.Random(worker)
+    schema = table.schema
+    alive: List[int] = []
+    next_id = worker * ID_SPAN
+    for version in range(OPERATIONS):
+        action = rnd.random()
+        if action < 0.5 or not alive:
+            table.insert(parse_row(schema, definition(next_id, version)))
+            alive.append(next_id)
+            next_id += 1
+        elif action < 0.75:
+            table.update(parse_row(schema, definition(rnd.choice(alive), version)))
+        else:
+            identifier = alive.pop(rnd.randrange(len(alive)))
+            table.delete(schema.id_type.from_string(str(identifier)))
+    expected[worker] = set(alive)
+
+
+def deduplicator(table: Table, worker: int, expected: Dict[int, Set[int]]) -> None:
+    # inserts pairs of rows that differ only in the identifier and collapses them again
+    schema = table.schema
+    kept = set()
+    for i in range(OPERATIONS // 10):
+        first = worker * ID_SPAN + 2 * i
+        for identifier in (first, first + 1):
+            table.insert(parse_row(schema, f'{identifier}; twin-{worker}-{i}; $1.00; $1-$2'))
+        table.drop_duplicates(['name', 'price', 'price_range'], KeepNames.FIRST)
+        kept.add(first)
+    expected[worker] = kept
+
+
+def reader(table: Table, stop: threading.Event) -> None:
+    while not stop.is_set():
+        rows = table.page(100)
+        assert all(a.identifier.native < b.identifier.native for a, b in zip(rows, rows[1:]))
+        for row in rows[:10]:
+            table.get(row.identifier)
+        where = [Condition.from_strings(table, 'price_range', Operators.CONTAINS, ['$500'])]
+        for row in Query(table, where).execute():
+            assert row.values[2].lower.native <= 50_000 <= row.values[2].upper.native
+        query = Query(table, [Condition.from_strings(table, 'price', Operators.LT, ['$5'])], limit=50)
+        for row in query.execute():
+            assert row.values[1].native < 500
+
+
+def run(targets: List[Callable[[], None]], readers: List[Callable[[threading.Event], None]]) -> None:
+    # runs the targets to completion next to the readers; whatever a thread raises fails the test
+    errors: List[BaseException] = []
+    stop = threading.Event()
+
+    def guarded(target: Callable[[], None]) -> Callable[[], None]:
+        def run_target():
+            try:
+                target()
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+        return run_target
+
+    threads = [threading.Thread(target=guarded(t), daemon=True) for t in targets]
+    reader_threads = [threading.Thread(target=guarded(lambda r=r: r(stop)), daemon=True) for r in readers]
+    for thread in [*threads, *reader_threads]:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    stop.set()
+    for thread in reader_threads:
+        thread.join(TIMEOUT)
+    assert not any(t.is_alive() for t in [*threads, *reader_threads]), 'A thread did not finish in time'
+    if errors:
+        raise errors[0]
+
+
+def hammer(table: Table) -> Dict[int, Set[int]]:
+    expected: Dict[int, Set[int]] = {}
+    targets = [lambda w=w: writer(table, w, expected) for w in range(1, WRITERS + 1)]
+    targets.append(lambda: deduplicator(table, WRITERS + 1, expected))
+    run(targets, [lambda stop: reader(table, stop)] * READERS)
+    assert len(expected) == WRITERS + 1
+    return expected
+
+
+def check(table: Table, expected: Dict[int, Set[int]]) -> None:
+    wanted = set().union(*expected.values())
+    assert len(table) == len(wanted)
+    assert {row.identifier.native for row in table.iter_rows()} == wanted
+    assert table.validate()
+    assert [r.identifier.native for r in table.iter_range()] == sorted(wanted)
+    for row in table.iter_rows():
+        identifier = row.identifier.native
+        assert identifier in [r.identifier.native for r in table.lookup('name', row.values[0])]
+        assert identifier in [r.identifier.native for r in table.scan_index('price', row.values[1], row.values[1])]
+        assert identifier in [r.identifier.native for r in table.scan_containing('price_range', row.values[2].lower)]
+
+
+def make_table(storage_name: StorageNames) -> Table:
+    return Table('bench', parse_schema(SCHEMA), [], storage_name)
+
+
+@pytest.mark.parametrize('storage_name', list(StorageNames))
+def test_writers_and_readers_on_one_table(storage_name):
+    table = make_table(storage_name)
+    check(table, hammer(table))
+
+
+def test_recovery_after_concurrent_writes(tmp_path):
+    # small checkpoints, so that the background checkpointer runs between the writes
+    durability = Durability(tmp_path, checkpoint_bytes=64 * 1024)
+    service = durability.recover()
+    service.add_database(Database('bench', []))
+    service.get_database('bench').add_table(make_table(StorageNames.ROWS))
+    table = service.get_database('bench').get_table('bench')
+    check(table, hammer(table))
+
+    before = Coder.database_to_json(service.get_database('bench'))
+    durability.close()
+    recovered = Durability(tmp_path)
+    after = Coder.database_to_json(recovered.recover().get_database('bench'))
+    recovered.close()
+    assert before == after
+
+
+@pytest.mark.parametrize('export', ['json', 'snapshot'])
+def test_streamed_export_next_to_writers(tmp_path, export):
+    # the chunks are taken on varying pool threads while the writers run, as the API streams them
+    table = make_table(StorageNames.COLUMNS)
+    for i in range(2_000):
+        table.insert(parse_row(table.schema, definition(i, 0)))
+    db = Database('bench', [table])
+    exported: List[bytes] = []
+
+    def stream():
+        if export == 'json':
+            chunks = (chunk.encode('utf-8') for chunk in Coder.iter_database_json(db))
+        else:
+            chunks = SnapshotCoder.iter_database_bytes(db)
+        with ThreadPoolExecutor(4) as pool:
+            while True:
+                chunk = pool.submit(next, chunks, None).result(TIMEOUT)
+                if chunk is None:
+                    break
+                exported.append(chunk)
+
+    expected: Dict[int, Set[int]] = {0: set(range(2_000))}
+    targets = [lambda w=w: writer(table, w, expected) for w in range(1, WRITERS + 1)]
+    run([*targets, stream], [])
+    check(table, expected)
+    # rows written meanwhile may or may not be in the export, the others are there exactly once
+    path = tmp_path / 'export'
+    path.write_bytes(b''.join(exported))
+    if export == 'json':
+        imported = Coder.import_database(path).get_table('bench')
+    else:
+        imported = SnapshotCoder.import_database(path).get_table('bench')
+    assert imported.validate()
+    assert set(range(2_000)) <= {row.identifier.native for row in imported.iter_rows()}
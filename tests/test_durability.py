@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from core.database import Database
+from core.durability import Durability
+from core.filesystem.coder import Coder
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.storage import StorageNames
+from core.table import Table
+
+
+SCHEMA = """INT id
+STRING name INDEX HASH
+"""
+
+
+def insert(table: Table, identifier: int) -> None:
+    table.insert(parse_row(table.schema, f'{identifier}; row-{identifier}'))
+
+
+def start(tmp_path):
+    durability = Durability(tmp_path)
+    service = durability.recover()
+    service.add_database(Database('db', []))
+    db = service.get_database('db')
+    for name in ('a', 'b'):
+        db.add_table(Table(name, parse_schema(SCHEMA), [], StorageNames.COLUMNS))
+        for i in range(100):
+            insert(db.get_table(name), i)
+    return durability, db
+
+
+def recovered(tmp_path, db: Database) -> None:
+    # the recovered database is the one that was written, exactly
+    durability = Durability(tmp_path)
+    assert Coder.database_to_json(durability.recover().get_database('db')) == Coder.database_to_json(db)
+    durability.close()
+
+
+def test_writes_go_on_while_a_checkpoint_is_written(tmp_path, monkeypatch):
+    durability, db = start(tmp_path)
+    writing = threading.Event()
+    release = threading.Event()
+    write_database = Durability._write_database
+
+    def slow_write(database, path):
+        writing.set()
+        assert release.wait(30)
+        write_database(database, path)
+
+    monkeypatch.setattr(Durability, '_write_database', staticmethod(slow_write))
+    checkpoint = threading.Thread(target=durability.checkpoint)
+    checkpoint.start()
+    assert writing.wait(30)
+    # neither table is locked while the snapshot is written
+    for i in range(100, 110):
+        insert(db.get_table('a'), i)
+        insert(db.get_table('b'), i)
+    release.set()
+    checkpoint.join(30)
+    durability.close()
+    recovered(tmp_path, db)
+
+
+def test_writes_between_the_switch_and_the_copy_are_replayed_once(tmp_path, monkeypatch):
+    durability, db = start(tmp_path)
+    copy_table = Durability._copy_table
+
+    def copy_after_writes(self, table, wal):
+        # a was already copied when b is reached, so only its write is missing from the snapshot
+        if table.name == 'b':
+            insert(db.get_table('a'), 1000)
+            insert(db.get_table('b'), 1000)
+            db.get_table('b').delete(db.get_table('b').schema.id_type.from_string('5'))
+        return copy_table(self, table, wal)
+
+    monkeypatch.setattr(Durability, '_copy_table', copy_after_writes)
+    durability.checkpoint()
+    monkeypatch.undo()
+    insert(db.get_table('b'), 2000)
+    durability.close()
+    recovered(tmp_path, db)
+
+
+def test_logs_of_a_failed_checkpoint_are_replayed(tmp_path, monkeypatch):
+    durability, db = start(tmp_path)
+
+    def fail(self, generation, copies):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(Durability, '_write_snapshot', fail)
+    with pytest.raises(OSError):
+        durability.checkpoint()
+    monkeypatch.undo()
+    insert(db.get_table('a'), 1000)
+    recovered(tmp_path, db)
+    # the next checkpoint succeeds and leaves a single log behind
+    durability.checkpoint()
+    insert(db.get_table('b'), 1000)
+    durability.close()
+    assert len(list(tmp_path.glob('wal-*.log'))) == 1
+    recovered(tmp_path, db)
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.frame import MONEY_SCALE
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.storage import StorageNames
+from core.table import Table
+
+
+SCHEMA = """INT id
+STRING name
+CHAR grade
+REAL weight
+MONEY price
+MONEY_INTERVAL price_range
+"""
+
+
+def make_table(storage_name: StorageNames, n: int = 5) -> Table:
+    schema = parse_schema(SCHEMA)
+    rows = [parse_row(schema, f'{i}; item-{i}; A; {i}.5; $1{i}.07; $0.01-${i}.99') for i in range(n)]
+    return Table('items', schema, rows, storage_name)
+
+
+def expected_df(table: Table) -> pd.DataFrame:
+    # the frame built row by row, the way the mirror must look after any sequence of changes
+    rows = sorted(table.iter_rows(), key=lambda r: r.identifier.native)
+    return pd.DataFrame([[r.identifier.native, *(v.native for v in r.values)] for r in rows],
+                        columns=['id', *table.schema.column_names])
+
+
+def same(df: pd.DataFrame, table: Table) -> bool:
+    df = df.sort_values('id').reset_index(drop=True)
+    expected = expected_df(table)
+    intervals = df.pop('price_range')
+    expected_intervals = expected.pop('price_range')
+    return (df.astype(object).equals(expected.astype(object))
+            and [(i.left, i.right) for i in intervals] == list(expected_intervals))
+
+
+@pytest.mark.parametrize('storage_name', list(StorageNames))
+def test_dtypes_keep_money_exact(storage_name):
+    df = make_table(storage_name).to_df()
+    assert df['id'].dtype == np.int64
+    assert df['weight'].dtype == np.float64
+    assert df['price'].dtype == np.int64
+    assert df['price_range'].dtype == pd.IntervalDtype('int64', closed='both')
+    assert isinstance(df['name'].dtype, pd.StringDtype)
+    assert isinstance(df['grade'].dtype, pd.StringDtype)
+    # $13.07 is 1307 cents, without the rounding of a float
+    assert df.loc[df['id'] == 3, 'price'].item() == 1307
+    assert df.loc[df['id'] == 3, 'price'].item() / MONEY_SCALE == 13.07
+    assert df.loc[df['id'] == 3, 'price_range'].item().right == 399
+
+
+@pytest.mark.parametrize('storage_name', list(StorageNames))
+def test_follows_changes(storage_name):
+    table = make_table(storage_name)
+    schema = table.schema
+    table.to_df()
+    table.insert(parse_row(schema, '10; added; B; 1.0; $1.00; $1-$2'))
+    assert same(table.to_df(), table)
+    table.update(parse_row(schema, '2; renamed; C; 2.5; $12.07; $0.01-$2.99'))
+    assert same(table.to_df(), table)
+    table.delete(schema.id_type.from_string('0'))
+    assert same(table.to_df(), table)
+    table.drop_duplicates(['grade'])
+    assert same(table.to_df(), table)
+
+
+def test_update_keeps_unchanged_columns():
+    table = make_table(StorageNames.COLUMNS)
+    before = table.to_df()
+    table.update(parse_row(table.schema, '2; item-2; A; 2.5; $99.00; $0.01-$2.99'))
+    after = table.to_df()
+    assert after is not before
+    assert after.loc[after['id'] == 2, 'price'].item() == 9900
+    # only the price column was rebuilt, the text columns are the same arrays as before
+    assert after['name'].array is before['name'].array
+    assert after['price'].array is not before['price'].array
+
+
+def test_integers_beyond_64_bits():
+    table = make_table(StorageNames.ROWS)
+    table.insert(parse_row(table.schema, f'{2 ** 70}; big; D; 1.0; $1.00; $1-$2'))
+    df = table.to_df()
+    assert df['id'].dtype == object
+    assert 2 ** 70 in list(df['id'])
+    assert same(df, table)
@@ -0,0 +1,126 @@
+import os
+import subprocess
+import sys
+import threading
+from collections import Counter
+
+import pytest
+
+from core.join import HashJoin, JoinNames
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.storage import StorageNames
+from core.table import Table
+
+
+SCHEMA = """INT id
+INT key
+STRING label
+"""
+
+
+def make_table(name: str, n: int, keys: int) -> Table:
+    # repeated keys, and keys missing on the other side, on both tables
+    schema = parse_schema(SCHEMA)
+    rows = [parse_row(schema, f'{i}; {(i * 7) % keys}; key-{(i * 7) % keys}') for i in range(n)]
+    return Table(name, schema, rows, StorageNames.COLUMNS)
+
+
+def naive(left: Table, right: Table, how: JoinNames, position: int = 0) -> Counter:
+    pairs = Counter()
+    for l in left.iter_rows():
+        matches = [r for r in right.iter_rows() if r.values[position].native == l.values[position].native]
+        for r in matches:
+            pairs[l.identifier.native, r.identifier.native] += 1
+        if not matches and how is JoinNames.LEFT:
+            pairs[l.identifier.native, None] += 1
+    return pairs
+
+
+def paged(j: HashJoin, size: int) -> Counter:
+    pairs = Counter()
+    cursor = None
+    while True:
+        page, cursor = j.page(size, cursor)
+        assert len(page) == size or cursor is None
+        for l, r in page:
+            pairs[l.identifier.native, None if r is None else r.identifier.native] += 1
+        if cursor is None:
+            return pairs
+
+
+@pytest.mark.parametrize('how', list(JoinNames))
+@pytest.mark.parametrize('sizes', [(40, 90), (90, 40)])
+@pytest.mark.parametrize('memory_limit', [None, 1000])
+@pytest.mark.parametrize('size', [1, 7, 1000])
+@pytest.mark.parametrize('column', ['key', 'label'])
+def test_pages_cover_the_join_once(how, sizes, memory_limit, size, column):
+    left, right = make_table('left', sizes[0], 13), make_table('right', sizes[1], 17)
+    j = HashJoin(left, right, column, column, how, memory_limit)
+    assert (j.partitions > 1) == (memory_limit is not None)
+    expected = naive(left, right, how, left.schema.column_names.index(column))
+    assert paged(j, size) == expected
+    assert Counter((l.identifier.native, None if r is None else r.identifier.native)
+                   for l, r in j.iter_rows()) == expected
+
+
+def test_cursor_of_changed_tables_is_refused():
+    left, right = make_table('left', 40, 13), make_table('right', 90, 17)
+    _, cursor = HashJoin(left, right, 'key', 'key').page(5)
+    for i in range(100, 200):
+        left.insert(parse_row(left.schema, f'{i}; 1; key-1'))
+    with pytest.raises(ValueError):
+        HashJoin(left, right, 'key', 'key').page(5, cursor)
+
+
+def test_opposite_joins_next_to_a_writer():
+    # each join waits on the lock of its second table; in argument order the two joins
+    # and a writer queued on one of the tables could wait for each other forever
+    a, b = make_table('a', 200, 13), make_table('b', 200, 17)
+    errors = []
+
+    def run(target):
+        try:
+            for _ in range(50):
+                target()
+        except BaseException as e:
+            errors.append(e)
+
+    targets = [lambda: HashJoin(a, b, 'key', 'key').page(10), lambda: HashJoin(b, a, 'key', 'key').page(10),
+               lambda: a.insert(parse_row(a.schema, f'{len(a) + 1000}; 1; key-1'))]
+    threads = [threading.Thread(target=run, args=(t,), daemon=True) for t in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    assert not any(t.is_alive() for t in threads), 'The joins did not finish in time'
+    assert not errors
+
+
+PAGES = """
+import sys
+from collections import Counter
+from test_join import HashJoin, JoinNames, make_table
+left, right = make_table('left', 90, 13), make_table('right', 40, 17)
+j = HashJoin(left, right, 'label', 'label', JoinNames.LEFT, 1000)
+cursor = eval(sys.argv[1])
+pairs, cursor = j.page(int(sys.argv[2]), cursor)
+print(repr(cursor))
+print(sorted((l.identifier.native, r and r.identifier.native) for l, r in pairs))
+"""
+
+
+def test_cursor_resumes_in_another_process():
+    # text hashes differ between processes, the partitions of a spilled join must not
+    def page(seed: str, cursor: str, size: int):
+        env = {**os.environ, 'PYTHONHASHSEED': seed,
+               'PYTHONPATH': os.pathsep.join(sys.path)}
+        out = subprocess.run([sys.executable, '-c', PAGES, cursor, str(size)], env=env, check=True,
+                             capture_output=True, text=True, cwd=os.path.dirname(__file__)).stdout.splitlines()
+        return out[0], eval(out[1])
+
+    cursor, first = page('1', 'None', 50)
+    _, rest = page('2', cursor, 10_000)
+    left, right = make_table('left', 90, 13), make_table('right', 40, 17)
+    expected = naive(left, right, JoinNames.LEFT, 1)
+    assert Counter(first + rest) == expected
@@ -0,0 +1,73 @@
+import pytest
+
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.query import Condition, Operators, Ordering, Query
+from core.storage import StorageNames
+from core.table import Table
+
+
+SCHEMA = """INT id
+STRING name
+MONEY price INDEX SORTED
+"""
+
+
+def make_table(storage_name: StorageNames, n: int = 200) -> Table:
+    # few distinct prices, so that pages end in the middle of equal values
+    schema = parse_schema(SCHEMA)
+    rows = [parse_row(schema, f'{(i * 37) % n}; item-{i}; ${i % 7}.00') for i in range(n)]
+    return Table('items', schema, rows, storage_name)
+
+
+def all_pages(table: Table, ordering: Ordering, where=None, size: int = 9):
+    pages = []
+    after = None
+    while True:
+        q = Query(table, where, order_by=[ordering], limit=size, after=after)
+        rows = q.execute()
+        pages.append(rows)
+        if len(rows) < size:
+            return pages
+        after = q.cursor(rows[-1])
+
+
+def identifiers(rows):
+    return [r.identifier.native for r in rows]
+
+
+@pytest.mark.parametrize('storage_name', list(StorageNames))
+@pytest.mark.parametrize('column', ['id', 'price'])
+@pytest.mark.parametrize('descending', [False, True])
+def test_keyset_pages_match_the_sorted_query(storage_name, column, descending):
+    table = make_table(storage_name)
+    ordering = Ordering(column, descending)
+    pages = all_pages(table, ordering)
+    expected = Query(table, order_by=[ordering]).execute()
+    assert identifiers(r for page in pages for r in page) == identifiers(expected)
+    assert len(expected) == 200
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_keyset_pages_with_conditions(descending):
+    table = make_table(StorageNames.COLUMNS)
+    ordering = Ordering('price', descending)
+    where = [Condition.from_strings(table, 'price', Operators.BETWEEN, ['$2', '$5']),
+             Condition.from_strings(table, 'id', Operators.GT, ['50'])]
+    pages = all_pages(table, ordering, where)
+    expected = Query(table, where, order_by=[ordering]).execute()
+    assert identifiers(r for page in pages for r in page) == identifiers(expected)
+    q = Query(table, where, order_by=[ordering], limit=9, after=Query(table, order_by=[ordering]).cursor(expected[0]))
+    assert q.plan().description.startswith('keyset scan price')
+
+
+def test_offset_and_cursor_are_checked():
+    table = make_table(StorageNames.ROWS)
+    with pytest.raises(ValueError):
+        Query(table, order_by=[Ordering('id')], offset=Query.MAX_OFFSET + 1)
+    # the name column has no sorted index, so a cursor cannot seek in its order
+    assert not Query(table, order_by=[Ordering('name')]).keyset
+    with pytest.raises(ValueError):
+        Query(table, order_by=[Ordering('name')], after=[table.schema.id_type.from_string('1')])
+    with pytest.raises(ValueError):
+        Query(table, order_by=[Ordering('price')], after=[table.schema.id_type.from_string('1')])
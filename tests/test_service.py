@@ -0,0 +1,80 @@
+import gc
+import sys
+
+from core.database import Database
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.service import Service
+from core.storage import StorageNames
+from core.table import Table
+
+
+SCHEMA = """INT id
+STRING name
+"""
+
+
+def make_database(name: str, n: int = 100) -> Database:
+    schema = parse_schema(SCHEMA)
+    rows = [parse_row(schema, f'{i}; {name}-{i}') for i in range(n)]
+    return Database(name, [Table('items', schema, rows, StorageNames.ROWS)])
+
+
+def insert(db: Database, identifier: int) -> None:
+    table = db.get_table('items')
+    table.insert(parse_row(table.schema, f'{identifier}; late'))
+
+
+def identifiers(db: Database):
+    return {row.identifier.native for row in db.get_table('items').iter_rows()}
+
+
+def evicted_service(tmp_path):
+    # a budget that holds a single database, so loading the second evicts the first
+    service = Service([], tmp_path, memory_budget=1)
+    service.add_database(make_database('first'))
+    held = service.get_database('first')
+    service.add_database(make_database('second'))
+    assert 'first' not in [d.name for d in service.loaded_databases]
+    return service, held
+
+
+def test_write_to_a_dropped_evicted_database_is_kept(tmp_path):
+    service, held = evicted_service(tmp_path)
+    insert(held, 1000)
+    del held
+    gc.collect()
+    service.get_database('second')
+
+    assert 1000 in identifiers(service.get_database('first'))
+    assert 1000 in identifiers(Service([], tmp_path).get_database('first'))
+
+
+def test_flush_saves_evicted_databases(tmp_path):
+    service, held = evicted_service(tmp_path)
+    insert(held, 1000)
+    service.close()
+
+    assert 1000 in identifiers(Service([], tmp_path).get_database('first'))
+
+
+def test_evicted_database_is_taken_back_with_its_writes(tmp_path):
+    service, held = evicted_service(tmp_path)
+    insert(held, 1000)
+    assert service.get_database('first') is held
+    insert(held, 1001)
+    service.close()
+
+    assert {1000, 1001} <= identifiers(Service([], tmp_path).get_database('first'))
+
+
+def test_sizes_follow_writes_without_a_walk_over_the_rows():
+    db = make_database('sized', 1000)
+    table = db.get_table('items')
+    table.insert(parse_row(table.schema, '5000; a name much longer than the others'))
+    table.update(parse_row(table.schema, '3; renamed'))
+    table.delete(table.schema.id_type.from_string('7'))
+    table.drop_duplicates(['name'])
+    # the same rows in a fresh store, whose size is counted from scratch
+    fresh = Table('items', table.schema, list(table.rows), StorageNames.ROWS)
+    assert table.store.nbytes - sys.getsizeof(table.rows) == fresh.store.nbytes - sys.getsizeof(fresh.rows)
@@ -0,0 +1,207 @@
+import gc
+
+import pytest
+
+from core.database import Database
+from core.durability import Durability
+from core.filesystem.coder import Coder
+from core.filesystem.snapshot import SnapshotCoder
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.schema import IndexNames, TypeNames
+from core.service import Service
+from core.storage import MappedStore, StorageNames
+from core.table import Table
+
+
+COLUMNS = """STRING name
+CHAR grade
+INT quantity
+REAL weight
+MONEY price
+MONEY_INTERVAL price_range
+"""
+
+VALUES = [
+    'apple; A; 3; 0.5; $1.25; $1.00-$2.50',
+    '; B; -7; -3.75; $0; $0-$0',
+    'пиріг ☕; C; 9223372036854775807; 1e300; $10000000000000.00; $5-$100000',
+]
+
+IDS = {
+    TypeNames.INT: ['1', '-2', '9223372036854775807'],
+    TypeNames.REAL: ['0.5', '-2.25', '1e-300'],
+    TypeNames.STRING: ['a', 'ключ', 'a longer key'],
+    TypeNames.CHAR: ['a', 'b', 'ї'],
+}
+
+
+def make_table(name: str, id_type_name: TypeNames, storage_name: StorageNames, n: int = len(VALUES)) -> Table:
+    schema = parse_schema(f'{id_type_name.name} id\n{COLUMNS}')
+    rows = [parse_row(schema, f'{i}; {v}') for i, v in zip(IDS[id_type_name][:n], VALUES)]
+    return Table(name, schema, rows, storage_name)
+
+
+def state(table: Table):
+    # JSON exports write the rows in identifier order
+    return (
+        table.name,
+        Coder.schema_to_list(table.schema),
+        table.storage_name,
+        sorted(table.schema.codec.encode(row) for row in table.iter_rows()),
+    )
+
+
+def round_trip(db: Database, tmp_path, owned: bool = False) -> Database:
+    path = tmp_path / 'db.snapshot'
+    SnapshotCoder.export_database(db, path)
+    assert SnapshotCoder.is_snapshot(path)
+    return SnapshotCoder.import_database(path, owned)
+
+
+def shop(storage_name: StorageNames = StorageNames.COLUMNS) -> Database:
+    return Database('shop', [
+        make_table('first', TypeNames.INT, storage_name),
+        make_table('second', TypeNames.STRING, storage_name),
+    ])
+
+
+def test_columns_cover_every_type():
+    schema = parse_schema(f'INT id\n{COLUMNS}')
+    assert set(schema.type_names) == set(TypeNames)
+
+
+@pytest.mark.parametrize('storage_name', list(StorageNames))
+@pytest.mark.parametrize('id_type_name', list(IDS))
+def test_round_trip(tmp_path, storage_name, id_type_name):
+    table = make_table('products', id_type_name, storage_name)
+    imported = round_trip(Database('shop', [table]), tmp_path)
+
+    assert imported.name == 'shop'
+    assert imported.tables == ['products']
+    restored = imported.get_table('products')
+    assert isinstance(restored.store, MappedStore)
+    assert state(restored) == state(table)
+    assert restored.validate()
+    encode = table.schema.codec.encode
+    for row in table.iter_rows():
+        assert encode(restored.get(row.identifier)) == encode(row)
+
+
+@pytest.mark.parametrize('storage_name', list(StorageNames))
+def test_empty_table(tmp_path, storage_name):
+    table = make_table('empty', TypeNames.INT, storage_name, n=0)
+    restored = round_trip(Database('shop', [table]), tmp_path).get_table('empty')
+    assert len(restored) == 0
+    assert state(restored) == state(table)
+
+
+def test_empty_database(tmp_path):
+    imported = round_trip(Database('nothing', []), tmp_path)
+    assert imported.name == 'nothing'
+    assert imported.tables == []
+
+
+def test_several_tables_and_indexes(tmp_path):
+    first = make_table('first', TypeNames.INT, StorageNames.ROWS)
+    first.create_index('price', IndexNames.SORTED)
+    second = make_table('second', TypeNames.STRING, StorageNames.COLUMNS)
+    imported = round_trip(Database('shop', [first, second]), tmp_path)
+    assert imported.tables == ['first', 'second']
+    assert state(imported.get_table('first')) == state(first)
+    assert state(imported.get_table('second')) == state(second)
+    assert imported.get_table('first').indexes == first.indexes
+
+
+def test_mapped_table_accepts_changes(tmp_path):
+    table = make_table('products', TypeNames.INT, StorageNames.COLUMNS)
+    restored = round_trip(Database('shop', [table]), tmp_path).get_table('products')
+    schema = restored.schema
+    restored.insert(parse_row(schema, f'4; {VALUES[0]}'))
+    restored.update(parse_row(schema, f'1; {VALUES[1]}'))
+    restored.delete(schema.id_type.from_string('-2'))
+    encode = schema.codec.encode
+    assert sorted(encode(r)[0] for r in restored.iter_rows()) == ['1', '4', '9223372036854775807']
+    assert encode(restored.get(schema.id_type.from_string('1'))) == encode(parse_row(schema, f'1; {VALUES[1]}'))
+
+
+def test_integers_beyond_64_bits_fall_back_to_json(tmp_path):
+    # only row storage holds such integers, column storage rejects them on insert
+    table = make_table('products', TypeNames.INT, StorageNames.ROWS)
+    table.insert(parse_row(table.schema, f'{2 ** 70}; big; D; {-2 ** 70}; 1.0; $1.00; $1-$2'))
+    db = Database('shop', [table])
+
+    with pytest.raises(ValueError):
+        SnapshotCoder.export_database(db, tmp_path / 'db.snapshot')
+
+    path = tmp_path / 'db'
+    Durability._write_database(db, path)
+    assert not SnapshotCoder.is_snapshot(path)
+    restored = Durability._read_database(path).get_table('products')
+    assert state(restored) == state(table)
+
+
+def test_closing_deletes_an_owned_snapshot(tmp_path):
+    imported = round_trip(shop(), tmp_path, owned=True)
+    backing = imported.get_table('first').store.backing
+    assert backing.path.exists()
+
+    table = imported.get_table('first')
+    imported.close()
+    assert backing.closed
+    assert not backing.path.exists()
+    with pytest.raises(ValueError):
+        list(table.iter_rows())
+
+
+def test_closing_keeps_a_snapshot_that_is_not_owned(tmp_path):
+    imported = round_trip(shop(), tmp_path)
+    backing = imported.get_table('first').store.backing
+    imported.close()
+    assert backing.closed
+    assert backing.path.exists()
+
+
+def test_dropped_database_deletes_its_owned_snapshot(tmp_path):
+    imported = round_trip(shop(), tmp_path, owned=True)
+    path = imported.get_table('first').store.backing.path
+    del imported
+    gc.collect()
+    assert not path.exists()
+
+
+def test_thawed_tables_let_go_of_the_snapshot(tmp_path):
+    imported = round_trip(shop(), tmp_path, owned=True)
+    path = imported.get_table('first').store.backing.path
+    for table_name in imported.tables:
+        table = imported.get_table(table_name)
+        table.insert(parse_row(table.schema, f'{IDS[table.schema.id_type_name][0]}0; {VALUES[0]}'))
+        assert table.store.backing is None
+    gc.collect()
+    assert not path.exists()
+    assert [len(imported.get_table(t)) for t in imported.tables] == [len(VALUES) + 1] * 2
+
+
+@pytest.mark.parametrize('evicted', [False, True])
+def test_removed_database_deletes_its_owned_snapshot(tmp_path, evicted):
+    service = Service([], tmp_path / 'catalog', memory_budget=1)
+    imported = round_trip(shop(), tmp_path, owned=True)
+    backing = imported.get_table('first').store.backing
+    service.add_database(imported)
+    if evicted:
+        # the database is parked while it is still referenced
+        service.add_database(Database('other', []))
+        assert 'shop' not in [d.name for d in service.loaded_databases]
+
+    service.remove_database('shop')
+    assert backing.closed
+    assert not backing.path.exists()
+    assert not service.contains('shop')
+
+
+def test_invalid_owned_snapshot_is_deleted(tmp_path):
+    path = tmp_path / 'db.snapshot'
+    path.write_bytes(b'not a snapshot, but long enough to be mapped')
+    with pytest.raises(ValueError):
+        SnapshotCoder.import_database(path, owned=True)
+    assert not path.exists()
@@ -0,0 +1,78 @@
+import pytest
+
+from core.dedup import KeepNames
+from core.parsing.row import parse_row
+from core.parsing.schema import parse_schema
+from core.storage import StorageNames
+from core.table import Table
+
+
+SCHEMA = """INT id
+INT amount INDEX SORTED
+STRING name INDEX HASH
+"""
+
+
+def make_table(storage_name: StorageNames = StorageNames.COLUMNS) -> Table:
+    schema = parse_schema(SCHEMA)
+    return Table('items', schema, [parse_row(schema, f'{i}; {i}; item-{i}') for i in range(5)], storage_name)
+
+
+def test_rows_the_store_cannot_hold_are_rejected_in_a_batch():
+    table = make_table()
+    entries = []
+    table.attach_journal(entries.append)
+    version = table.version
+    rows = [parse_row(table.schema, definition) for definition in
+            ['10; 1; a', f'11; {2 ** 70}; b', f'{2 ** 64}; 1; c', '12; 1; d']]
+    rejected = table.insert_many(rows)
+    assert [i for i, _ in rejected] == [1, 2]
+    assert table.version == version + 1
+    # the journal holds exactly the rows that are in the table
+    assert len(entries[0]['rows']) == 2
+    assert sorted(r.identifier.native for r in table.iter_rows()) == [0, 1, 2, 3, 4, 10, 12]
+    assert table.validate()
+
+
+def test_failed_update_keeps_the_row_and_its_indexes():
+    table = make_table()
+    schema = table.schema
+    with pytest.raises(ValueError):
+        table.update(parse_row(schema, f'2; {2 ** 70}; renamed'))
+    assert [r.identifier.native for r in table.lookup('name', schema.types[1].from_string('item-2'))] == [2]
+    assert table.validate()
+    table.delete(schema.id_type.from_string('2'))
+    assert table.validate()
+
+
+@pytest.mark.parametrize('storage_name', list(StorageNames))
+@pytest.mark.parametrize('memory_limit', [None, 1000])
+def test_duplicates_are_kept_by_identifier_after_deletes(storage_name, memory_limit):
+    schema = parse_schema(SCHEMA)
+    rows = [parse_row(schema, f'{i}; {i % 3}; twin-{i % 3}') for i in range(30)]
+    for keep, expected in [(KeepNames.FIRST, [3, 4, 5]), (KeepNames.LAST, [27, 28, 29])]:
+        table = Table('items', schema, list(rows), storage_name)
+        # each delete moves the last row into the freed slot, ahead of its twins
+        for i in range(3):
+            table.delete(schema.id_type.from_string(str(i)))
+        assert table.drop_duplicates(['amount', 'name'], keep, memory_limit) == 24
+        assert sorted(r.identifier.native for r in table.iter_rows()) == expected
+        assert table.validate()
+
+
+def test_text_dictionary_lets_go_of_unused_values():
+    table = make_table()
+    schema = table.schema
+    names = table.store.columns[1]
+    for round_ in range(50):
+        for i in range(5):
+            table.update(parse_row(schema, f'{i}; {i}; item-{i}-{round_}'))
+        table.insert(parse_row(schema, f'{100 + round_}; 0; extra-{round_}'))
+        table.delete(schema.id_type.from_string(str(100 + round_)))
+    assert names.entries == 5
+    table.insert(parse_row(schema, '6; 6; item-0-49'))
+    table.insert(parse_row(schema, '7; 7; item-0-49'))
+    assert table.drop_duplicates(['name']) == 2
+    assert names.entries == 5
+    assert sorted(r.values[1].native for r in table.iter_rows()) == [f'item-{i}-49' for i in range(5)]
+    assert table.validate()